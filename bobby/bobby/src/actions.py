@@ -0,0 +1,148 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       actions.py                                                   #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  timed actuator actions that don't block the caller           #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# toggle_flag_position() spins the flag, sleeps 300 ms and stops it, which
+# freezes whatever loop called it. A MotorPulse does the same move but the
+# waiting happens on its own Thread, so the caller returns straight away:
+#
+#   flag_pulse = MotorPulse(flag, 300)
+#   flag_pulse.start(FORWARD, 30)  # returns immediately, stops itself in 300 ms
+#
+# Starting a pulse while one is running replaces it; the older pulse's stop
+# is skipped so it can't cut the new one short.
+#
+# Autonomous routines have the same problem: spin the conveyor, sleep(200),
+# stop it, and only then drive. An ActionQueue runs actuator steps on its
+# own scheduler task while pid_drive keeps driving:
+#
+#   auton_actions = ActionQueue(brain.timer, travel=travel_inches)
+#   auton_actions.start()
+#   auton_actions.run_for(conveyor_motor1, 200, FORWARD, 100)  # conveyor runs...
+#   auton_actions.at_inches(12, piston1.open)                 # ...piston opens 12 in into the move...
+#   pid_drive(-30)                                            # ...while this drives
+#   auton_actions.wait()                                      # anything left finishes here
+#   auton_actions.stop()
+#
+# travel() is how far the current move has gone in inches. The encoders
+# are never reset (odometry.py reads them the whole run), so main.py's
+# travel_inches measures from move_start_degrees, the reading pid_drive and
+# follow_path record as each move starts, and an at_inches step counts from
+# the start of the next drive. saved_ms() is how much sooner the routine
+# finished than it would have with every run_for done as spin, sleep, stop.
+
+from vex import MSEC, PERCENT, Thread, sleep
+from scheduler import Scheduler
+
+class MotorPulse:
+    """spins a motor for duration_ms, then stops it, without blocking"""
+
+    def __init__(self, motor, duration_ms, stop_mode=None):
+        self.motor = motor
+        self.duration_ms = duration_ms
+        self.stop_mode = stop_mode
+        self.generation = 0
+        self.running = False
+
+    def start(self, direction, velocity, units=PERCENT):
+        self.generation += 1
+        self.running = True
+        self.motor.spin(direction, velocity, units)
+        generation = self.generation
+        Thread(lambda: self.finish(generation))
+
+    def finish(self, generation):
+        sleep(self.duration_ms)
+        if generation == self.generation:
+            if self.stop_mode is None:
+                self.motor.stop()
+            else:
+                self.motor.stop(self.stop_mode)
+            self.running = False
+
+class ActionQueue:
+    """
+    actuator steps that fire on time or distance while the routine keeps
+    driving
+
+    steps run in the order they come due, from a Scheduler task polling
+    every period_ms; poll() can also be called by hand.
+    """
+
+    def __init__(self, timer, travel=None, period_ms=10):
+        self.timer = timer
+        self.travel = travel
+        self.period_ms = period_ms
+        self.pending = []  # [due_ms or None, inches or None, function]
+        self.scheduler = None
+        self.serial_ms = 0  # time the run_for steps would have blocked for
+        self.waited_ms = 0  # time wait() actually blocked for
+
+    def at_ms(self, delay_ms, function):
+        """call function() delay_ms from now"""
+        self.pending.append([self.timer.time(MSEC) + delay_ms, None, function])
+
+    def at_inches(self, inches, function):
+        """call function() once travel() reaches inches either way"""
+        self.pending.append([None, abs(inches), function])
+
+    def run_for(self, motor, duration_ms, direction, velocity, units=PERCENT, delay_ms=0):
+        """spin motor for duration_ms starting delay_ms from now, then stop it"""
+        self.at_ms(delay_ms, lambda: motor.spin(direction, velocity, units))
+        self.at_ms(delay_ms + duration_ms, motor.stop)
+        self.serial_ms += duration_ms
+
+    def busy(self):
+        return len(self.pending) > 0
+
+    def poll(self):
+        """runs every step that is due"""
+        now = self.timer.time(MSEC)
+        distance = None
+        due = []
+        for step in self.pending:
+            if step[0] is not None:
+                if step[0] <= now:
+                    due.append(step)
+            else:
+                if distance is None:
+                    distance = abs(self.travel())
+                if distance >= step[1]:
+                    due.append(step)
+        # steps due at the same time run in the order they were added
+        due.sort(key=lambda step: now if step[0] is None else step[0])
+        for step in due:
+            self.pending.remove(step)
+            step[2]()
+
+    def start(self):
+        """polls the queue from its own task until stop()"""
+        self.scheduler = Scheduler(self.timer)
+        self.scheduler.add("actions", self.poll, self.period_ms)
+        Thread(self.scheduler.run)
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+
+    def wait(self):
+        """
+        blocks until every timed step has run; distance steps that never
+        came due are dropped, since nothing is driving any more
+        """
+        started = self.timer.time(MSEC)
+        while self.busy():
+            self.pending = [step for step in self.pending if step[0] is not None]
+            self.poll()
+            if self.busy():
+                sleep(self.period_ms)
+        self.waited_ms += self.timer.time(MSEC) - started
+
+    def saved_ms(self):
+        return self.serial_ms - self.waited_ms
@@ -0,0 +1,245 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       controllers.py                                               #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  feedback, feedforward and settle detection for move loops    #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# pid_drive and motion_profile_pid_drive used to carry their own copy of the
+# same loop, and both stopped the first tick abs(error) dipped under the
+# threshold, with the robot still moving, so it coasted past. The pieces
+# here are shared instead:
+#
+#   loop = ControlLoop(brain.timer, 20,
+#                      PID(KP, KI, KD, integral_limit=1000),
+#                      Settle(tolerance=5, settle_ms=60, velocity_tolerance=40),
+#                      timeout_ms=3000, output_limit=75)
+#   loop.run(target, drivetrain.position, drivetrain.velocity,
+#            lambda output: drivetrain.drive(output, output))
+#
+# A move is done once the error and the speed have both stayed small for
+# settle_ms, or when timeout_ms runs out; run() returns which. Give run() a
+# motion_profile table and the setpoint follows it, with a Feedforward
+# turning the planned velocity and acceleration into output.
+#
+# PID takes its derivative on the measurement rather than the error, so a
+# setpoint that jumps (a profile sample, a new target) doesn't kick the
+# output; while the setpoint holds still the two are the same. Its error
+# sum starts again from zero when the error changes sign: what built up on
+# the way to the target would only push the robot further past it.
+#
+# Turns run through ControlLoop too, on the odometry heading. Their
+# feedback is turn_to_angle's from skills.py: a PD inside a SpeedCap that
+# ramps up, cruises and comes down as the square root of the degrees left,
+# with a BangBang as the floor that keeps the wheels scrubbing until the
+# heading is inside the tolerance:
+#
+#   SpeedCap(PID(TURN_KP, 0, TURN_KD), 10, TURN_MAX_SPEED, TURN_ACCEL, TURN_DECEL,
+#            floor=BangBang(TURN_MIN_SPEED, TURN_TOLERANCE))
+
+import math
+from vex import MSEC
+from scheduler import Rate
+
+SETTLED = "settled"
+TIMED_OUT = "timed out"
+
+def sign(value):
+    if value > 0:
+        return 1
+    if value < 0:
+        return -1
+    return 0
+
+def clamp(value, limit):
+    return max(min(value, limit), -limit)
+
+class PID:
+    """feedback on the error, with the derivative taken on the measurement"""
+
+    def __init__(self, kp, ki, kd, integral_limit=None):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        self.error_sum = 0
+        self.last_measurement = None
+        self.p_term = 0
+        self.i_term = 0
+        self.d_term = 0
+
+    def update(self, setpoint, measurement):
+        error = setpoint - measurement
+        if error * self.error_sum < 0:
+            self.error_sum = 0
+        self.error_sum += error
+        if self.integral_limit is not None:
+            self.error_sum = clamp(self.error_sum, self.integral_limit)
+        if self.last_measurement is None:
+            change = 0
+        else:
+            change = measurement - self.last_measurement
+        self.last_measurement = measurement
+        self.p_term = self.kp * error
+        self.i_term = self.ki * self.error_sum
+        self.d_term = -self.kd * change
+        return self.p_term + self.i_term + self.d_term
+
+class BangBang:
+    """full output toward the setpoint, nothing once within deadband of it"""
+
+    def __init__(self, output, deadband=0):
+        self.output = output
+        self.deadband = deadband
+        self.p_term = 0
+        self.i_term = 0
+        self.d_term = 0
+
+    def reset(self):
+        pass
+
+    def update(self, setpoint, measurement):
+        error = setpoint - measurement
+        if abs(error) <= self.deadband:
+            self.p_term = 0
+        else:
+            self.p_term = sign(error) * self.output
+        return self.p_term
+
+class SpeedCap:
+    """
+    another controller's output held under a cap that ramps up by accel per
+    second to max_output and comes down as decel * sqrt(abs(error)) near
+    the setpoint. an output smaller than floor's (a BangBang) is raised to
+    it outside the floor's deadband.
+    """
+
+    def __init__(self, feedback, period_ms, max_output, accel, decel, floor=None):
+        self.feedback = feedback
+        self.step = accel * period_ms / 1000
+        self.max_output = max_output
+        self.decel = decel
+        self.floor = floor
+        self.reset()
+
+    def reset(self):
+        self.feedback.reset()
+        self.cap = 0
+
+    def update(self, setpoint, measurement):
+        output = self.feedback.update(setpoint, measurement)
+        self.cap = min(self.cap + self.step, self.max_output,
+                       self.decel * math.sqrt(abs(setpoint - measurement)))
+        output = clamp(output, self.cap)
+        if self.floor is not None and abs(output) < self.floor.output:
+            raised = self.floor.update(setpoint, measurement)
+            if raised != 0:
+                output = raised
+        return output
+
+class Feedforward:
+    """
+    output for a planned velocity and acceleration: ks to overcome friction,
+    kv per unit of velocity, ka per unit of acceleration
+    """
+
+    def __init__(self, ks=0, kv=0, ka=0):
+        self.ks = ks
+        self.kv = kv
+        self.ka = ka
+
+    def calculate(self, velocity, acceleration=0):
+        return self.ks * sign(velocity) + self.kv * velocity + self.ka * acceleration
+
+class Settle:
+    """
+    decides a move is finished: abs(error) under tolerance and abs(velocity)
+    under velocity_tolerance, both held for settle_ms
+    """
+
+    def __init__(self, tolerance, settle_ms=0, velocity_tolerance=None):
+        self.tolerance = tolerance
+        self.settle_ms = settle_ms
+        self.velocity_tolerance = velocity_tolerance
+        self.reset()
+
+    def reset(self):
+        self.since = None
+
+    def update(self, error, velocity, now):
+        inside = abs(error) < self.tolerance
+        if self.velocity_tolerance is not None and abs(velocity) >= self.velocity_tolerance:
+            inside = False
+        if not inside:
+            self.since = None
+            return False
+        if self.since is None:
+            self.since = now
+        return now - self.since >= self.settle_ms
+
+class ControlLoop:
+    """
+    runs a feedback controller, plus feedforward when following a profile,
+    at a fixed rate until the Settle says the move is done or it times out
+    """
+
+    def __init__(self, timer, period_ms, feedback, settle, timeout_ms, feedforward=None,
+                 output_limit=100, loop_timer=None):
+        self.timer = timer
+        self.period_ms = period_ms
+        self.feedback = feedback
+        self.settle = settle
+        self.timeout_ms = timeout_ms
+        self.feedforward = feedforward
+        self.output_limit = output_limit
+        self.loop_timer = loop_timer
+        self.output = 0
+        self.result = None
+
+    def run(self, target, measure, velocity, actuate, profile=None, on_tick=None):
+        """
+        drives measure() to target by calling actuate(output) every period,
+        returns SETTLED or TIMED_OUT. with a profile the setpoint is
+        profile.sample(elapsed) and settling only counts once the profile is
+        over. on_tick(output) runs after each actuate, e.g. for telemetry.
+        """
+        self.feedback.reset()
+        self.settle.reset()
+        start = self.timer.time(MSEC)
+        rate = Rate(self.period_ms, self.timer)
+        if self.loop_timer is not None:
+            self.loop_timer.start()
+        while True:
+            if self.loop_timer is not None:
+                self.loop_timer.tick()
+            now = self.timer.time(MSEC)
+            elapsed = now - start
+            position = measure()
+            speed = velocity()
+
+            setpoint = target
+            planned_velocity = 0
+            planned_acceleration = 0
+            if profile is not None:
+                setpoint, planned_velocity, planned_acceleration = profile.sample(elapsed)
+            if profile is None or elapsed >= profile.duration_ms:
+                if self.settle.update(target - position, speed, now):
+                    self.result = SETTLED
+                    return SETTLED
+            if elapsed >= self.timeout_ms:
+                self.result = TIMED_OUT
+                return TIMED_OUT
+
+            output = self.feedback.update(setpoint, position)
+            if self.feedforward is not None:
+                output += self.feedforward.calculate(planned_velocity, planned_acceleration)
+            self.output = clamp(output, self.output_limit)
+            actuate(self.output)
+            if on_tick is not None:
+                on_tick(self.output)
+            rate.sleep()
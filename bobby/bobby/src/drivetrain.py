@@ -0,0 +1,79 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       drivetrain.py                                                #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  drivetrain that commands each side's motors as one group     #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Instead of four or six spin()/stop() calls per tick, programs call
+#
+#   drivetrain.drive(left_speed, right_speed)
+#   drivetrain.stop(BRAKE)
+#
+# and every motor on a side gets the same command, so a side can never be
+# left with one motor forgotten. Each side is an outputs.MotorOutput, so an
+# identical command isn't sent twice, which saves smart port traffic in
+# loops like drive_task where the sticks sit still most of the time.
+#
+# Motors keep running on their last command, but field control stops them
+# between phases without telling us, so call invalidate() (or
+# outputs.invalidate_all()) at the start of autonomous and driver control to
+# make the next command go out for sure.
+
+from vex import FORWARD, PERCENT, DEGREES, DPS, BRAKE
+from outputs import MotorOutput
+
+class DriveSide(MotorOutput):
+    """
+    the motors on one side of the drive, commanded together
+
+    position() reads the first motor, the same one pid_drive always used.
+    """
+
+    def position(self, units=DEGREES):
+        return self.motors[0].position(units)
+
+    def set_position(self, value, units=DEGREES):
+        self.motors[0].set_position(value, units)
+
+    def velocity(self, units=DPS):
+        return self.motors[0].velocity(units)
+
+class Drivetrain:
+    """tank drive made of a left and a right DriveSide"""
+
+    def __init__(self, left_motors, right_motors, deadband=0):
+        self.left = DriveSide(left_motors, deadband=deadband, name="drive left")
+        self.right = DriveSide(right_motors, deadband=deadband, name="drive right")
+
+    def drive(self, left_velocity, right_velocity, direction=FORWARD, units=PERCENT):
+        self.left.spin(direction, left_velocity, units)
+        self.right.spin(direction, right_velocity, units)
+
+    def stop(self, mode=BRAKE):
+        self.left.stop(mode)
+        self.right.stop(mode)
+
+    def position(self, units=DEGREES):
+        """average of the two sides' encoders"""
+        return (self.left.position(units) + self.right.position(units)) / 2
+
+    def velocity(self, units=DPS):
+        """average of the two sides' speeds"""
+        return (self.left.velocity(units) + self.right.velocity(units)) / 2
+
+    def reset_position(self):
+        self.left.set_position(0, DEGREES)
+        self.right.set_position(0, DEGREES)
+
+    def invalidate(self):
+        self.left.invalidate()
+        self.right.invalidate()
+
+    def commands_sent(self):
+        return self.left.sent + self.right.sent
+
+    def commands_skipped(self):
+        return self.left.suppressed + self.right.suppressed
@@ -0,0 +1,272 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       ekf.py                                                       #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  kalman filter fusing encoders, inertial and wall distances   #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Encoder odometry drifts whenever the wheels slip, and nothing in it can
+# notice. An extended kalman filter keeps a pose (x, y, heading) and how
+# uncertain it is, moves both with every encoder update and pulls them back
+# with whatever absolute measurements there are: the inertial sensor's
+# heading, and distance sensors that can see a field wall.
+#
+#   walls = [WallSensor(Distance(Ports.PORT9), forward=6, right=0, angle=180)]
+#   odometry = FusedOdometry(drivetrain.left, drivetrain.right,
+#                            WHEEL_CIRCUMFERENCE_INCHES / 360, TRACK_WIDTH_INCHES,
+#                            brain.timer, PoseEKF(TRACK_WIDTH_INCHES),
+#                            inertial=inertial, walls=walls)
+#   odometry.start()
+#   x, y, heading = odometry.pose
+#
+# Same frame as odometry.py: inches from the field corner and degrees
+# clockwise from +y. A WallSensor's forward/right offsets are inches from
+# the middle of the drive axle and its angle is degrees clockwise from the
+# front of the robot. With no inertial and no walls the filter gives the
+# same pose as plain Odometry.
+#
+# The covariance is a preallocated list of 9 floats updated in place, and
+# every measurement is a scalar update written out by hand, so a filter
+# step builds no lists or matrices. A wall reading further from the
+# prediction than GATE allows (another robot, a goal in the way) is
+# dropped. simulation/ekf_replay.py runs the same filter as NumPy arrays
+# over many simulated runs to tune the noise values.
+
+import math
+from vex import DEGREES, MM
+from odometry import Odometry
+
+FIELD_INCHES = 144
+GATE = 6.63  # squared innovation over its variance, 99% for one measurement
+MAX_RANGE_MM = 2000  # the sensor reports further than this when it sees nothing
+MIN_INCIDENCE = 0.5  # cos of the steepest angle to a wall a reading is trusted at
+
+class PoseEKF:
+    """
+    (x, y, heading) and its 3x3 covariance, moved by wheel travel and
+    corrected by heading and wall distance measurements
+    """
+
+    def __init__(self, track_width, wheel_noise=0.02, heading_noise_deg=0.5,
+                 range_noise=0.6, range_noise_fraction=0.05):
+        self.track_width = track_width
+        self.wheel_noise = wheel_noise  # variance in square inches per inch a wheel travels
+        self.heading_variance = math.radians(heading_noise_deg) ** 2
+        self.range_noise = range_noise  # inches
+        self.range_noise_fraction = range_noise_fraction
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0  # radians
+        self.P = [0.0] * 9  # row-major covariance of (x, y, heading)
+        self.PH = [0.0] * 3  # scratch for P times the measurement row
+        self.accepted = 0
+        self.rejected = 0
+
+    def reset(self, x, y, heading, variance=0.0, heading_variance=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.heading = math.radians(heading)
+        P = self.P
+        for i in range(9):
+            P[i] = 0.0
+        P[0] = variance
+        P[4] = variance
+        P[8] = heading_variance
+
+    def pose(self):
+        return (self.x, self.y, math.degrees(self.heading))
+
+    def predict(self, d_left, d_right):
+        """moves the pose by one update's wheel travel in inches"""
+        track = self.track_width
+        d_heading = (d_left - d_right) / track
+        distance = (d_left + d_right) / 2
+        if d_heading != 0:
+            half = d_heading / 2
+            distance *= math.sin(half) / half
+        midpoint = self.heading + d_heading / 2
+        s = math.sin(midpoint)
+        c = math.cos(midpoint)
+        self.x += distance * s
+        self.y += distance * c
+        self.heading += d_heading
+
+        # P = F P F' with F = I plus (a, b) in the heading column
+        a = distance * c
+        b = -distance * s
+        P = self.P
+        xx, xy, xh, yy, yh, hh = P[0], P[1], P[2], P[4], P[5], P[8]
+        xx += 2 * a * xh + a * a * hh
+        xy += a * yh + b * xh + a * b * hh
+        yy += 2 * b * yh + b * b * hh
+        xh += a * hh
+        yh += b * hh
+
+        # plus G N G' for the noise in each wheel's travel
+        nl = self.wheel_noise * abs(d_left)
+        nr = self.wheel_noise * abs(d_right)
+        k = distance / (2 * track)
+        lx = 0.5 * s + k * c
+        ly = 0.5 * c - k * s
+        rx = 0.5 * s - k * c
+        ry = 0.5 * c + k * s
+        lh = 1 / track
+        xx += nl * lx * lx + nr * rx * rx
+        xy += nl * lx * ly + nr * rx * ry
+        yy += nl * ly * ly + nr * ry * ry
+        xh += (nl * lx - nr * rx) * lh
+        yh += (nl * ly - nr * ry) * lh
+        hh += (nl + nr) * lh * lh
+
+        P[0] = xx
+        P[1] = xy
+        P[2] = xh
+        P[3] = xy
+        P[4] = yy
+        P[5] = yh
+        P[6] = xh
+        P[7] = yh
+        P[8] = hh
+
+    def correct(self, innovation, hx, hy, hh, variance, gate=None):
+        """
+        scalar measurement update with row (hx, hy, hh); returns False and
+        leaves the filter alone if the innovation fails the gate
+        """
+        P = self.P
+        PH = self.PH
+        PH[0] = P[0] * hx + P[1] * hy + P[2] * hh
+        PH[1] = P[3] * hx + P[4] * hy + P[5] * hh
+        PH[2] = P[6] * hx + P[7] * hy + P[8] * hh
+        s = hx * PH[0] + hy * PH[1] + hh * PH[2] + variance
+        if gate is not None and innovation * innovation > gate * s:
+            self.rejected += 1
+            return False
+        scale = innovation / s
+        self.x += PH[0] * scale
+        self.y += PH[1] * scale
+        self.heading += PH[2] * scale
+        for i in range(3):
+            for j in range(3):
+                P[3 * i + j] -= PH[i] * PH[j] / s
+        self.accepted += 1
+        return True
+
+    def update_heading(self, heading):
+        """an absolute heading in degrees, e.g. the inertial sensor's rotation"""
+        innovation = math.radians(heading) - self.heading
+        innovation = (innovation + math.pi) % (2 * math.pi) - math.pi
+        return self.correct(innovation, 0.0, 0.0, 1.0, self.heading_variance)
+
+    def update_wall(self, distance, wall):
+        """
+        a WallSensor reading in inches; returns False when the beam meets a
+        wall too steeply to trust or the reading fails the gate
+        """
+        theta = self.heading
+        st = math.sin(theta)
+        ct = math.cos(theta)
+        sx = self.x + wall.forward * st + wall.right * ct
+        sy = self.y + wall.forward * ct - wall.right * st
+        dsx = wall.forward * ct - wall.right * st  # d(sx)/d(heading)
+        dsy = -wall.forward * st - wall.right * ct
+        beam = theta + wall.angle
+        sb = math.sin(beam)
+        cb = math.cos(beam)
+
+        # the first wall along the beam
+        tx = ty = None
+        if sb > 0:
+            tx = (FIELD_INCHES - sx) / sb
+        elif sb < 0:
+            tx = -sx / sb
+        if cb > 0:
+            ty = (FIELD_INCHES - sy) / cb
+        elif cb < 0:
+            ty = -sy / cb
+        if ty is None or (tx is not None and tx < ty):
+            if abs(sb) < MIN_INCIDENCE:
+                return False
+            expected = tx
+            hx = -1 / sb
+            hy = 0.0
+            hh = (-dsx * sb - tx * sb * cb) / (sb * sb)
+        else:
+            if abs(cb) < MIN_INCIDENCE:
+                return False
+            expected = ty
+            hx = 0.0
+            hy = -1 / cb
+            hh = (-dsy * cb + ty * cb * sb) / (cb * cb)
+        sigma = max(self.range_noise, self.range_noise_fraction * distance)
+        return self.correct(distance - expected, hx, hy, hh, sigma * sigma, GATE)
+
+class WallSensor:
+    """a Distance sensor and where it sits on the robot"""
+
+    def __init__(self, sensor, forward=0.0, right=0.0, angle=0.0):
+        self.sensor = sensor
+        self.forward = forward
+        self.right = right
+        self.angle = math.radians(angle)
+
+    def read(self):
+        """inches, or None when nothing is in range"""
+        mm = self.sensor.object_distance(MM)
+        if mm > MAX_RANGE_MM:
+            return None
+        return mm / 25.4
+
+class FusedOdometry(Odometry):
+    """Odometry whose pose comes from a PoseEKF fed the inertial sensor and wall readings too"""
+
+    def __init__(self, left, right, inches_per_degree, track_width, timer, ekf,
+                 inertial=None, walls=(), period_ms=10):
+        Odometry.__init__(self, left, right, inches_per_degree, track_width, timer, period_ms)
+        self.ekf = ekf
+        self.inertial = inertial
+        self.walls = walls
+        self.ranges = [None] * len(walls)  # filled in place by every update
+        self.heading_offset = 0.0  # field heading minus inertial rotation, degrees
+
+    def step(self, left_degrees, right_degrees, rotation=None, ranges=()):
+        """
+        one update from the encoders, the inertial rotation in degrees
+        (None without one) and one reading per wall sensor (None for
+        nothing in range)
+        """
+        ekf = self.ekf
+        pending = self.pending
+        if pending is not None:
+            self.pending = None
+            ekf.reset(pending[0], pending[1], pending[2])
+            if rotation is not None:
+                self.heading_offset = pending[2] - rotation
+        elif self.last_left is not None:
+            ekf.predict((left_degrees - self.last_left) * self.inches_per_degree,
+                        (right_degrees - self.last_right) * self.inches_per_degree)
+            if rotation is not None:
+                ekf.update_heading(rotation + self.heading_offset)
+            for wall, distance in zip(self.walls, ranges):
+                if distance is not None:
+                    ekf.update_wall(distance, wall)
+        self.last_left = left_degrees
+        self.last_right = right_degrees
+        self.x = ekf.x
+        self.y = ekf.y
+        self.heading = ekf.heading
+        self.updates += 1
+        # published in one assignment like Odometry's, from the fields just copied
+        self.pose = (self.x, self.y, math.degrees(self.heading))
+
+    def update(self):
+        rotation = None
+        if self.inertial is not None:
+            rotation = self.inertial.rotation(DEGREES)
+        walls = self.walls
+        ranges = self.ranges
+        for i in range(len(walls)):
+            ranges[i] = walls[i].read()
+        self.step(self.left.position(DEGREES), self.right.position(DEGREES), rotation, ranges)
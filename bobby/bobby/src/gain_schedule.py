@@ -0,0 +1,48 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       gain_schedule.py                                             #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  pid gains interpolated over move distance                    #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# get_scaled_pid_constants used to pick one of three hand-tuned (KP, KI, KD)
+# triples by distance, so a 24 inch and a 25 inch move got very different
+# gains. A GainSchedule holds gains tuned at a row of distances and
+# interpolates between them:
+#
+#   PID_GAINS = GainSchedule((6, 12, 24, 48),   # inches
+#                            (0.5, 0.4, 0.3, 0.3),  # KP
+#                            (0.0, 0.0, 0.0, 0.0),  # KI
+#                            (0.1, 0.1, 0.2, 0.2))  # KD
+#   KP, KI, KD = PID_GAINS.lookup(distance_inches)
+#
+# Backing up uses the gains for the same distance forwards. Outside the
+# table the nearest row is used. simulation/tune_pid.py fits the tables
+# against the physics model and prints them ready to paste.
+
+class GainSchedule:
+    """(KP, KI, KD) linearly interpolated over the absolute move distance"""
+
+    def __init__(self, distances, kp, ki, kd):
+        self.distances = distances
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+
+    def lookup(self, distance):
+        distance = abs(distance)
+        distances = self.distances
+        if distance <= distances[0]:
+            return self.kp[0], self.ki[0], self.kd[0]
+        last = len(distances) - 1
+        if distance >= distances[last]:
+            return self.kp[last], self.ki[last], self.kd[last]
+        i = 1
+        while distances[i] < distance:
+            i += 1
+        t = (distance - distances[i - 1]) / (distances[i] - distances[i - 1])
+        return (self.kp[i - 1] + t * (self.kp[i] - self.kp[i - 1]),
+                self.ki[i - 1] + t * (self.ki[i] - self.ki[i - 1]),
+                self.kd[i - 1] + t * (self.kd[i] - self.kd[i - 1]))
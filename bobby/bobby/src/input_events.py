@@ -0,0 +1,82 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       input_events.py                                              #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  press/release/hold events for controller buttons            #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Polling pressing() every tick fires an action on every tick the button is
+# down, so programs used to sleep(300) after it as a debounce and froze the
+# whole drive loop. ButtonEvents samples each button once per poll() and
+# only reports the changes:
+#
+#   buttons = ButtonEvents(controller, brain.timer)
+#   buttons.on("Up", PRESSED, raise_flag)
+#   buttons.on("X", HELD, show_report)
+#
+#   while True:
+#       buttons.poll()  # runs the callbacks, returns this poll's events
+#       ...
+#
+# Callbacks run inside poll(), on the drive loop's task, so they should
+# start things (see actions.py) rather than wait for them.
+
+from vex import MSEC
+
+PRESSED = "pressed"
+RELEASED = "released"
+HELD = "held"
+
+class ButtonEvents:
+    """
+    turns controller button states into PRESSED, RELEASED and HELD events
+
+    HELD fires once when a button has been down for hold_ms.
+    """
+
+    def __init__(self, controller, timer, hold_ms=500):
+        self.controller = controller
+        self.timer = timer
+        self.hold_ms = hold_ms
+        self.buttons = {}  # name -> [button, down, pressed_at, held_sent]
+        self.callbacks = {}  # (name, kind) -> [callback, ...]
+
+    def watch(self, name):
+        """start sampling button<name> (e.g. "L1", "Up") on every poll"""
+        if name not in self.buttons:
+            self.buttons[name] = [getattr(self.controller, "button" + name), False, 0, False]
+
+    def on(self, name, kind, callback):
+        """call callback() whenever button name produces an event of kind"""
+        self.watch(name)
+        self.callbacks.setdefault((name, kind), []).append(callback)
+
+    def is_down(self, name):
+        """whether the button was down at the last poll"""
+        return self.buttons[name][1]
+
+    def poll(self):
+        """
+        samples every watched button once, runs the callbacks for what
+        changed and returns the events as a list of (name, kind)
+        """
+        now = self.timer.time(MSEC)
+        events = []
+        for name, state in self.buttons.items():
+            down = state[0].pressing()
+            if down and not state[1]:
+                state[2] = now
+                state[3] = False
+                events.append((name, PRESSED))
+            elif not down and state[1]:
+                events.append((name, RELEASED))
+            elif down and not state[3] and now - state[2] >= self.hold_ms:
+                state[3] = True
+                events.append((name, HELD))
+            state[1] = down
+        for event in events:
+            for callback in self.callbacks.get(event, ()):
+                callback()
+        return events
@@ -0,0 +1,124 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       loop_timing.py                                               #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  per-loop period and jitter measurement for control loops     #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Every control loop assumes its sleep(20)/sleep(10) gives a fixed period, so
+# a loop that runs late quietly changes what error - last_error means. A
+# LoopTimer stamps each iteration with brain.timer and keeps the last few
+# hundred periods in a ring buffer so late loops show up.
+#
+#   drive_loop_timer = LoopTimer("pid_drive", 20, brain.timer, enabled=LOOP_TIMING)
+#
+#   drive_loop_timer.start()
+#   while True:
+#       drive_loop_timer.tick()
+#       ...
+#       sleep(20)
+#
+# Disabled timers return straight away from start() and tick().
+
+from vex import MSEC
+from array import array
+
+HISTOGRAM_BUCKETS = 10  # 1 ms buckets of lateness, the last one catches the rest
+
+timers = []
+
+class LoopTimer:
+    """
+    measures the real period of one control loop
+
+    jitter is how late an iteration started compared to the nominal period
+    (negative if early). an overrun is an iteration more than overrun_ms late.
+    """
+
+    def __init__(self, name, period_ms, timer, size=256, overrun_ms=None, enabled=True):
+        self.name = name
+        self.period_ms = period_ms
+        self.timer = timer
+        self.enabled = enabled
+        self.overrun_ms = period_ms / 4 if overrun_ms is None else overrun_ms
+        self.periods = array('f', [0.0] * size)
+        self.index = 0
+        self.count = 0
+        self.overruns = 0
+        self.last = None
+        timers.append(self)
+
+    def start(self):
+        """call before entering the loop so the gap since its last run isn't counted"""
+        self.last = None
+
+    def tick(self):
+        """call once at the top of every iteration"""
+        if not self.enabled:
+            return
+        now = self.timer.time(MSEC)
+        if self.last is not None:
+            period = now - self.last
+            self.periods[self.index] = period
+            self.index = (self.index + 1) % len(self.periods)
+            self.count += 1
+            if period - self.period_ms > self.overrun_ms:
+                self.overruns += 1
+        self.last = now
+
+    def samples(self):
+        """periods currently held in the ring buffer, oldest first"""
+        if self.count < len(self.periods):
+            return list(self.periods[:self.count])
+        return list(self.periods[self.index:]) + list(self.periods[:self.index])
+
+    def stats(self):
+        """
+        returns (min, mean, p99) jitter in ms over the buffered periods,
+        or None before the second tick
+        """
+        jitter = sorted(period - self.period_ms for period in self.samples())
+        if not jitter:
+            return None
+        p99 = jitter[min(int(len(jitter) * 0.99), len(jitter) - 1)]
+        return jitter[0], sum(jitter) / len(jitter), p99
+
+    def histogram(self):
+        """counts of iterations that were 0, 1, 2 ... ms late"""
+        buckets = [0] * HISTOGRAM_BUCKETS
+        for period in self.samples():
+            late = int(max(period - self.period_ms, 0))
+            buckets[min(late, HISTOGRAM_BUCKETS - 1)] += 1
+        return buckets
+
+    def summary(self):
+        stats = self.stats()
+        if stats is None:
+            return "%s: no data" % self.name
+        return "%s %dms min %.1f avg %.1f p99 %.1f over %d" % (
+            self.name, self.period_ms, stats[0], stats[1], stats[2], self.overruns)
+
+def report(screen, row=1):
+    """
+    prints one summary line per enabled timer, starting at row. returns
+    the next free row.
+    """
+    for loop_timer in timers:
+        if loop_timer.enabled:
+            screen.set_cursor(row, 1)
+            screen.print(loop_timer.summary())
+            row += 1
+    return row
+
+def dump():
+    """prints every enabled timer's summary and lateness histogram to the console"""
+    for loop_timer in timers:
+        if not loop_timer.enabled or loop_timer.count == 0:
+            continue
+        print(loop_timer.summary())
+        print("  %d iterations, last %d buffered" % (loop_timer.count, len(loop_timer.samples())))
+        for late, count in enumerate(loop_timer.histogram()):
+            label = "%d+" % late if late == HISTOGRAM_BUCKETS - 1 else "%d" % late
+            print("  %3s ms late: %d" % (label, count))
@@ -9,8 +9,26 @@
 # ---------------------------------------------------------------------------- #
 
 # Library imports
+# The modules below sit beside this file and the brain only gets the one file
+# it downloads: upload simulation/bundle.py's build/main.py instead of this one.
 from vex import *
 import math
+import loop_timing
+from scheduler import Scheduler
+import telemetry
+from drivetrain import Drivetrain
+import outputs
+from outputs import MotorOutput, PneumaticOutput
+from input_events import ButtonEvents, PRESSED
+from actions import ActionQueue
+from gain_schedule import GainSchedule
+from controllers import ControlLoop, PID, Settle, SpeedCap, BangBang
+from ekf import PoseEKF, FusedOdometry
+from path import smooth_path, load_table, find_path
+from pursuit import PurePursuit
+from planner import FieldGrid, Planner
+import routine
+import routines
 
 # Initialize the brain and controller
 brain = Brain()
@@ -24,18 +42,95 @@ right_drive_1 = Motor(Ports.PORT4, GearSetting.RATIO_18_1, True)
 right_drive_2 = Motor(Ports.PORT5, GearSetting.RATIO_18_1, True)
 right_drive_3 = Motor(Ports.PORT6, GearSetting.RATIO_18_1, True)
 
+# Every drive command goes to all three motors on a side at once
+drivetrain = Drivetrain([left_drive_1, left_drive_2, left_drive_3],
+                        [right_drive_1, right_drive_2, right_drive_3])
+
 # Conveyor motor
-conveyor_motor1 = Motor(Ports.PORT7 GearSetting.RATIO_18_1, False)
+conveyor_motor1 = Motor(Ports.PORT7, GearSetting.RATIO_18_1, False)
 
 # Pneumatic piston connected to three-wire ports
 piston1 = Pneumatics(brain.three_wire_port.c)
 
+# Driver control outputs, these only write to the device when the command changes
+CONVEYOR_DEADBAND = 2  # Percent of stick movement ignored once the conveyor is running
+conveyor_output = MotorOutput([conveyor_motor1], deadband=CONVEYOR_DEADBAND, name="conveyor")
+# No min_interval_ms: L1/R1 fire once per press, so a change held back would be lost
+piston_output = PneumaticOutput(piston1)
+
 # Constants
 CONVEYOR_SPEED = 100
 WHEEL_DIAMETER_INCHES = 4.0
 WHEEL_CIRCUMFERENCE_INCHES = math.pi * WHEEL_DIAMETER_INCHES
+TRACK_WIDTH_INCHES = 12.0  # Between the left and right wheels
 TEMP_WARNING_THRESHOLD = 50  # Temperature threshold in Celsius
+TEMPERATURE_ROW = 1  # Brain screen row the temperature check redraws
+REPORT_ROW = 2  # Loop timing and output reports start below it
 TEMP_CRITICAL_THRESHOLD = 55  # Critical overheating threshold
+LOOP_TIMING = False  # Set True to measure control loop periods (see loop_timing.py)
+
+# pid_drive is done once it is within DRIVE_TOLERANCE_DEG of the target and
+# slower than DRIVE_SETTLE_DPS for DRIVE_SETTLE_MS, or after DRIVE_TIMEOUT_MS.
+# Braking from under 250 dps stops the robot inside the tolerance, so there
+# is no window to wait out; waiting for 40 dps made every move several
+# ticks slower than the old threshold exit without ending any closer.
+DRIVE_TOLERANCE_DEG = 5
+DRIVE_SETTLE_MS = 0
+DRIVE_SETTLE_DPS = 250
+DRIVE_TIMEOUT_MS = 3000
+
+# Turn controller constants, the same as turn_to_angle's in skills.py
+TURN_KP = 4.0  # Percent per degree of heading error
+TURN_KD = 2.0  # Damps the approach to the target
+TURN_MAX_SPEED = 90  # Cruise speed percentage
+TURN_ACCEL = 1200  # Percent per second ramp at the start of a turn
+TURN_DECEL = 14  # Speed cap is TURN_DECEL * sqrt(degrees left), a constant-deceleration curve
+TURN_MIN_SPEED = 10  # Enough to keep the wheels scrubbing near the target
+TURN_TOLERANCE = 1.5  # Degrees
+TURN_SETTLE_MS = 60  # Time inside tolerance before the turn counts as done
+
+# Loop timers, these do nothing unless LOOP_TIMING is on
+pid_drive_timer = loop_timing.LoopTimer("pid_drive", 20, brain.timer, enabled=LOOP_TIMING)
+turn_timer = loop_timing.LoopTimer("turn", 10, brain.timer, enabled=LOOP_TIMING)
+drive_task_timer = loop_timing.LoopTimer("drive_task", 10, brain.timer, enabled=LOOP_TIMING)
+
+# Inertial sensor, set to Inertial(Ports.PORTx) once one is mounted.
+inertial = None
+
+# Distance sensors that can see a field wall, as ekf.WallSensor, e.g.
+# WallSensor(Distance(Ports.PORTx), forward=-6, angle=180) for one on the back
+wall_sensors = []
+
+# Field pose from the drive encoders, corrected by the sensors above when
+# there are any, updated every 10 ms on its own task
+AUTON_START_POSE = (72, 20, 0)  # x, y inches and heading degrees, the visualizer's default start
+odometry = FusedOdometry(drivetrain.left, drivetrain.right, WHEEL_CIRCUMFERENCE_INCHES / 360,
+                         TRACK_WIDTH_INCHES, brain.timer, PoseEKF(TRACK_WIDTH_INCHES),
+                         inertial=inertial, walls=wall_sensors)
+
+# goto steps follow a smooth path through their points from the odometry pose
+DRIVE_FREE_SPEED_IPS = 200 * WHEEL_CIRCUMFERENCE_INCHES / 60  # 200 rpm at 100%
+PATH_MAX_SPEED_IPS = 0.75 * DRIVE_FREE_SPEED_IPS  # The same cap as pid_drive
+PATH_ACCELERATION = 200  # Inches per second squared, speeding up and slowing for the end
+PATH_LOOKAHEAD_INCHES = 8  # Longer cuts corners more but weaves less
+path_follower = PurePursuit(drivetrain, odometry, brain.timer, TRACK_WIDTH_INCHES,
+                            DRIVE_FREE_SPEED_IPS, PATH_MAX_SPEED_IPS, PATH_ACCELERATION,
+                            PATH_LOOKAHEAD_INCHES)
+
+# Paths made ahead of time by simulation/path_tables.py, copy its file to the SD card
+PATH_TABLE_FILE = "paths.pth"
+path_table = load_table(brain.sdcard, PATH_TABLE_FILE)
+
+# navigate steps find a way around the ladder and stakes on a grid of the field
+PLANNER_CELL_INCHES = 4  # Smaller finds gaps closer to the robot's size but plans slower
+field_planner = Planner(FieldGrid(PLANNER_CELL_INCHES))
+
+# Binary telemetry, written to the SD card after autonomous and every few seconds of driver control
+TELEMETRY = True
+TELEMETRY_AUTON_FILE = "auton.tlm"
+TELEMETRY_DRIVER_FILE = "driver.tlm"
+TELEMETRY_FLUSH_MS = 5000
+telemetry_log = telemetry.Telemetry(enabled=TELEMETRY)
 
 # Variables
 selected_auton = None  # Stores the selected autonomous routine
@@ -48,21 +143,42 @@ def inches_to_degrees(target_distance_inches):
     corrected_distance = target_distance_inches / CORRECTION_FACTOR
     return (corrected_distance / WHEEL_CIRCUMFERENCE_INCHES) * 360
 
+# Encoder position the current pid_drive move started from; the encoders
+# are never reset, odometry integrates them
+move_start_degrees = 0
+
+def travel_inches():
+    """
+    How far the current pid_drive move has gone, in the same corrected
+    inches pid_drive takes.
+    """
+    return (drivetrain.position() - move_start_degrees) / inches_to_degrees(1)
+
+# Autonomous actuator steps, run alongside pid_drive instead of between moves
+auton_actions = ActionQueue(brain.timer, travel=travel_inches)
+
+# Drive PID gains by distance: the short, medium and long gains tuned on the
+# field, with a one inch ramp between them instead of a jump. tune_pid.py's
+# simulated gains come out several times higher and stay off the robot
+# until they have been tried on the field.
+PID_GAINS = GainSchedule(
+    (12, 13, 24, 25),  # inches
+    (0.35, 0.45, 0.45, 0.55),  # KP
+    (0.004, 0.008, 0.008, 0.015),  # KI
+    (0.1, 0.12, 0.12, 0.2))  # KD
+
 def get_scaled_pid_constants(distance_inches):
     """
-    Adjusts PID constants based on the distance to travel.
-    Returns scaled values of KP, KI, and KD.
+    Returns KP, KI and KD for a move of distance_inches, interpolated
+    from PID_GAINS. Backing up uses the first row's short-move gains at
+    any distance, as the field-tuned short/medium/long buckets always did.
     """
-    if distance_inches > 24:  # Long distance
-        return 0.55, 0.015, 0.2  # Reduced Kp, slightly increased Kd
-    elif distance_inches > 12:  # Medium distance
-        return 0.45, 0.008, 0.12  # Reduced Kp, slightly increased Kd
-    else:  # Short distance
-        return 0.35, 0.004, 0.1  # Reduced Kp for greater precision
+    return PID_GAINS.lookup(max(distance_inches, 0))
     
 def pid_drive(target_distance_inches):
     """
     Drives the robot forward by a specified distance (in inches) using dynamically tuned PID control.
+    Returns controllers.SETTLED, or controllers.TIMED_OUT if the robot never settled.
     """
     # Get scaled PID constants
     KP, KI, KD = get_scaled_pid_constants(target_distance_inches)
@@ -70,96 +186,108 @@ def pid_drive(target_distance_inches):
     # Convert target distance from inches to motor degrees
     target_degrees = inches_to_degrees(target_distance_inches)
     
-    # Reset motor positions
-    left_drive_1.set_position(0, DEGREES)
-    right_drive_1.set_position(0, DEGREES)
-    
-    error_sum = 0
-    last_error = 0
-    threshold = 5  # Adjusted threshold for stopping accuracy
-
-    # PID loop for driving
-    while True:
-        current_position = (left_drive_1.position(DEGREES) + right_drive_1.position(DEGREES)) / 2
-        error = target_degrees - current_position
-
-        if abs(error) < threshold:
-            break
+    # Measure the move from where the encoders are now
+    global move_start_degrees
+    move_start_degrees = drivetrain.position()
 
-        # Accumulate error with anti-windup
-        error_sum = max(min(error_sum + error, 1000), -1000)  
-        derivative = error - last_error
-        pid_output = (KP * error) + (KI * error_sum) + (KD * derivative)
+    def position():
+        return drivetrain.position() - move_start_degrees
 
-        # Cap the PID output to prevent excessive speeds
-        pid_output = max(min(pid_output, 75), -75)  # Lower max speed to reduce overshoot
+    # PID loop for driving, on a fixed 20 ms period, until the robot has stopped on target
+    loop = ControlLoop(brain.timer, 20, PID(KP, KI, KD, integral_limit=1000),
+                       Settle(DRIVE_TOLERANCE_DEG, DRIVE_SETTLE_MS, DRIVE_SETTLE_DPS),
+                       DRIVE_TIMEOUT_MS, output_limit=75,  # Lower max speed to reduce overshoot
+                       loop_timer=pid_drive_timer)
 
-        # Spin motors with PID output
-        left_drive_1.spin(FORWARD, pid_output, PERCENT)
-        left_drive_2.spin(FORWARD, pid_output, PERCENT)
-        right_drive_1.spin(FORWARD, pid_output, PERCENT)
-        right_drive_2.spin(FORWARD, pid_output, PERCENT)
+    def log(output):
+        pid = loop.feedback
+        telemetry_log.log(brain.timer.time(MSEC), left_drive_2.position(DEGREES), right_drive_2.position(DEGREES),
+                          output, output, pid.p_term, pid.i_term, pid.d_term,
+                          conveyor_motor1.velocity(PERCENT), piston1.value(), telemetry.SOURCE_PID_DRIVE)
 
-        last_error = error
-        sleep(20)
+    result = loop.run(target_degrees, position, drivetrain.velocity,
+                      lambda output: drivetrain.drive(output, output), on_tick=log)
 
     # Stop all motors with a brake
-    left_drive_1.stop(BRAKE)
-    left_drive_2.stop(BRAKE)
-    right_drive_1.stop(BRAKE)
-    right_drive_2.stop(BRAKE)
+    drivetrain.stop(BRAKE)
+    return result
 
-def rotate_left():
+def follow_path(points, backwards=False):
     """
-    Rotates the robot 90 degrees to the left using motor control.
-    Assumes a differential drive system with equal speeds on left and right sides.
+    Drives through field points [(x, y), ...] along a smooth path without
+    stopping at them: the one from PATH_TABLE_FILE if it was made for these
+    points and starts where the robot is, otherwise one from where odometry
+    says the robot is.
+    Returns controllers.SETTLED, or controllers.TIMED_OUT if it never got to the end.
     """
-    # Constants for rotation
-    TURN_SPEED = 50  # Speed percentage for the turn
-    TURN_DURATION_MS = 400  # Adjust this based on your robot's turning behavior
+    path = find_path(path_table, points, backwards, odometry.pose)
+    if path is None:
+        path = smooth_path(points, start=odometry.pose)
 
-    # Spin motors to turn left
-    left_drive_1.spin(FORWARD, TURN_SPEED, PERCENT)
-    left_drive_2.spin(FORWARD, TURN_SPEED, PERCENT)
-    left_drive_3.spin(FORWARD, TURN_SPEED, PERCENT)
-    right_drive_1.spin(REVERSE, TURN_SPEED, PERCENT)
-    right_drive_2.spin(REVERSE, TURN_SPEED, PERCENT)
-    right_drive_3.spin(REVERSE, TURN_SPEED, PERCENT)
+    # travel_inches counts along the path too
+    global move_start_degrees
+    move_start_degrees = drivetrain.position()
 
-    # Turn for a specified duration
-    sleep(TURN_DURATION_MS)
+    def log(left, right):
+        telemetry_log.log(brain.timer.time(MSEC), left_drive_2.position(DEGREES), right_drive_2.position(DEGREES),
+                          left, right, 0, 0, 0, conveyor_motor1.velocity(PERCENT), piston1.value(),
+                          telemetry.SOURCE_PATH)
 
-    # Stop all motors with a brake
-    left_drive_1.stop(BRAKE)
-    left_drive_2.stop(BRAKE)
-    left_drive_3.stop(BRAKE)
-    right_drive_1.stop(BRAKE)
-    right_drive_2.stop(BRAKE)
-    right_drive_3.stop(BRAKE)
-    
-def rotate_right():
+    return path_follower.follow(path, backwards, on_tick=log)
+
+def navigate(x, y):
     """
-    Rotates the robot 90 degrees to the left using motor control.
-    Assumes a differential drive system with equal speeds on left and right sides.
+    Drives to field point (x, y) along the way field_planner finds from where
+    odometry says the robot is. Returns what follow_path does, or None if
+    there is no way there.
     """
-    # Constants for rotation
-    TURN_SPEED = 50  # Speed percentage for the turn
-    TURN_DURATION_MS = 420  # Adjust this based on your robot's turning behavior
+    points = field_planner.plan(odometry.pose, (x, y))
+    if points is None:
+        return None
+    return follow_path(points[1:])
 
-    # Spin motors to turn left
-    left_drive_1.spin(REVERSE, TURN_SPEED, PERCENT)
-    left_drive_2.spin(REVERSE, TURN_SPEED, PERCENT)
-    right_drive_1.spin(FORWARD, TURN_SPEED, PERCENT)
-    right_drive_2.spin(FORWARD, TURN_SPEED, PERCENT)
+def turn_to_angle(target_heading, max_speed=TURN_MAX_SPEED, timeout_ms=2000):
+    """
+    Turns in place to a field heading in degrees, clockwise positive, with
+    closed-loop control on the odometry heading (which follows the inertial
+    sensor once one is mounted). The turn speed ramps up at TURN_ACCEL,
+    cruises at max_speed and is capped near the target so the robot arrives
+    without overshooting.
+    Returns controllers.SETTLED, or controllers.TIMED_OUT if it never settled.
+    """
+    pid = PID(TURN_KP, 0, TURN_KD)
+    loop = ControlLoop(brain.timer, 10,
+                       SpeedCap(pid, 10, max_speed, TURN_ACCEL, TURN_DECEL,
+                                floor=BangBang(TURN_MIN_SPEED, TURN_TOLERANCE)),
+                       Settle(TURN_TOLERANCE, TURN_SETTLE_MS), timeout_ms, loop_timer=turn_timer)
+
+    def heading():
+        return odometry.pose[2]
+
+    def log(output):
+        telemetry_log.log(brain.timer.time(MSEC), left_drive_2.position(DEGREES), right_drive_2.position(DEGREES),
+                          output, -output, pid.p_term, pid.i_term, pid.d_term,
+                          conveyor_motor1.velocity(PERCENT), piston1.value(), telemetry.SOURCE_TURN)
 
-    # Turn for a specified duration
-    sleep(TURN_DURATION_MS)
+    # Positive output turns clockwise; the heading alone decides when it has settled
+    result = loop.run(target_heading, heading, lambda: 0,
+                      lambda output: drivetrain.drive(output, -output), on_tick=log)
 
     # Stop all motors with a brake
-    left_drive_1.stop(BRAKE)
-    left_drive_2.stop(BRAKE)
-    right_drive_1.stop(BRAKE)
-    right_drive_2.stop(BRAKE)
+    drivetrain.stop(BRAKE)
+    return result
+
+def rotate_left():
+    """
+    Rotates the robot 90 degrees to the left (counter-clockwise).
+    """
+    return turn_degrees(-90)
+
+def rotate_right():
+    """
+    Rotates the robot 90 degrees to the right (clockwise).
+    """
+    return turn_degrees(90)
 
 
 def select_autonomous():
@@ -212,85 +340,153 @@ def select_autonomous():
 
 def display_motor_temperatures():
     """
-    Continuously displays motor temperatures on the brain screen.
+    Displays motor temperatures on the brain screen once. Scheduled every
+    500 ms from drive_task. Only its own row is redrawn, so a report on the
+    rows below stays up.
     """
-    while True:
-        brain.screen.clear_screen()
-        brain.screen.set_cursor(1, 1)
-        brain.screen.print("Motor Temperatures:")
-
-        temperatures = [
-            left_drive_1.temperature('celsius'),
-            left_drive_2.temperature('celsius'),
-            right_drive_1.temperature('celsius'),
-            right_drive_2.temperature('celsius'),
-        ]
-
-        # Check for warnings
-        if any(temp >= TEMP_WARNING_THRESHOLD for temp in temperatures):
-            controller.screen.clear_screen()
-            controller.screen.set_cursor(1, 1)
-            controller.screen.print("WARNING: MOTOR HOT!")
-
-        sleep(500)
-
-# Autonomous routines
+    brain.screen.clear_row(TEMPERATURE_ROW)
+    brain.screen.set_cursor(TEMPERATURE_ROW, 1)
+    brain.screen.print("Motor Temperatures:")
+
+    temperatures = [
+        left_drive_1.temperature('celsius'),
+        left_drive_2.temperature('celsius'),
+        left_drive_3.temperature('celsius'),
+        right_drive_1.temperature('celsius'),
+        right_drive_2.temperature('celsius'),
+        right_drive_3.temperature('celsius'),
+    ]
+
+    # Check for warnings
+    if any(temp >= TEMP_WARNING_THRESHOLD for temp in temperatures):
+        controller.screen.clear_screen()
+        controller.screen.set_cursor(1, 1)
+        controller.screen.print("WARNING: MOTOR HOT!")
+
+# Autonomous routines, the steps themselves are in routines.py
+def turn_degrees(degrees):
+    """
+    Turns by degrees from the current heading, clockwise positive and
+    negative left, as in routine steps.
+    """
+    return turn_to_angle(odometry.pose[2] + degrees)
+
+def set_piston(open_piston):
+    if open_piston:
+        piston1.open()
+    else:
+        piston1.close()
+
+def run_conveyor(percent, for_ms):
+    """
+    Starts or stops the conveyor, or with for_ms runs it that long while
+    the next steps carry on.
+    """
+    if for_ms > 0:
+        auton_actions.run_for(conveyor_motor1, for_ms, FORWARD, percent)
+    elif percent != 0:
+        conveyor_motor1.spin(FORWARD, percent, PERCENT)
+    else:
+        conveyor_motor1.stop()
+
+def run_routine(name):
+    steps = routine.load(name, routines.ROUTINES[name], brain.sdcard)
+    routine.run(steps, {
+        routine.DRIVE: pid_drive,
+        routine.TURN: turn_degrees,
+        routine.PISTON: set_piston,
+        routine.CONVEYOR: run_conveyor,
+        routine.WAIT: sleep,
+        routine.GOTO: follow_path,
+        routine.NAVIGATE: navigate,
+    })
+    auton_actions.wait()
+
 def red_left_negative_corner():
-    piston1.open()
-    pid_drive(32.5)
-    piston1.close()
-    pid_drive(-6)
-    conveyor_motor1.spin(FORWARD, CONVEYOR_SPEED, PERCENT)
-    sleep(200)
-    conveyor_motor1.stop()
-    pid_drive(-30)
+    run_routine("red_left")
 
 def red_right_positive_corner():
-    piston1.open()
-    pid_drive(32)
-    piston1.close()
-    pid_drive(-6)
-    conveyor_motor1.spin(FORWARD, CONVEYOR_SPEED, PERCENT)
-    sleep(200)
-    conveyor_motor1.stop()
-    pid_drive(-30)
+    run_routine("red_right")
 
 # Autonomous entry point
 def autonomous():
+    drivetrain.invalidate()
+    odometry.set_pose(*AUTON_START_POSE)
+    telemetry_log.start(brain.sdcard, TELEMETRY_AUTON_FILE)
+    auton_actions.start()
     if selected_auton == "red_left":
         red_left_negative_corner()
     elif selected_auton == "red_right":
         red_right_positive_corner()
+    auton_actions.wait()
+    auton_actions.stop()
+    telemetry_log.flush(brain.sdcard)
+
+    if LOOP_TIMING:
+        row = loop_timing.report(brain.screen, REPORT_ROW)
+        brain.screen.set_cursor(row, 1)
+        brain.screen.print("actions saved %d ms" % auton_actions.saved_ms())
+        brain.screen.set_cursor(row + 1, 1)
+        brain.screen.print("pose x %.1f y %.1f heading %.1f" % odometry.pose)
+        loop_timing.dump()
 
 # User Control Task
-def drive_task():
-    while True:
-        forward = controller.axis3.position()
-        turn = controller.axis4.position()
+def driver_step():
+    """
+    One pass of driver control. Scheduled every 10 ms from drive_task.
+    """
+    drive_task_timer.tick()
+    forward = controller.axis3.position()
+    turn = controller.axis4.position()
 
-        left_speed = forward + turn
-        right_speed = forward - turn
+    left_speed = forward + turn
+    right_speed = forward - turn
 
-        left_drive_1.spin(REVERSE, left_speed, PERCENT)
-        left_drive_2.spin(REVERSE, left_speed, PERCENT)
-        right_drive_1.spin(REVERSE, right_speed, PERCENT)
-        right_drive_2.spin(REVERSE, right_speed, PERCENT)
+    drivetrain.drive(left_speed, right_speed, REVERSE)
 
-        # Conveyor control
-        conveyor_speed = controller.axis2.position()
-        if conveyor_speed != 0:
-            conveyor_motor1.spin(FORWARD, conveyor_speed, PERCENT)
-        else:
-            conveyor_motor1.stop()
+    # Conveyor control
+    conveyor_speed = controller.axis2.position()
+    if conveyor_speed != 0:
+        conveyor_output.spin(FORWARD, conveyor_speed, PERCENT)
+    else:
+        conveyor_output.stop()
 
-        # Pneumatic control
-        if controller.buttonL1.pressing():
-            piston1.close()
-        elif controller.buttonR1.pressing():
-            piston1.open()
+    # Pistons and reports
+    buttons.poll()
 
-        sleep(10)
+    telemetry_log.log(brain.timer.time(MSEC), left_drive_2.position(DEGREES), right_drive_2.position(DEGREES),
+                      left_speed, right_speed, 0, 0, 0, conveyor_speed, piston1.value(), telemetry.SOURCE_DRIVER)
+
+def show_loop_timing():
+    if LOOP_TIMING:
+        outputs.report(brain.screen, loop_timing.report(brain.screen, REPORT_ROW))
+        loop_timing.dump()
+
+# Driver control buttons, each press fires its action once
+buttons = ButtonEvents(controller, brain.timer)
+buttons.on("L1", PRESSED, piston_output.close)
+buttons.on("R1", PRESSED, piston_output.open)
+buttons.on("X", PRESSED, show_loop_timing)
+
+def flush_telemetry():
+    telemetry_log.flush(brain.sdcard)
+
+def drive_task():
+    # Driver input runs first whenever it is due alongside the temperature check
+    outputs.invalidate_all()
+    drive_task_timer.start()
+    telemetry_log.start(brain.sdcard, TELEMETRY_DRIVER_FILE)
+    scheduler = Scheduler(brain.timer)
+    scheduler.add("driver", driver_step, 10, priority=1)
+    scheduler.add("temperatures", display_motor_temperatures, 500)
+    scheduler.add("telemetry", flush_telemetry, TELEMETRY_FLUSH_MS, priority=-1)
+    scheduler.run()
 
 # Main program
+if inertial is not None:
+    inertial.calibrate()
+    while inertial.is_calibrating():
+        sleep(50)
+odometry.start()
 selected_auton = select_autonomous()
 competition = Competition(drive_task, autonomous)
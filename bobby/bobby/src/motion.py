@@ -8,8 +8,21 @@
 # ---------------------------------------------------------------------------- #
 
 # Library imports
+# The modules below sit beside this file and the brain only gets the one file
+# it downloads: upload simulation/bundle.py's build/motion.py instead of this one.
 from vex import *
 import math
+from motion_profile import build_profile, S_CURVE
+import loop_timing
+from scheduler import Rate
+from controllers import ControlLoop, PID, Feedforward, Settle, SpeedCap, BangBang
+from odometry import Odometry
+import telemetry
+from drivetrain import Drivetrain
+from input_events import ButtonEvents, PRESSED
+from actions import MotorPulse, ActionQueue
+import routine
+import routines
 
 brain = Brain()
 controller = Controller()
@@ -19,6 +32,7 @@ left_drive_1 = Motor(Ports.PORT1, GearSetting.RATIO_18_1, False)
 left_drive_2 = Motor(Ports.PORT2, GearSetting.RATIO_18_1, False)
 right_drive_1 = Motor(Ports.PORT3, GearSetting.RATIO_18_1, True)
 right_drive_2 = Motor(Ports.PORT4, GearSetting.RATIO_18_1, True)
+drivetrain = Drivetrain([left_drive_1, left_drive_2], [right_drive_1, right_drive_2])
 
 # Conveyor motor
 conveyor_motor1 = Motor(Ports.PORT5, GearSetting.RATIO_18_1, False)
@@ -31,118 +45,172 @@ piston1 = Pneumatics(brain.three_wire_port.c)
 CONVEYOR_SPEED = 100
 WHEEL_DIAMETER_INCHES = 4.0
 WHEEL_CIRCUMFERENCE_INCHES = math.pi * WHEEL_DIAMETER_INCHES
+TRACK_WIDTH_INCHES = 12.0  # Between the left and right wheels
 
-flagup = False
+LOOP_TIMING = False  # Set True to measure control loop periods (see loop_timing.py)
 
-def toggle_flag_position(flagup=True):
-    if flagup:
-        flag.spin(FORWARD, 30, PERCENT)
-        sleep(300)
-        flag.stop()
-    else:
-        flag.spin(REVERSE, 25, PERCENT)
-        sleep(300)
-        flag.stop()
+FLAG_PULSE_MS = 300  # how long the flag motor runs for one press
+
+# Driver control flag moves run on their own task so the drive loop never waits on them
+flag_pulse = MotorPulse(flag, FLAG_PULSE_MS)
+
+# Timed autonomous steps that run while the robot keeps driving
+auton_actions = ActionQueue(brain.timer)
 
 def inches_to_degrees(target_distance_inches):
     return (target_distance_inches / WHEEL_CIRCUMFERENCE_INCHES) * 360
 
 # Motion Profiling Constants
 MAX_VELOCITY = 80  # caps the maximum speed to 80% for control
-ACCELERATION = 10  # how quickly robot speeds up (percent per second)
-DECELERATION = 10  # how quickly robot slows down (percent per second)
+ACCELERATION = 200  # how quickly robot speeds up and slows down (percent per second)
+JERK = 2000  # how quickly the acceleration itself changes (percent per second squared)
+PROFILE_SHAPE = S_CURVE  # or motion_profile.TRAPEZOIDAL
+PROFILE_TIMEOUT_MS = 1000  # extra time allowed after the profile ends to settle
+MOTOR_MAX_DPS = 1200  # 18:1 cartridge free speed (200 rpm) in degrees per second
+
+# Planned velocity to percent output; ks and ka are left at 0 until they are
+# measured on the robot, the pid covers friction and acceleration meanwhile
+DRIVE_FEEDFORWARD = Feedforward(ks=0, kv=100 / MOTOR_MAX_DPS, ka=0)
+
+# A move is done once the robot has held within DRIVE_TOLERANCE_DEG of the
+# target, slower than DRIVE_SETTLE_DPS, for DRIVE_SETTLE_MS
+DRIVE_TOLERANCE_DEG = 5
+DRIVE_SETTLE_MS = 60
+DRIVE_SETTLE_DPS = 40
+
+# Turn controller constants, the same as turn_to_angle's in skills.py
+TURN_KP = 4.0  # Percent per degree of heading error
+TURN_KD = 2.0  # Damps the approach to the target
+TURN_MAX_SPEED = 90  # Cruise speed percentage
+TURN_ACCEL = 1200  # Percent per second ramp at the start of a turn
+TURN_DECEL = 14  # Speed cap is TURN_DECEL * sqrt(degrees left), a constant-deceleration curve
+TURN_MIN_SPEED = 10  # Enough to keep the wheels scrubbing near the target
+TURN_TOLERANCE = 1.5  # Degrees
+TURN_SETTLE_MS = 60  # Time inside tolerance before the turn counts as done
+
+# Field pose from the drive encoders, updated every 10 ms on its own task;
+# turns close their loop on its heading
+odometry = Odometry(drivetrain.left, drivetrain.right, WHEEL_CIRCUMFERENCE_INCHES / 360,
+                    TRACK_WIDTH_INCHES, brain.timer)
+
+# Loop timers, these do nothing unless LOOP_TIMING is on
+profile_drive_timer = loop_timing.LoopTimer("profile_drive", 20, brain.timer, enabled=LOOP_TIMING)
+turn_timer = loop_timing.LoopTimer("turn", 10, brain.timer, enabled=LOOP_TIMING)
+drive_task_timer = loop_timing.LoopTimer("drive_task", 10, brain.timer, enabled=LOOP_TIMING)
+
+# Binary telemetry, written to the SD card after autonomous
+TELEMETRY = True
+TELEMETRY_AUTON_FILE = "auton.tlm"
+telemetry_log = telemetry.Telemetry(enabled=TELEMETRY)
 
 def motion_profile_pid_drive(target_distance_inches):
     """
     combines motion profiling with pid control for smooth, accurate movements
     
-    motion profile: handles acceleration/deceleration curves
-    pid: ensures position accuracy
+    motion profile: the whole position/velocity table for the move is built up front
+    pid: corrects the gap between where the profile says we should be and where we are
     
     the function:
     1. calculates target position in degrees
-    2. uses motion profile to control velocity
-    3. applies pid corrections for accuracy
-    4. smoothly accelerates and decelerates
-    5. stops when target is reached within threshold
+    2. builds (or reuses) the profile table for the move
+    3. each tick looks up the planned position and velocity for the elapsed time
+    4. drives at the planned velocity plus a pid correction
+    5. stops once the profile is done and the robot has settled on target,
+       or PROFILE_TIMEOUT_MS after the profile ends
     """
     target_degrees = inches_to_degrees(target_distance_inches)
-    left_drive_1.set_position(0, DEGREES)
-    right_drive_1.set_position(0, DEGREES)
-    
-    current_velocity = 0
-    current_position = 0
-    error_sum = 0
-    last_error = 0
-    threshold = 5  # Adjusted threshold for stopping accuracy
+    profile = build_profile(PROFILE_SHAPE, target_degrees,
+                            MAX_VELOCITY * MOTOR_MAX_DPS / 100,
+                            ACCELERATION * MOTOR_MAX_DPS / 100,
+                            JERK * MOTOR_MAX_DPS / 100)
+    # encoders are never reset, the move is measured from where they are now
+    start_degrees = drivetrain.position()
+
+    def position():
+        return drivetrain.position() - start_degrees
 
     # PID Constants
     KP, KI, KD = get_scaled_pid_constants(target_distance_inches)
 
-    while True:
-        current_position = (left_drive_1.position(DEGREES) + right_drive_1.position(DEGREES)) / 2
-        error = target_degrees - current_position
-
-        if abs(error) < threshold:
-            break
+    loop = ControlLoop(brain.timer, 20, PID(KP, KI, KD, integral_limit=1000),
+                       Settle(DRIVE_TOLERANCE_DEG, DRIVE_SETTLE_MS, DRIVE_SETTLE_DPS),
+                       profile.duration_ms + PROFILE_TIMEOUT_MS, feedforward=DRIVE_FEEDFORWARD,
+                       loop_timer=profile_drive_timer)
 
-        # Accumulate error with anti-windup
-        error_sum = max(min(error_sum + error, 1000), -1000)  
-        derivative = error - last_error
-        pid_output = (KP * error) + (KI * error_sum) + (KD * derivative)
+    def log(output):
+        pid = loop.feedback
+        telemetry_log.log(brain.timer.time(MSEC), left_drive_2.position(DEGREES), right_drive_2.position(DEGREES),
+                          output, output, pid.p_term, pid.i_term, pid.d_term,
+                          conveyor_motor1.velocity(PERCENT), piston1.value(), telemetry.SOURCE_PROFILE_DRIVE)
 
-        # Determine if we should accelerate, maintain speed, or decelerate
-        remaining_distance = target_degrees - current_position
-        if remaining_distance < (current_velocity ** 2) / (2 * DECELERATION):
-            current_velocity = max(current_velocity - DECELERATION * 0.02, 0)
-        else:
-            current_velocity = min(current_velocity + ACCELERATION * 0.02, MAX_VELOCITY)
-
-        # Combine PID output with motion profiling
-        final_output = max(min(pid_output, current_velocity), -current_velocity)
-
-        # Spin motors with the final output
-        left_drive_1.spin(FORWARD, final_output, PERCENT)
-        left_drive_2.spin(FORWARD, final_output, PERCENT)
-        right_drive_1.spin(FORWARD, final_output, PERCENT)
-        right_drive_2.spin(FORWARD, final_output, PERCENT)
-
-        last_error = error
-        sleep(20)
+    result = loop.run(target_degrees, position, drivetrain.velocity,
+                      lambda output: drivetrain.drive(output, output), profile=profile, on_tick=log)
 
-    left_drive_1.stop(BRAKE)
-    left_drive_2.stop(BRAKE)
-    right_drive_1.stop(BRAKE)
-    right_drive_2.stop(BRAKE)
+    drivetrain.stop(BRAKE)
+    return result
 
 def get_scaled_pid_constants(distance_inches):
+    # no KI: once the loop waits for the robot to settle the integral only
+    # winds up behind the profile and pushes it past the target
     if distance_inches > 24:  # Long distance
-        return 0.55, 0.015, 0.2
+        return 0.55, 0, 0.2
     elif distance_inches > 12:  # Medium distance
-        return 0.45, 0.008, 0.12
+        return 0.45, 0, 0.12
     else:  # Short distance
-        return 0.35, 0.004, 0.1
+        return 0.35, 0, 0.1
+
+def turn_to_angle(target_heading, max_speed=TURN_MAX_SPEED, timeout_ms=2000):
+    """
+    turns in place to a heading in degrees, clockwise positive, with
+    closed-loop control on the odometry heading. the speed ramps up at
+    TURN_ACCEL, cruises at max_speed and comes down near the target
+    """
+    pid = PID(TURN_KP, 0, TURN_KD)
+    loop = ControlLoop(brain.timer, 10,
+                       SpeedCap(pid, 10, max_speed, TURN_ACCEL, TURN_DECEL,
+                                floor=BangBang(TURN_MIN_SPEED, TURN_TOLERANCE)),
+                       Settle(TURN_TOLERANCE, TURN_SETTLE_MS), timeout_ms, loop_timer=turn_timer)
+
+    def heading():
+        return odometry.pose[2]
+
+    def log(output):
+        telemetry_log.log(brain.timer.time(MSEC), left_drive_2.position(DEGREES), right_drive_2.position(DEGREES),
+                          output, -output, pid.p_term, pid.i_term, pid.d_term,
+                          conveyor_motor1.velocity(PERCENT), piston1.value(), telemetry.SOURCE_TURN)
+
+    # positive output turns clockwise; the heading alone decides when it has settled
+    result = loop.run(target_heading, heading, lambda: 0,
+                      lambda output: drivetrain.drive(output, -output), on_tick=log)
+
+    drivetrain.stop(BRAKE)
+    return result
 
 def rotate_left():
-    TURN_SPEED = 50
-    TURN_DURATION_MS = 350
+    return turn_degrees(-90)
 
-    left_drive_1.spin(REVERSE, TURN_SPEED, PERCENT)
-    left_drive_2.spin(REVERSE, TURN_SPEED, PERCENT)
-    right_drive_1.spin(FORWARD, TURN_SPEED, PERCENT)
-    right_drive_2.spin(FORWARD, TURN_SPEED, PERCENT)
+def turn_degrees(degrees):
+    # from the current heading, clockwise positive as in routine steps
+    return turn_to_angle(odometry.pose[2] + degrees)
 
-    sleep(TURN_DURATION_MS)
+def set_piston(open_piston):
+    if open_piston:
+        piston1.open()
+    else:
+        piston1.close()
 
-    left_drive_1.stop(BRAKE)
-    left_drive_2.stop(BRAKE)
-    right_drive_1.stop(BRAKE)
-    right_drive_2.stop(BRAKE)
+def run_conveyor(percent, for_ms):
+    if for_ms > 0:
+        auton_actions.run_for(conveyor_motor1, for_ms, FORWARD, percent)
+    elif percent != 0:
+        conveyor_motor1.spin(FORWARD, percent, PERCENT)
+    else:
+        conveyor_motor1.stop()
 
 def autonomous():
     """
-    executes the autonomous routine
-    
+    executes the "motion" routine in routines.py
+
     sequence:
     1. open piston (grab game element)
     2. drive to scoring position (32 inches)
@@ -154,15 +222,24 @@ def autonomous():
     
     each movement uses motion profiling with pid for smooth, accurate execution
     """
-    piston1.open()
-    motion_profile_pid_drive(32)
-    piston1.close()
-    sleep(500)
-    motion_profile_pid_drive(-6)
-    sleep(200)
-    conveyor_motor1.spin(FORWARD, CONVEYOR_SPEED, PERCENT)
-    motion_profile_pid_drive(-5)
-    rotate_left()
+    drivetrain.invalidate()
+    telemetry_log.start(brain.sdcard, TELEMETRY_AUTON_FILE)
+    auton_actions.start()
+    steps = routine.load("motion", routines.ROUTINES["motion"], brain.sdcard)
+    routine.run(steps, {
+        routine.DRIVE: motion_profile_pid_drive,
+        routine.TURN: turn_degrees,
+        routine.PISTON: set_piston,
+        routine.CONVEYOR: run_conveyor,
+        routine.WAIT: sleep,
+    })
+    auton_actions.wait()
+    auton_actions.stop()
+    telemetry_log.flush(brain.sdcard)
+
+    if LOOP_TIMING:
+        loop_timing.report(brain.screen)
+        loop_timing.dump()
 
 def display_controls_summary():
     controller.screen.clear_screen()
@@ -173,22 +250,44 @@ def display_controls_summary():
     controller.screen.set_cursor(3, 1)
     controller.screen.print("R JOYSTICK")
 
+def raise_flag():
+    flag_pulse.start(FORWARD, 30, PERCENT)
+
+def lower_flag():
+    flag_pulse.start(REVERSE, 25, PERCENT)
+
+def show_loop_timing():
+    if LOOP_TIMING:
+        loop_timing.report(brain.screen)
+        loop_timing.dump()
+
+# Driver control buttons, each press fires its action once
+buttons = ButtonEvents(controller, brain.timer)
+buttons.on("L1", PRESSED, piston1.close)
+buttons.on("R1", PRESSED, piston1.close)
+buttons.on("R2", PRESSED, piston1.open)
+buttons.on("L2", PRESSED, piston1.open)
+buttons.on("Up", PRESSED, raise_flag)
+buttons.on("Down", PRESSED, lower_flag)
+buttons.on("X", PRESSED, show_loop_timing)
+
 def drive_task():
     brain.screen.print("Driver control mode started")
     display_controls_summary()
     sleep(1000)
 
+    drivetrain.invalidate()
+    rate = Rate(10, brain.timer)
+    drive_task_timer.start()
     while True:
+        drive_task_timer.tick()
         forward = controller.axis3.position()
         turn = controller.axis4.position()
 
         left_speed = forward + turn
         right_speed = forward - turn
 
-        left_drive_1.spin(REVERSE, left_speed, PERCENT)
-        left_drive_2.spin(REVERSE, left_speed, PERCENT)
-        right_drive_1.spin(REVERSE, right_speed, PERCENT)
-        right_drive_2.spin(REVERSE, right_speed, PERCENT)
+        drivetrain.drive(left_speed, right_speed, REVERSE)
 
         conveyor_speed = controller.axis2.position()
         if conveyor_speed != 0:
@@ -196,22 +295,10 @@ def drive_task():
         else:
             conveyor_motor1.stop()
 
-        if controller.buttonL1.pressing():
-            piston1.close()
-        if controller.buttonR1.pressing():
-            piston1.close()
-        elif controller.buttonR2.pressing():
-            piston1.open()
-        elif controller.buttonL2.pressing():
-            piston1.open()
-        
-        if controller.buttonUp.pressing():
-            toggle_flag_position()
-            sleep(300)
-        elif controller.buttonDown.pressing():
-            toggle_flag_position(False)
-            sleep(300)
-
-        sleep(10)
+        # Pistons, flag and reports
+        buttons.poll()
+
+        rate.sleep()
 
+odometry.start()
 competition = Competition(drive_task, autonomous)
\ No newline at end of file
@@ -0,0 +1,130 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       motion_profile.py                                            #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  precomputed trapezoidal and s-curve motion profiles          #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# A profile is built once per move as a table of position, velocity and
+# acceleration sampled every dt_ms. The control loop then only does one index
+# lookup per tick instead of recomputing the curve.
+#
+# Units are whatever the caller uses for distance (motor degrees in
+# motion.py), with velocity per second and acceleration per second squared.
+
+from array import array
+import math
+
+TRAPEZOIDAL = "trapezoidal"
+S_CURVE = "s_curve"
+
+class MotionProfile:
+    """
+    precomputed position/velocity/acceleration table for one move
+
+    sample(t) returns the planned (position, velocity, acceleration) at t
+    milliseconds into the move. past the end it keeps returning the final
+    resting point.
+    """
+
+    def __init__(self, positions, velocities, accelerations, dt_ms):
+        self.positions = positions
+        self.velocities = velocities
+        self.accelerations = accelerations
+        self.dt_ms = dt_ms
+        self.last = len(positions) - 1
+        self.duration_ms = self.last * dt_ms
+
+    def sample(self, t_ms):
+        i = int(t_ms / self.dt_ms)
+        if i > self.last:
+            i = self.last
+        elif i < 0:
+            i = 0
+        return self.positions[i], self.velocities[i], self.accelerations[i]
+
+def _build(velocities, distance, dt_ms):
+    # integrate the velocity table into positions, then scale so the move
+    # ends exactly on the requested distance despite sampling error
+    dt = dt_ms / 1000
+    positions = array('f', [0.0] * len(velocities))
+    accelerations = array('f', [0.0] * len(velocities))
+    position = 0.0
+    for i in range(1, len(velocities)):
+        position += (velocities[i - 1] + velocities[i]) * dt / 2
+        positions[i] = position
+        accelerations[i - 1] = (velocities[i] - velocities[i - 1]) / dt
+    scale = abs(distance) / position if position > 0 else 0.0
+    sign = -1 if distance < 0 else 1
+    for i in range(len(velocities)):
+        positions[i] *= scale * sign
+        velocities[i] *= scale * sign
+        accelerations[i] *= scale * sign
+    return MotionProfile(positions, velocities, accelerations, dt_ms)
+
+def trapezoidal_profile(distance, max_velocity, acceleration, dt_ms=20):
+    """
+    accelerate at a constant rate, cruise at max_velocity, then decelerate
+    at the same rate. short moves that never reach max_velocity become a
+    triangle.
+    """
+    d = abs(distance)
+    peak = min(max_velocity, math.sqrt(d * acceleration))
+    ramp_time = peak / acceleration if acceleration > 0 else 0
+    cruise_time = (d - peak * ramp_time) / peak if peak > 0 else 0
+    total = 2 * ramp_time + cruise_time
+
+    steps = int(math.ceil(total * 1000 / dt_ms)) + 1
+    velocities = array('f', [0.0] * steps)
+    for i in range(steps):
+        t = i * dt_ms / 1000
+        if t < ramp_time:
+            velocities[i] = acceleration * t
+        elif t < ramp_time + cruise_time:
+            velocities[i] = peak
+        else:
+            velocities[i] = max(peak - acceleration * (t - ramp_time - cruise_time), 0.0)
+    velocities[steps - 1] = 0.0
+    return _build(velocities, distance, dt_ms)
+
+def s_curve_profile(distance, max_velocity, acceleration, jerk, dt_ms=20):
+    """
+    jerk-limited version of the trapezoid. the trapezoid's velocity is run
+    through a moving average as long as one acceleration ramp (acceleration
+    / jerk), which rounds every corner of the acceleration into a slope
+    no steeper than jerk and keeps the same distance.
+    """
+    trapezoid = trapezoidal_profile(abs(distance), max_velocity, acceleration, dt_ms)
+    window = max(int(round(acceleration / jerk * 1000 / dt_ms)), 1) if jerk > 0 else 1
+    source = trapezoid.velocities
+    steps = len(source) + window - 1
+    velocities = array('f', [0.0] * steps)
+    running = 0.0
+    for i in range(steps):
+        if i < len(source):
+            running += source[i]
+        if i >= window:
+            running -= source[i - window]
+        velocities[i] = running / window
+    velocities[steps - 1] = 0.0
+    return _build(velocities, distance, dt_ms)
+
+_cache = {}
+
+def build_profile(shape, distance, max_velocity, acceleration, jerk=0, dt_ms=20):
+    """
+    returns the profile for a move, building it the first time a given move
+    is asked for. autonomous routines repeat the same distances, so most
+    moves after the first cost nothing to set up.
+    """
+    key = (shape, distance, max_velocity, acceleration, jerk, dt_ms)
+    profile = _cache.get(key)
+    if profile is None:
+        if shape == S_CURVE:
+            profile = s_curve_profile(distance, max_velocity, acceleration, jerk, dt_ms)
+        else:
+            profile = trapezoidal_profile(distance, max_velocity, acceleration, dt_ms)
+        _cache[key] = profile
+    return profile
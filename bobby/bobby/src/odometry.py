@@ -0,0 +1,101 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       odometry.py                                                  #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  field pose from the drive encoders                           #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Tracks where the robot is on the field by integrating how far each side's
+# wheels turned since the last update. Runs as its own scheduler task:
+#
+#   odometry = Odometry(drivetrain.left, drivetrain.right,
+#                       WHEEL_CIRCUMFERENCE_INCHES / 360, TRACK_WIDTH_INCHES, brain.timer)
+#   odometry.set_pose(72, 20, 0)
+#   odometry.start()
+#   x, y, heading = odometry.pose
+#
+# x and y are inches and heading is degrees clockwise from +y, the same
+# field frame as the visualizer. Each update treats the robot's motion
+# since the last one as an arc of constant curvature and moves along its
+# chord, which stays exact through turns where stepping along a straight
+# line drifts.
+#
+# The encoders are only ever read, never reset, so drive loops measure
+# their moves from the position they started at instead of zeroing it.
+#
+# pose is a tuple replaced in a single assignment, so another task reading
+# it always gets one consistent (x, y, heading) without a lock. set_pose
+# hands the new pose to the odometry task, which applies it on its next
+# update rather than racing it, and publishes it straight away so a move
+# started right after already sees it.
+
+import math
+from vex import DEGREES, Thread
+from scheduler import Scheduler
+
+class Odometry:
+    """(x, y, heading) integrated from left and right drive encoders"""
+
+    def __init__(self, left, right, inches_per_degree, track_width, timer, period_ms=10):
+        self.left = left
+        self.right = right
+        self.inches_per_degree = inches_per_degree
+        self.track_width = track_width
+        self.timer = timer
+        self.period_ms = period_ms
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0  # radians, clockwise from +y
+        self.last_left = None
+        self.last_right = None
+        self.pending = None
+        self.updates = 0
+        self.scheduler = None
+        self.pose = (0.0, 0.0, 0.0)
+
+    def set_pose(self, x, y, heading):
+        """moves the estimate to (x, y, heading degrees) on the next update"""
+        self.pending = (x, y, heading)
+        self.pose = (float(x), float(y), float(heading))
+
+    def step(self, left_degrees, right_degrees):
+        """integrates one pair of encoder readings and publishes the pose"""
+        pending = self.pending
+        if pending is not None:
+            self.pending = None
+            self.x = float(pending[0])
+            self.y = float(pending[1])
+            self.heading = math.radians(pending[2])
+        elif self.last_left is not None:
+            d_left = (left_degrees - self.last_left) * self.inches_per_degree
+            d_right = (right_degrees - self.last_right) * self.inches_per_degree
+            d_heading = (d_left - d_right) / self.track_width
+            distance = (d_left + d_right) / 2
+            if d_heading != 0:
+                # chord of the arc, shorter than the distance along it
+                half = d_heading / 2
+                distance *= math.sin(half) / half
+            midpoint = self.heading + d_heading / 2
+            self.x += distance * math.sin(midpoint)
+            self.y += distance * math.cos(midpoint)
+            self.heading += d_heading
+        self.last_left = left_degrees
+        self.last_right = right_degrees
+        self.updates += 1
+        self.pose = (self.x, self.y, math.degrees(self.heading))
+
+    def update(self):
+        self.step(self.left.position(DEGREES), self.right.position(DEGREES))
+
+    def start(self):
+        """updates from its own task every period_ms until stop()"""
+        self.scheduler = Scheduler(self.timer)
+        self.scheduler.add("odometry", self.update, self.period_ms)
+        Thread(self.scheduler.run)
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
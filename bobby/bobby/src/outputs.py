@@ -0,0 +1,137 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       outputs.py                                                   #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  actuator outputs that only write when something changed      #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Driver control asks for the same thing every 10 ms: spin the conveyor at
+# the stick value, keep the piston closed. Sending all of that to
+# the devices again and again costs smart port time and makes the solenoids
+# click. An output remembers what it last sent and drops commands that
+# wouldn't change anything:
+#
+#   conveyor = MotorOutput([conveyor_motor1], deadband=2)
+#   piston = PneumaticOutput(piston1)
+#
+#   conveyor.spin(FORWARD, stick, PERCENT)  # only sent when stick moves more than 2%
+#   piston.close()                          # only sent if the piston is open
+#
+# deadband ignores velocity changes that small (a change to exactly zero is
+# always sent). min_interval_ms (with a timer) holds back changes that come
+# too soon after the last one sent. Nothing is queued, so it only suits an
+# output a loop asks for every pass, which gets its latest request through
+# once the interval has passed; an output driven by button presses
+# (input_events.py) asks once and would lose the change, so leave it at 0.
+#
+# Anything that commands the device directly (an autonomous routine, field
+# control disabling the robot) makes the remembered state stale, so call
+# invalidate_all() at the start of each phase.
+
+from vex import MSEC, PERCENT, COAST
+
+outputs = []
+
+class Output:
+    """bookkeeping shared by every output: counters and rate limiting"""
+
+    def __init__(self, name, timer=None, min_interval_ms=0):
+        self.name = name
+        self.timer = timer
+        self.min_interval_ms = min_interval_ms
+        self.last_sent_ms = None
+        self.sent = 0
+        self.suppressed = 0
+        outputs.append(self)
+
+    def too_soon(self):
+        if self.min_interval_ms <= 0 or self.last_sent_ms is None:
+            return False
+        return self.timer.time(MSEC) - self.last_sent_ms < self.min_interval_ms
+
+    def mark_sent(self):
+        self.sent += 1
+        if self.min_interval_ms > 0:
+            self.last_sent_ms = self.timer.time(MSEC)
+
+class MotorOutput(Output):
+    """one or more motors that always get the same command"""
+
+    def __init__(self, motors, timer=None, deadband=0, min_interval_ms=0, name="motor"):
+        Output.__init__(self, name, timer, min_interval_ms)
+        self.motors = motors
+        self.deadband = deadband
+        self.invalidate()
+
+    def invalidate(self):
+        """forget the last command so the next one is always sent"""
+        self.last_direction = None
+        self.last_velocity = None
+        self.last_units = None
+        self.last_stop = None
+
+    def spin(self, direction, velocity, units=PERCENT):
+        if self.last_stop is None and direction is self.last_direction and units is self.last_units:
+            change = abs(velocity - self.last_velocity)
+            if change == 0 or (change <= self.deadband and velocity != 0) or self.too_soon():
+                self.suppressed += 1
+                return
+        for motor in self.motors:
+            motor.spin(direction, velocity, units)
+        self.mark_sent()
+        self.last_direction = direction
+        self.last_velocity = velocity
+        self.last_units = units
+        self.last_stop = None
+
+    def stop(self, mode=COAST):
+        if mode is self.last_stop:
+            self.suppressed += 1
+            return
+        for motor in self.motors:
+            motor.stop(mode)
+        self.mark_sent()
+        self.last_direction = None
+        self.last_stop = mode
+
+class PneumaticOutput(Output):
+    """a Pneumatics piston that is only told to open or close when it isn't already"""
+
+    def __init__(self, piston, timer=None, min_interval_ms=0, name="piston"):
+        Output.__init__(self, name, timer, min_interval_ms)
+        self.piston = piston
+        self.invalidate()
+
+    def invalidate(self):
+        self.state = None
+
+    def set(self, state):
+        if state == self.state or self.too_soon():
+            self.suppressed += 1
+            return
+        if state:
+            self.piston.open()
+        else:
+            self.piston.close()
+        self.mark_sent()
+        self.state = state
+
+    def open(self):
+        self.set(True)
+
+    def close(self):
+        self.set(False)
+
+def invalidate_all():
+    for output in outputs:
+        output.invalidate()
+
+def report(screen, row=1):
+    """prints sent/suppressed counts, one output per line, starting at row"""
+    for output in outputs:
+        screen.set_cursor(row, 1)
+        screen.print("%s sent %d skipped %d" % (output.name, output.sent, output.suppressed))
+        row += 1
+    return row
@@ -0,0 +1,289 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       path.py                                                      #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  smooth paths through field waypoints, for pursuit.py        #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# smooth_path runs a Catmull-Rom spline through field waypoints (inches)
+# and resamples it at even arc-length spacing, so point i is i * spacing
+# inches along the path and a point some distance along is found by
+# dividing instead of searching:
+#
+#   path = smooth_path([(72, 52), (96, 76)], start=odometry.pose)
+#   i = path.nearest(x, y)
+#   tx, ty = path.point_at(path.distance_at(i) + 8)
+#
+# The nearest point comes from a grid of buckets over the points
+# (PathIndex) rather than measuring the distance to every one of them.
+# Nothing here touches a device, so the visualizer draws the same paths.
+#
+# Paths for the routines' goto steps are also made ahead of time by
+# simulation/path_tables.py, with a speed limit at every point so the robot
+# slows before a tight bend, and saved to the sd card as one table. The
+# brain loads it at startup, which only unpacks numbers:
+#
+#   table = load_table(brain.sdcard, "paths.pth")
+#   path = find_path(table, points, backwards, odometry.pose) or smooth_path(...)
+#
+# A table path is found by a checksum of its goto points, and only used
+# when the robot is within START_TOLERANCE of where it was planned to
+# start, so a stale table or a routine gone off plan falls back to a spline
+# built on the spot.
+
+import math
+import struct
+from array import array
+from routine import checksum
+
+PATH_SPACING = 1.0  # inches between path points
+SPLINE_SAMPLES = 16  # points per waypoint gap before resampling
+INDEX_CELL = 6.0  # inches, PathIndex bucket size
+START_TOLERANCE = 3.0  # inches between the robot and a table path's start
+
+TABLE_MAGIC = b'BPTH'
+TABLE_VERSION = 1
+TABLE_HEADER_FORMAT = '<4sHH'  # magic, version, path count
+TABLE_HEADER_SIZE = struct.calcsize(TABLE_HEADER_FORMAT)
+TABLE_PATH_FORMAT = '<IBxHf'  # key, backwards, point count, spacing
+TABLE_PATH_SIZE = struct.calcsize(TABLE_PATH_FORMAT)
+TABLE_POINT_FORMAT = 'hhH'  # x, y, speed, in TABLE_UNITS
+TABLE_POINT_SIZE = struct.calcsize('<' + TABLE_POINT_FORMAT)
+TABLE_UNITS = 100  # per inch and per inch per second
+
+class Path:
+    """
+    points spacing inches apart along a curve, point i at i * spacing
+    inches from the start. speeds, if given, caps the speed at each point.
+    """
+
+    def __init__(self, xs, ys, spacing, speeds=None):
+        self.xs = xs
+        self.ys = ys
+        self.spacing = spacing
+        self.speeds = speeds
+        self.last = len(xs) - 1
+        # every gap is spacing except the last, which ends on the final waypoint
+        tail = 0.0
+        if self.last > 0:
+            tail = math.sqrt((xs[-1] - xs[-2]) ** 2 + (ys[-1] - ys[-2]) ** 2)
+        self.length = spacing * (self.last - 1) + tail if self.last > 0 else 0.0
+        # direction the path leaves its final point in, for running past the end
+        self.end_x = 0.0
+        self.end_y = 1.0
+        if tail > 0:
+            self.end_x = (xs[-1] - xs[-2]) / tail
+            self.end_y = (ys[-1] - ys[-2]) / tail
+        self.index = PathIndex(self)
+
+    def distance_at(self, i):
+        """inches along the path to point i"""
+        if i >= self.last:
+            return self.length
+        return i * self.spacing
+
+    def point_at(self, distance):
+        """(x, y) distance inches along the path, continuing straight past its end"""
+        xs = self.xs
+        ys = self.ys
+        if distance >= self.length:
+            over = distance - self.length
+            return xs[-1] + over * self.end_x, ys[-1] + over * self.end_y
+        if distance <= 0:
+            return xs[0], ys[0]
+        i = int(distance / self.spacing)
+        if i >= self.last:
+            i = self.last - 1
+        gap = self.distance_at(i + 1) - i * self.spacing
+        t = (distance - i * self.spacing) / gap if gap > 0 else 0.0
+        return xs[i] + (xs[i + 1] - xs[i]) * t, ys[i] + (ys[i + 1] - ys[i]) * t
+
+    def speed_at(self, i):
+        if self.speeds is None:
+            return None
+        return self.speeds[i]
+
+    def nearest(self, x, y, first=0, last=None):
+        """index of the path point closest to (x, y) among points first..last"""
+        if last is None or last > self.last:
+            last = self.last
+        return self.index.nearest(x, y, first, last)
+
+class PathIndex:
+    """
+    the points of a Path in square buckets cell inches wide, to find the
+    nearest point without measuring the distance to all of them
+    """
+
+    def __init__(self, path, cell=INDEX_CELL):
+        self.path = path
+        self.cell = cell
+        self.buckets = {}
+        for i in range(path.last + 1):
+            key = (int(path.xs[i] // cell), int(path.ys[i] // cell))
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [i]
+            else:
+                bucket.append(i)
+
+    def nearest(self, x, y, first, last):
+        xs = self.path.xs
+        ys = self.path.ys
+        cx = int(x // self.cell)
+        cy = int(y // self.cell)
+        best = -1
+        best_distance = 0.0
+        for kx in (cx - 1, cx, cx + 1):
+            for ky in (cy - 1, cy, cy + 1):
+                bucket = self.buckets.get((kx, ky))
+                if bucket is None:
+                    continue
+                for i in bucket:
+                    if i < first or i > last:
+                        continue
+                    d = (xs[i] - x) ** 2 + (ys[i] - y) ** 2
+                    if best < 0 or d < best_distance:
+                        best = i
+                        best_distance = d
+        # anything outside the 3x3 buckets is at least a cell away, so a
+        # match closer than that is the nearest; otherwise check them all
+        if best >= 0 and best_distance <= self.cell * self.cell:
+            return best
+        for i in range(first, last + 1):
+            d = (xs[i] - x) ** 2 + (ys[i] - y) ** 2
+            if best < 0 or d < best_distance:
+                best = i
+                best_distance = d
+        return best
+
+def _hermite(p0, p1, m0, m1, t):
+    t2 = t * t
+    t3 = t2 * t
+    return ((2 * t3 - 3 * t2 + 1) * p0 + (t3 - 2 * t2 + t) * m0
+            + (-2 * t3 + 3 * t2) * p1 + (t3 - t2) * m1)
+
+def smooth_path(waypoints, spacing=PATH_SPACING, start=None, samples=SPLINE_SAMPLES):
+    """
+    a Path through waypoints [(x, y), ...] along a Catmull-Rom spline.
+    start, e.g. odometry.pose, puts its (x, y) in front of the waypoints.
+    """
+    points = [(float(p[0]), float(p[1])) for p in waypoints]
+    if start is not None:
+        points.insert(0, (float(start[0]), float(start[1])))
+    if len(points) < 2:
+        raise ValueError("a path needs at least two points")
+    n = len(points)
+
+    # tangents: half the gap between each point's neighbours, one-sided at the ends
+    tangents = []
+    for i in range(n):
+        a = points[max(i - 1, 0)]
+        b = points[min(i + 1, n - 1)]
+        scale = 0.5 if 0 < i < n - 1 else 1.0
+        tangents.append(((b[0] - a[0]) * scale, (b[1] - a[1]) * scale))
+
+    xs = array('f', [points[0][0]])
+    ys = array('f', [points[0][1]])
+    travelled = 0.0
+    next_at = spacing
+    last_x, last_y = points[0]
+    for i in range(n - 1):
+        (x0, y0), (x1, y1) = points[i], points[i + 1]
+        (mx0, my0), (mx1, my1) = tangents[i], tangents[i + 1]
+        for k in range(1, samples + 1):
+            t = k / samples
+            x = _hermite(x0, x1, mx0, mx1, t)
+            y = _hermite(y0, y1, my0, my1, t)
+            step = math.sqrt((x - last_x) ** 2 + (y - last_y) ** 2)
+            # emit every spacing mark this piece of the curve passes
+            while step > 0 and travelled + step >= next_at:
+                f = (next_at - travelled) / step
+                xs.append(last_x + (x - last_x) * f)
+                ys.append(last_y + (y - last_y) * f)
+                next_at += spacing
+            travelled += step
+            last_x = x
+            last_y = y
+    if (xs[-1] - last_x) ** 2 + (ys[-1] - last_y) ** 2 > 1e-6:
+        xs.append(last_x)
+        ys.append(last_y)
+    elif len(xs) > 1:
+        # the curve ended on a spacing mark, make it exactly the last waypoint
+        xs[-1] = last_x
+        ys[-1] = last_y
+    return Path(xs, ys, spacing)
+
+def path_key(points, backwards=False):
+    """checksum of a run of goto points, the same for the table and the routine"""
+    text = " ".join("%g %g" % (x, y) for x, y in points)
+    if backwards:
+        text += " back"
+    return checksum(text)
+
+def pack_table(entries):
+    """entries [(key, backwards, Path with speeds), ...] -> table bytes"""
+    size = TABLE_HEADER_SIZE
+    for key, backwards, path in entries:
+        size += TABLE_PATH_SIZE + TABLE_POINT_SIZE * (path.last + 1)
+    data = bytearray(size)
+    struct.pack_into(TABLE_HEADER_FORMAT, data, 0, TABLE_MAGIC, TABLE_VERSION, len(entries))
+    offset = TABLE_HEADER_SIZE
+    for key, backwards, path in entries:
+        count = path.last + 1
+        struct.pack_into(TABLE_PATH_FORMAT, data, offset, key, 1 if backwards else 0, count, path.spacing)
+        offset += TABLE_PATH_SIZE
+        values = []
+        for i in range(count):
+            values.append(int(round(path.xs[i] * TABLE_UNITS)))
+            values.append(int(round(path.ys[i] * TABLE_UNITS)))
+            values.append(int(round(path.speeds[i] * TABLE_UNITS)))
+        struct.pack_into('<' + TABLE_POINT_FORMAT * count, data, offset, *values)
+        offset += TABLE_POINT_SIZE * count
+    return data
+
+def unpack_table(data):
+    """table bytes -> {(key, backwards): Path}, or None if data isn't a table"""
+    if len(data) < TABLE_HEADER_SIZE:
+        return None
+    magic, version, count = struct.unpack_from(TABLE_HEADER_FORMAT, data, 0)
+    if magic != TABLE_MAGIC or version != TABLE_VERSION:
+        return None
+    table = {}
+    offset = TABLE_HEADER_SIZE
+    scale = 1 / TABLE_UNITS
+    for _ in range(count):
+        if offset + TABLE_PATH_SIZE > len(data):
+            return None
+        key, backwards, points, spacing = struct.unpack_from(TABLE_PATH_FORMAT, data, offset)
+        offset += TABLE_PATH_SIZE
+        if offset + TABLE_POINT_SIZE * points > len(data):
+            return None
+        values = struct.unpack_from('<' + TABLE_POINT_FORMAT * points, data, offset)
+        offset += TABLE_POINT_SIZE * points
+        xs = array('f', [v * scale for v in values[0::3]])
+        ys = array('f', [v * scale for v in values[1::3]])
+        speeds = array('f', [v * scale for v in values[2::3]])
+        table[(key, backwards != 0)] = Path(xs, ys, spacing, speeds)
+    return table
+
+def load_table(sdcard, filename):
+    """the paths saved on the sd card, or an empty table without a card or file"""
+    if sdcard is None or not sdcard.is_inserted() or not sdcard.exists(filename):
+        return {}
+    table = unpack_table(sdcard.loadfile(filename))
+    if table is None:
+        print("%s isn't a path table, making paths on the spot" % filename)
+        return {}
+    return table
+
+def find_path(table, points, backwards, pose, tolerance=START_TOLERANCE):
+    """the table path for this run of gotos if the robot is close to its start, else None"""
+    path = table.get((path_key(points, backwards), backwards))
+    if path is None:
+        return None
+    if (path.xs[0] - pose[0]) ** 2 + (path.ys[0] - pose[1]) ** 2 > tolerance * tolerance:
+        return None
+    return path
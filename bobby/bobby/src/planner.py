@@ -0,0 +1,363 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       planner.py                                                   #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  theta* paths around field elements on an occupancy grid      #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Finds a way across the field that keeps the robot clear of the ladder,
+# the stakes and (optionally) the mobile goals:
+#
+#   grid = FieldGrid(cell=4)
+#   planner = Planner(grid)
+#   points = planner.plan((72, 20), (120, 100))    # [(x, y), ...] field inches
+#   follow_path(points[1:])                        # through pursuit.py
+#   steps = as_steps(points, heading=0)            # or routine drive/turn steps
+#
+# The field is split into square cells cell inches wide. Cells an obstacle
+# covers are blocked, and a distance transform gives every cell its
+# clearance, inches to the nearest blocked cell or wall. A cell is free for
+# the robot when its clearance is at least robot_radius, which makes the
+# robot a point and the obstacles fatter by its size.
+#
+# plan() searches with theta*: A* over the cells, except that a cell may
+# take its parent's parent as its own when the straight line between them
+# is clear, so the path comes out as a few straight legs at any angle
+# instead of a staircase. The heuristic is a second distance transform, the
+# cost to reach the goal cell from every free cell, worked out once per
+# goal and kept, so the search walks nearly straight down it and a goal
+# that can't be reached is known before searching. Whole plans are kept
+# too, by start and goal cell.
+#
+# A goal inside an obstacle's margin (a mobile goal the robot drives up to)
+# is planned to the nearest free cell, with the goal itself as the last
+# point. Obstacles are circles (x, y, radius) and segments (x0, y0, x1, y1,
+# radius) in inches; FIELD_OBSTACLES is this season's field, the same one
+# as the visualizer's TopView.png.
+
+import math
+import heapq
+from array import array
+import routine
+
+FIELD_INCHES = 144
+ROBOT_RADIUS = 9.0  # inches, between half the robot's width and its corner
+PLAN_CACHE_SIZE = 32
+HEURISTIC_CACHE_SIZE = 4
+INFINITY = float('inf')
+
+LADDER = ((72, 48), (96, 72), (72, 96), (48, 72))
+LADDER_OBSTACLES = (
+    [(x, y, 3.0) for x, y in LADDER]  # posts
+    + [(LADDER[i][0], LADDER[i][1], LADDER[i - 1][0], LADDER[i - 1][1], 1.5) for i in range(4)]  # rungs
+)
+STAKES = ((72, 1.5, 2.0), (72, 142.5, 2.0), (1.5, 72, 2.0), (142.5, 72, 2.0))  # wall and alliance stakes
+MOBILE_GOALS = ((48, 48, 5.0), (96, 48, 5.0), (48, 96, 5.0), (96, 96, 5.0), (72, 120, 5.0))
+FIELD_OBSTACLES = tuple(LADDER_OBSTACLES) + STAKES
+
+# the 8 neighbours of a cell: column step, row step, length in cells
+NEIGHBOURS = ((1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+              (1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (-1, -1, math.sqrt(2)))
+
+def _segment_distance(px, py, x0, y0, x1, y1):
+    dx = x1 - x0
+    dy = y1 - y0
+    length2 = dx * dx + dy * dy
+    t = 0.0
+    if length2 > 0:
+        t = max(0.0, min(1.0, ((px - x0) * dx + (py - y0) * dy) / length2))
+    return math.sqrt((px - x0 - t * dx) ** 2 + (py - y0 - t * dy) ** 2)
+
+class FieldGrid:
+    """the field as square cells, with each cell's clearance and whether the robot fits"""
+
+    def __init__(self, cell=4.0, robot_radius=ROBOT_RADIUS, obstacles=FIELD_OBSTACLES,
+                 field=FIELD_INCHES):
+        self.n = int(math.ceil(field / cell))
+        self.cell = field / self.n  # stretched a little so the cells end on the far wall
+        self.field = field
+        self.robot_radius = robot_radius
+        n = self.n
+        self.blocked = bytearray(n * n)
+        for obstacle in obstacles:
+            self.add(obstacle)
+        self.clearance = self.distance_transform()
+        self.free = bytearray(n * n)
+        for i in range(n * n):
+            if self.clearance[i] >= robot_radius:
+                self.free[i] = 1
+
+    def center(self, i):
+        """field (x, y) of the middle of cell i"""
+        return ((i % self.n + 0.5) * self.cell, (i // self.n + 0.5) * self.cell)
+
+    def cell_at(self, x, y):
+        """the cell field point (x, y) is in, clamped to the field"""
+        n = self.n
+        col = min(max(int(x / self.cell), 0), n - 1)
+        row = min(max(int(y / self.cell), 0), n - 1)
+        return row * n + col
+
+    def add(self, obstacle):
+        """blocks every cell whose middle is inside a circle or fat segment"""
+        if len(obstacle) == 3:
+            x0, y0, radius = obstacle
+            x1, y1 = x0, y0
+        else:
+            x0, y0, x1, y1, radius = obstacle
+        n = self.n
+        cell = self.cell
+        first_col = max(int((min(x0, x1) - radius) / cell), 0)
+        last_col = min(int((max(x0, x1) + radius) / cell), n - 1)
+        first_row = max(int((min(y0, y1) - radius) / cell), 0)
+        last_row = min(int((max(y0, y1) + radius) / cell), n - 1)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                x = (col + 0.5) * cell
+                y = (row + 0.5) * cell
+                if _segment_distance(x, y, x0, y0, x1, y1) <= radius:
+                    self.blocked[row * n + col] = 1
+
+    def distance_transform(self):
+        """
+        inches from each cell's middle to the nearest blocked cell or wall, a
+        two pass chamfer: each cell takes the best of its already visited
+        neighbours plus the step to them, top-left to bottom-right and back
+        """
+        n = self.n
+        cell = self.cell
+        diagonal = cell * math.sqrt(2)
+        field = self.field
+        d = array('f', [0.0] * (n * n))
+        for row in range(n):
+            y = (row + 0.5) * cell
+            for col in range(n):
+                i = row * n + col
+                if not self.blocked[i]:
+                    x = (col + 0.5) * cell
+                    d[i] = min(x, y, field - x, field - y)
+        forward = ((-1, 0, cell), (0, -1, cell), (-1, -1, diagonal), (1, -1, diagonal))
+        backward = ((1, 0, cell), (0, 1, cell), (1, 1, diagonal), (-1, 1, diagonal))
+        for steps, rows, cols in ((forward, range(n), range(n)),
+                                  (backward, range(n - 1, -1, -1), range(n - 1, -1, -1))):
+            for row in rows:
+                for col in cols:
+                    i = row * n + col
+                    best = d[i]
+                    for dc, dr, step in steps:
+                        c = col + dc
+                        r = row + dr
+                        if 0 <= c < n and 0 <= r < n and d[r * n + c] + step < best:
+                            best = d[r * n + c] + step
+                    d[i] = best
+        return d
+
+    def passable(self, i, dc, dr):
+        """whether the robot can step from cell i by (dc, dr) without cutting a blocked corner"""
+        n = self.n
+        col = i % n + dc
+        row = i // n + dr
+        if not (0 <= col < n and 0 <= row < n) or not self.free[row * n + col]:
+            return False
+        if dc != 0 and dr != 0:
+            return self.free[i + dc] and self.free[i + dr * n]
+        return True
+
+    def line_of_sight(self, a, b):
+        """
+        whether every cell the straight line between the middles of cells a
+        and b passes through is free, walking them in order along the line
+        """
+        n = self.n
+        col, row = a % n, a // n
+        end_col, end_row = b % n, b // n
+        dc = end_col - col
+        dr = end_row - row
+        step_c = 1 if dc > 0 else -1
+        step_r = 1 if dr > 0 else -1
+        # how far along the line (0 to 1) the next column / row boundary is
+        t_col = 0.5 / abs(dc) if dc else INFINITY
+        t_row = 0.5 / abs(dr) if dr else INFINITY
+        delta_col = 1 / abs(dc) if dc else INFINITY
+        delta_row = 1 / abs(dr) if dr else INFINITY
+        free = self.free
+        while col != end_col or row != end_row:
+            if abs(t_col - t_row) < 1e-9:
+                # through a corner: both cells beside it have to be free
+                if not free[row * n + col + step_c] or not free[(row + step_r) * n + col]:
+                    return False
+                col += step_c
+                row += step_r
+                t_col += delta_col
+                t_row += delta_row
+            elif t_col < t_row:
+                col += step_c
+                t_col += delta_col
+            else:
+                row += step_r
+                t_row += delta_row
+            if not free[row * n + col]:
+                return False
+        return True
+
+    def nearest_free(self, i):
+        """the free cell closest to cell i, or None if there are none"""
+        if self.free[i]:
+            return i
+        best = None
+        best_distance = INFINITY
+        x, y = self.center(i)
+        for j in range(self.n * self.n):
+            if self.free[j]:
+                cx, cy = self.center(j)
+                d = (cx - x) ** 2 + (cy - y) ** 2
+                if d < best_distance:
+                    best = j
+                    best_distance = d
+        return best
+
+class Planner:
+    """theta* over a FieldGrid, remembering cost-to-goal fields and whole plans"""
+
+    def __init__(self, grid, plan_cache_size=PLAN_CACHE_SIZE, heuristic_cache_size=HEURISTIC_CACHE_SIZE):
+        self.grid = grid
+        self.plan_cache_size = plan_cache_size
+        self.heuristic_cache_size = heuristic_cache_size
+        self.plans = {}
+        self.plan_order = []
+        self.heuristics = {}
+        self.heuristic_order = []
+        self.expanded = 0  # cells the last search expanded
+
+    def cost_to_goal(self, goal):
+        """
+        inches from every free cell to cell goal moving between cell
+        middles, INFINITY where the goal can't be reached. kept for the
+        last few goals.
+        """
+        field = self.heuristics.get(goal)
+        if field is not None:
+            return field
+        grid = self.grid
+        n = grid.n
+        cell = grid.cell
+        field = array('f', [INFINITY] * (n * n))
+        field[goal] = 0.0
+        done = bytearray(n * n)
+        heap = [(0.0, goal)]
+        while heap:
+            d, i = heapq.heappop(heap)
+            if done[i]:
+                continue
+            done[i] = 1
+            for dc, dr, length in NEIGHBOURS:
+                if grid.passable(i, dc, dr):
+                    j = i + dr * n + dc
+                    nd = d + length * cell
+                    if not done[j] and nd < field[j]:
+                        field[j] = nd
+                        heapq.heappush(heap, (nd, j))
+        self.heuristics[goal] = field
+        self.heuristic_order.append(goal)
+        if len(self.heuristic_order) > self.heuristic_cache_size:
+            del self.heuristics[self.heuristic_order.pop(0)]
+        return field
+
+    def search(self, start, goal):
+        """theta* from cell start to cell goal, the cells at the corners of the path or None"""
+        grid = self.grid
+        n = grid.n
+        h = self.cost_to_goal(goal)
+        if h[start] == INFINITY:
+            return None
+        g = {start: 0.0}
+        parent = {start: start}
+        closed = bytearray(n * n)
+        heap = [(h[start], start)]
+        self.expanded = 0
+        while heap:
+            _, s = heapq.heappop(heap)
+            if closed[s]:
+                continue
+            closed[s] = 1
+            self.expanded += 1
+            if s == goal:
+                break
+            p = parent[s]
+            px, py = grid.center(p)
+            for dc, dr, length in NEIGHBOURS:
+                if not grid.passable(s, dc, dr):
+                    continue
+                t = s + dr * n + dc
+                if closed[t]:
+                    continue
+                if grid.line_of_sight(p, t):
+                    tx, ty = grid.center(t)
+                    cost = g[p] + math.sqrt((tx - px) ** 2 + (ty - py) ** 2)
+                    via = p
+                else:
+                    cost = g[s] + length * grid.cell
+                    via = s
+                if cost < g.get(t, INFINITY):
+                    g[t] = cost
+                    parent[t] = via
+                    heapq.heappush(heap, (cost + h[t], t))
+        if goal not in parent:
+            return None
+        corners = [goal]
+        while corners[-1] != start:
+            corners.append(parent[corners[-1]])
+        corners.reverse()
+        return corners
+
+    def plan(self, start, goal):
+        """
+        field points [(x, y), ...] from start to goal around the obstacles,
+        beginning and ending on them exactly, or None if there is no way
+        """
+        grid = self.grid
+        start_cell = grid.cell_at(start[0], start[1])
+        goal_cell = grid.cell_at(goal[0], goal[1])
+        key = (start_cell, goal_cell)
+        corners = self.plans.get(key)
+        if corners is None:
+            # a robot pushed up against something starts from the nearest cell it fits in
+            first = grid.nearest_free(start_cell)
+            last = grid.nearest_free(goal_cell)
+            if first is None or last is None:
+                return None
+            corners = self.search(first, last)
+            if corners is None:
+                return None
+            self.plans[key] = corners
+            self.plan_order.append(key)
+            if len(self.plan_order) > self.plan_cache_size:
+                del self.plans[self.plan_order.pop(0)]
+        points = [(float(start[0]), float(start[1]))]
+        points += [grid.center(i) for i in corners[1:-1]]
+        if corners[-1] != goal_cell:
+            points.append(grid.center(corners[-1]))
+        points.append((float(goal[0]), float(goal[1])))
+        return points
+
+def as_steps(points, heading):
+    """
+    routine steps (turn, then drive, per leg) for driving points
+    [(x, y), ...] starting at heading degrees, in field inches and degrees
+    """
+    steps = []
+    for i in range(1, len(points)):
+        dx = points[i][0] - points[i - 1][0]
+        dy = points[i][1] - points[i - 1][1]
+        distance = math.sqrt(dx * dx + dy * dy)
+        if distance == 0:
+            continue
+        bearing = math.degrees(math.atan2(dx, dy))
+        turn = (bearing - heading + 180) % 360 - 180
+        if turn != 0:
+            steps.append((routine.TURN, turn, 0))
+        steps.append((routine.DRIVE, distance, 0))
+        heading = bearing
+    return steps
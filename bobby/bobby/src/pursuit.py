@@ -0,0 +1,137 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       pursuit.py                                                   #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  pure pursuit path following on the odometry pose            #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# A chain of pid_drive moves and point turns stops the robot at every
+# corner. Following a path instead keeps it rolling: the path is a smooth
+# curve through field waypoints and the robot steers toward a point a fixed
+# distance further along it, the way a driver looks ahead down the road.
+#
+#   path = smooth_path([(72, 20), (72, 52), (96, 76)])
+#   follower = PurePursuit(drivetrain, odometry, brain.timer, TRACK_WIDTH_INCHES,
+#                          free_speed=41.9, max_speed=31.4, acceleration=200)
+#   follower.follow(path)
+#   follower.follow(smooth_path([(96, 76), (72, 52)], start=odometry.pose), reverse=True)
+#
+# Positions are inches in odometry.py's field frame and speeds are inches
+# per second; free_speed is how fast the robot drives at 100%.
+#
+# Paths come from path.py, evenly spaced along their length, so the
+# lookahead point is found by dividing instead of searching. The nearest
+# point to the robot is only looked for a little ahead of the last one
+# found, so a path that crosses itself can't make the robot skip a loop.
+#
+# follow() slows for the end of the path so it arrives at acceleration
+# instead of overshooting, brakes there and returns controllers.SETTLED, or
+# TIMED_OUT if it never got there.
+
+import math
+from vex import MSEC, BRAKE
+from scheduler import Rate
+from controllers import SETTLED, TIMED_OUT
+
+class PurePursuit:
+    """steers the drivetrain along a Path from the odometry pose"""
+
+    def __init__(self, drivetrain, odometry, timer, track_width, free_speed, max_speed,
+                 acceleration, lookahead=8.0, end_tolerance=1.0, period_ms=10,
+                 timeout_margin_ms=1000):
+        self.drivetrain = drivetrain
+        self.odometry = odometry
+        self.timer = timer
+        self.track_width = track_width
+        self.free_speed = free_speed  # inches per second at 100%
+        self.max_speed = max_speed
+        self.acceleration = acceleration  # inches per second squared, speeding up and slowing down
+        self.lookahead = lookahead
+        self.end_tolerance = end_tolerance
+        self.period_ms = period_ms
+        self.timeout_margin_ms = timeout_margin_ms
+        self.left = 0.0
+        self.right = 0.0
+        self.curvature = 0.0
+        self.result = None
+
+    def steer(self, path, x, y, heading, nearest, reverse):
+        """
+        curvature toward the lookahead point from pose (x, y, heading
+        degrees), positive to the right, and how far is left to the end
+        """
+        h = math.radians(heading)
+        if reverse:
+            h += math.pi
+        sh = math.sin(h)
+        ch = math.cos(h)
+        along = path.distance_at(nearest)
+        if along + self.lookahead >= path.length:
+            # close to the end: measure to the end point itself, so being
+            # short of it or past it both count
+            remaining = ((path.xs[-1] - x) * path.end_x + (path.ys[-1] - y) * path.end_y)
+        else:
+            remaining = path.length - along
+        tx, ty = path.point_at(along + self.lookahead)
+        dx = tx - x
+        dy = ty - y
+        lateral = dx * ch - dy * sh
+        d2 = dx * dx + dy * dy
+        curvature = 2 * lateral / d2 if d2 > 0 else 0.0
+        return curvature, remaining
+
+    def follow(self, path, reverse=False, on_tick=None):
+        """
+        drives along path, backwards with reverse, and brakes at its end.
+        on_tick(left, right) runs after each command with the percent
+        outputs. returns SETTLED, or TIMED_OUT after the time the path
+        should take at max_speed plus timeout_margin_ms.
+        """
+        dt = self.period_ms / 1000
+        timeout_ms = path.length / self.max_speed * 1000 + self.timeout_margin_ms
+        percent = 100 / self.free_speed
+        half_track = self.track_width / 2
+        window = int(2 * self.lookahead / path.spacing) + 2
+
+        x, y, heading = self.odometry.pose
+        nearest = path.nearest(x, y)
+        speed = 0.0
+        start = self.timer.time(MSEC)
+        rate = Rate(self.period_ms, self.timer)
+        while True:
+            x, y, heading = self.odometry.pose
+            nearest = path.nearest(x, y, nearest, nearest + window)
+            curvature, remaining = self.steer(path, x, y, heading, nearest, reverse)
+            if remaining <= self.end_tolerance:
+                self.result = SETTLED
+                break
+            if self.timer.time(MSEC) - start >= timeout_ms:
+                self.result = TIMED_OUT
+                break
+
+            target = min(self.max_speed, math.sqrt(2 * self.acceleration * remaining))
+            limit = path.speed_at(nearest)
+            if limit is not None and limit < target:
+                target = limit
+            speed = min(target, speed + self.acceleration * dt)
+
+            left = speed * (1 + curvature * half_track)
+            right = speed * (1 - curvature * half_track)
+            fastest = max(abs(left), abs(right))
+            if fastest > self.max_speed:
+                # keep the curvature and give up speed on a tight bend
+                left *= self.max_speed / fastest
+                right *= self.max_speed / fastest
+            if reverse:
+                left, right = -right, -left
+            self.curvature = curvature
+            self.left = left * percent
+            self.right = right * percent
+            self.drivetrain.drive(self.left, self.right)
+            if on_tick is not None:
+                on_tick(self.left, self.right)
+            rate.sleep()
+        self.drivetrain.stop(BRAKE)
+        return self.result
@@ -31,6 +31,25 @@ piston1 = Pneumatics(brain.three_wire_port.c)
 CONVEYOR_SPEED = 100
 WHEEL_DIAMETER_INCHES = 4.0
 WHEEL_CIRCUMFERENCE_INCHES = math.pi * WHEEL_DIAMETER_INCHES
+TRACK_WIDTH_INCHES = 12.0  # Distance between left and right wheels
+
+# Inertial sensor, set to Inertial(Ports.PORTx) once one is mounted.
+# Without it turns close the loop on encoder-derived heading.
+inertial = None
+
+# turn_to_angle, get_heading and these constants are the same in skills.py,
+# actualskills.py and redleftMOREbob.py. Each of those is uploaded on its own
+# as a single file, so a change goes into all three;
+# simulation/turn_benchmark.py --copies says if they have drifted apart.
+# Turn controller constants
+TURN_KP = 4.0  # Percent per degree of heading error
+TURN_KD = 2.0  # Damps the approach to the target
+TURN_MAX_SPEED = 90  # Cruise speed percentage
+TURN_ACCEL = 1200  # Percent per second ramp at the start of a turn
+TURN_DECEL = 14  # Speed cap is TURN_DECEL * sqrt(degrees left), a constant-deceleration curve
+TURN_MIN_SPEED = 10  # Enough to keep the wheels scrubbing near the target
+TURN_TOLERANCE = 1.5  # Degrees
+TURN_SETTLE_MS = 60  # Time inside tolerance before the turn counts as done
 
 flagup = False
 
@@ -159,6 +178,65 @@ def rotate_right():
     right_drive_2.stop(BRAKE)
 
 
+def get_heading():
+    """
+    Returns the robot heading in degrees (clockwise positive, 0 at program start).
+    Uses the inertial sensor when one is mounted, otherwise the difference between
+    the two sides' encoders. pid_drive only resets left_drive_1 and right_drive_1,
+    so left_drive_2 and right_drive_2 keep their count for the whole run.
+    """
+    if inertial is not None:
+        return inertial.rotation(DEGREES)
+    difference = left_drive_2.position(DEGREES) - right_drive_2.position(DEGREES)
+    return math.degrees(difference / 360 * WHEEL_CIRCUMFERENCE_INCHES / TRACK_WIDTH_INCHES)
+
+def turn_to_angle(target_heading, max_speed=TURN_MAX_SPEED, timeout_ms=2000):
+    """
+    Turns in place to an absolute heading using closed-loop control on get_heading().
+    The turn speed follows a trapezoidal profile: it ramps up at TURN_ACCEL, cruises at
+    max_speed and is capped near the target so the robot arrives without overshooting.
+    """
+    start_time = brain.timer.time(MSEC)
+    last_error = target_heading - get_heading()
+    speed_cap = 0
+    settled_since = None
+
+    while brain.timer.time(MSEC) - start_time < timeout_ms:
+        error = target_heading - get_heading()
+
+        # Done once the heading has stayed inside the tolerance long enough
+        if abs(error) < TURN_TOLERANCE:
+            if settled_since is None:
+                settled_since = brain.timer.time(MSEC)
+            elif brain.timer.time(MSEC) - settled_since >= TURN_SETTLE_MS:
+                break
+        else:
+            settled_since = None
+
+        # Trapezoidal speed limit: ramp up, cruise, then decelerate into the target
+        speed_cap = min(speed_cap + TURN_ACCEL * 0.01, max_speed, TURN_DECEL * math.sqrt(abs(error)))
+
+        output = (TURN_KP * error) + (TURN_KD * (error - last_error))
+        output = max(min(output, speed_cap), -speed_cap)
+        if settled_since is None and abs(output) < TURN_MIN_SPEED:
+            output = TURN_MIN_SPEED if error > 0 else -TURN_MIN_SPEED
+
+        # Positive output turns clockwise
+        left_drive_1.spin(FORWARD, output, PERCENT)
+        left_drive_2.spin(FORWARD, output, PERCENT)
+        right_drive_1.spin(REVERSE, output, PERCENT)
+        right_drive_2.spin(REVERSE, output, PERCENT)
+
+        last_error = error
+        sleep(10)
+
+    # Stop all motors with a brake
+    left_drive_1.stop(BRAKE)
+    left_drive_2.stop(BRAKE)
+    right_drive_1.stop(BRAKE)
+    right_drive_2.stop(BRAKE)
+
+
 def autonomous():
     piston1.open()
     pid_drive(32.5)   
@@ -171,7 +249,7 @@ def autonomous():
     pid_drive(-5)
     pid_drive(-1)
     pid_drive(1)
-    rotate_right()
+    turn_to_angle(-90)
     pid_drive(-30)
     
 def display_controls_summary():
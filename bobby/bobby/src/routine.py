@@ -0,0 +1,174 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       routine.py                                                   #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  loads and runs autonomous routines written as text           #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# A routine is a few lines of text, one step per line (see routines.py):
+#
+#   piston open
+#   drive 32.5            inches, negative backs up
+#   turn -90              degrees, clockwise positive
+#   conveyor 100          percent, 0 stops it
+#   conveyor 100 for 200  runs for 200 ms without holding up the next step
+#   wait 500              ms
+#   goto 72 52            field inches, along a smooth path (see pursuit.py)
+#   goto 96 76 back       the same, driving backwards
+#   navigate 120 100      to a field point the way planner.py finds around the ladder
+#
+# Consecutive goto steps that go the same way are one path: run() hands
+# the program's goto handler all their points at once, so the robot curves
+# through them without stopping.
+# Anything after a # is a comment. parse() turns the text into a list of
+# (op, a, b) steps and run() calls the program's handler for each one, so
+# the same text drives pid_drive on the brain, the simulator and the
+# AutonVisualizer:
+#
+#   steps = routine.load("red_left", routines.RED_LEFT, brain.sdcard)
+#   routine.run(steps, {routine.DRIVE: pid_drive, routine.TURN: turn, ...})
+#
+# load() keeps parsed routines in memory and also saves them to the sd card
+# as packed steps, with a checksum of the text they came from, so the next
+# boot unpacks them instead of parsing again until the text changes.
+
+import struct
+
+DRIVE = 1
+TURN = 2
+PISTON = 3
+CONVEYOR = 4
+WAIT = 5
+GOTO = 6
+GOTO_BACK = 7
+NAVIGATE = 8
+
+VERBS = {"drive": DRIVE, "turn": TURN, "piston": PISTON, "conveyor": CONVEYOR, "wait": WAIT,
+         "goto": GOTO, "navigate": NAVIGATE}
+NAMES = dict((op, verb) for verb, op in VERBS.items())
+NAMES[GOTO_BACK] = "goto"
+PISTON_STATES = {"open": 1, "close": 0}
+
+MAGIC = b'BRTN'
+VERSION = 1
+HEADER_FORMAT = '<4sHHI'  # magic, version, step count, text checksum
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+STEP_FORMAT = '<Bff'
+STEP_SIZE = struct.calcsize(STEP_FORMAT)
+CACHE_SUFFIX = ".rtc"
+
+_cache = {}  # name -> (checksum, steps)
+
+def parse_step(words):
+    verb = words[0]
+    if verb not in VERBS:
+        raise ValueError("unknown step '%s'" % verb)
+    op = VERBS[verb]
+    if op == PISTON:
+        if len(words) != 2 or words[1] not in PISTON_STATES:
+            raise ValueError("use 'piston open' or 'piston close'")
+        return (op, PISTON_STATES[words[1]], 0)
+    if op == CONVEYOR and len(words) == 4 and words[2] == "for":
+        return (op, float(words[1]), float(words[3]))
+    if op == NAVIGATE:
+        if len(words) != 3:
+            raise ValueError("use 'navigate x y'")
+        return (op, float(words[1]), float(words[2]))
+    if op == GOTO:
+        if len(words) == 4 and words[3] == "back":
+            return (GOTO_BACK, float(words[1]), float(words[2]))
+        if len(words) != 3:
+            raise ValueError("use 'goto x y' or 'goto x y back'")
+        return (op, float(words[1]), float(words[2]))
+    if len(words) != 2:
+        raise ValueError("'%s' takes one number" % verb)
+    return (op, float(words[1]), 0)
+
+def parse(text):
+    """routine text -> list of (op, a, b) steps"""
+    steps = []
+    number = 0
+    for line in text.split("\n"):
+        number += 1
+        words = line.split("#")[0].split()
+        if words:
+            try:
+                steps.append(parse_step(words))
+            except ValueError as e:
+                raise ValueError("line %d: %s" % (number, e))
+    return steps
+
+def checksum(text):
+    """32-bit FNV-1a of the text, to tell when a cached routine is stale"""
+    value = 2166136261
+    for byte in text.encode():
+        value = ((value ^ byte) * 16777619) & 0xFFFFFFFF
+    return value
+
+def pack(steps, text_checksum):
+    data = bytearray(HEADER_SIZE + STEP_SIZE * len(steps))
+    struct.pack_into(HEADER_FORMAT, data, 0, MAGIC, VERSION, len(steps), text_checksum)
+    for i, step in enumerate(steps):
+        struct.pack_into(STEP_FORMAT, data, HEADER_SIZE + i * STEP_SIZE, *step)
+    return data
+
+def unpack(data, text_checksum):
+    """packed steps, or None if data isn't a cache of text with this checksum"""
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, count, stored = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC or version != VERSION or stored != text_checksum:
+        return None
+    if len(data) != HEADER_SIZE + count * STEP_SIZE:
+        return None
+    return [struct.unpack_from(STEP_FORMAT, data, HEADER_SIZE + i * STEP_SIZE) for i in range(count)]
+
+def load(name, text, sdcard=None):
+    """
+    the steps for routine name, from memory, the sd card cache or by parsing
+    text, whichever is first to be up to date with text
+    """
+    key = checksum(text)
+    cached = _cache.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    filename = name + CACHE_SUFFIX
+    use_card = sdcard is not None and sdcard.is_inserted()
+    steps = None
+    if use_card and sdcard.exists(filename):
+        steps = unpack(sdcard.loadfile(filename), key)
+    if steps is None:
+        steps = parse(text)
+        if use_card:
+            sdcard.savefile(filename, pack(steps, key))
+    _cache[name] = (key, steps)
+    return steps
+
+def run(steps, handlers):
+    """
+    calls handlers[op] for every step: conveyor gets (percent, for_ms), a
+    piston gets True to open, goto gets ([(x, y), ...], backwards) for a
+    run of goto steps, navigate gets (x, y), everything else gets its one
+    number
+    """
+    i = 0
+    while i < len(steps):
+        op, a, b = steps[i]
+        i += 1
+        handler = handlers.get(GOTO if op == GOTO_BACK else op)
+        if handler is None:
+            raise ValueError("this program can't run '%s' steps" % NAMES[op])
+        if op == GOTO or op == GOTO_BACK:
+            points = [(a, b)]
+            while i < len(steps) and steps[i][0] == op:
+                points.append((steps[i][1], steps[i][2]))
+                i += 1
+            handler(points, op == GOTO_BACK)
+        elif op == CONVEYOR or op == NAVIGATE:
+            handler(a, b)
+        elif op == PISTON:
+            handler(a != 0)
+        else:
+            handler(a)
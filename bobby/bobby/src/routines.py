@@ -0,0 +1,61 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       routines.py                                                  #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  autonomous routines, in the step format read by routine.py   #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Each routine is plain text so the brain, the simulator and the
+# visualizer all run the same steps. Change a routine here rather than
+# copying it into a program; old versions live in git, not in comments.
+
+# main.py, red alliance left (negative) corner
+RED_LEFT = """
+piston open
+drive 32.5
+piston close              # clamp the goal
+drive -6
+conveyor 100 for 200      # score while backing away
+drive -30
+"""
+
+# main.py, red alliance right (positive) corner
+RED_RIGHT = """
+piston open
+drive 32
+piston close              # clamp the goal
+drive -6
+conveyor 100 for 200      # score while backing away
+drive -30
+"""
+
+# motion.py, its one autonomous
+MOTION = """
+piston open
+drive 32
+piston close
+wait 500
+drive -6
+wait 200
+conveyor 100              # left running into the turn
+drive -5
+turn -90
+"""
+
+# 20pskil.py's skills drive chain as paths through the same corners, from
+# simulation/path_compare.py
+SKILLS = """
+goto 72 36
+goto 89.8 33.1 back
+goto 95.6 50.9 back
+goto 65.8 53.6
+"""
+
+ROUTINES = {
+    "red_left": RED_LEFT,
+    "red_right": RED_RIGHT,
+    "motion": MOTION,
+    "skills": SKILLS,
+}
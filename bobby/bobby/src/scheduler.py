@@ -0,0 +1,118 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       scheduler.py                                                 #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  fixed-rate loops that run on absolute deadlines              #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# A loop that does its work and then sleep(20) really runs every 20 ms plus
+# however long the work took. Both helpers here keep an absolute deadline
+# instead, so the work time comes out of the sleep and the period holds.
+#
+# Rate is for loops that block until they finish, like pid_drive:
+#
+#   rate = Rate(20, brain.timer)
+#   while True:
+#       ...
+#       rate.sleep()
+#
+# Scheduler runs several step functions at their own rates on one thread,
+# highest priority first when more than one is due:
+#
+#   scheduler = Scheduler(brain.timer)
+#   scheduler.add("driver", driver_step, 10, priority=2)
+#   scheduler.add("temperatures", show_motor_temperatures, 500)
+#   scheduler.run()
+
+from vex import MSEC, sleep
+
+class Rate:
+    """
+    sleeps until the next multiple of period_ms since the rate was created
+
+    if an iteration overran its deadline the rate counts a miss and restarts
+    the grid from now rather than running the missed iterations back to back
+    """
+
+    def __init__(self, period_ms, timer):
+        self.period_ms = period_ms
+        self.timer = timer
+        self.deadline = timer.time(MSEC) + period_ms
+        self.missed = 0
+
+    def sleep(self):
+        now = self.timer.time(MSEC)
+        if self.deadline > now:
+            sleep(int(self.deadline - now))
+            self.deadline += self.period_ms
+        else:
+            self.missed += 1
+            self.deadline = now + self.period_ms
+
+class Task:
+    def __init__(self, name, function, period_ms, priority):
+        self.name = name
+        self.function = function
+        self.period_ms = period_ms
+        self.priority = priority
+        self.deadline = 0
+        self.runs = 0
+        self.missed = 0
+
+class Scheduler:
+    """
+    runs registered step functions at fixed rates on absolute deadlines
+
+    each step function should do one iteration of work and return; a step
+    that blocks holds up every other task behind it.
+    """
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.tasks = []
+        self.running = False
+
+    def add(self, name, function, period_ms, priority=0):
+        task = Task(name, function, period_ms, priority)
+        task.deadline = self.timer.time(MSEC)
+        self.tasks.append(task)
+        self.tasks.sort(key=lambda t: -t.priority)
+        return task
+
+    def remove(self, task):
+        self.tasks.remove(task)
+
+    def stop(self):
+        """makes run() return after the current pass"""
+        self.running = False
+
+    def run_once(self):
+        """
+        runs every task that is due, returns the time until the next
+        deadline in ms
+        """
+        now = self.timer.time(MSEC)
+        for task in self.tasks:
+            if task.deadline <= now:
+                task.function()
+                task.runs += 1
+                task.deadline += task.period_ms
+                now = self.timer.time(MSEC)
+                if task.deadline <= now:
+                    task.missed += 1
+                    task.deadline = now + task.period_ms
+        if not self.tasks:
+            return None
+        return min(task.deadline for task in self.tasks) - now
+
+    def run(self):
+        """runs the tasks until stop() is called"""
+        self.running = True
+        while self.running:
+            wait = self.run_once()
+            if wait is None:
+                break
+            if wait > 0:
+                sleep(int(wait))
@@ -0,0 +1,262 @@
+"""
+Bundles a robot program and the modules it imports from its own directory
+into one self-contained file, for uploading to the brain.
+
+    python bundle.py ../main.py
+    python bundle.py ../motion.py --out ../../build/motion.py
+    python bundle.py ../main.py --check --auton red_left
+
+The VEX extension downloads a project's one python.main file, so main.py's
+imports of drivetrain, routine, planner and the rest would fail on the
+brain. The bundle has each of those modules as a function that runs the
+module's code and hands back its names as an object, called in import
+order, then the program itself. The module objects are bundle globals
+named _m_<module>, and every import of one becomes an assignment from it,
+so `import routine` and `routine.GOTO` work unchanged, two modules can
+both define MAGIC and main.py can still call its Drivetrain `drivetrain`.
+
+The bundle goes to build/<program> next to src/ by default. To upload it,
+point "python": {"main": ...} in .vscode/vex_project_settings.json at it
+(build/main.py) and download as usual.
+
+--check runs the bundle's autonomous and a few seconds of driver control in
+the simulator with imports from the program's directory blocked, next to
+the program itself, and fails unless the autonomous takes the same time.
+"""
+
+import argparse
+import ast
+import contextlib
+import io
+import os
+import sys
+import textwrap
+import tokenize
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+BUILD_DIR = os.path.join(os.path.dirname(SRC_DIR), 'build')
+
+# expressions with their own names, which don't bind the module's
+SCOPES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+HEADER = """\
+{sources}
+# Edit those and bundle again rather than changing this file.
+
+class _Module:
+    def __init__(self, name, names):
+        self.__name__ = name
+        for key in names:
+            setattr(self, key, names[key])
+
+"""
+
+
+def sibling(name, directory):
+    return os.path.isfile(os.path.join(directory, name + '.py'))
+
+
+def sibling_imports(tree, directory):
+    """(node, module name) for every import of a module in directory, top level or not"""
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found += [(node, alias.name) for alias in node.names if sibling(alias.name, directory)]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and sibling(node.module, directory):
+            found.append((node, node.module))
+    for node, name in found:
+        if node not in tree.body:
+            raise ValueError(f"line {node.lineno}: import {name} inside a block can't be bundled")
+    return found
+
+
+def bound_names(statements):
+    """Names a module's top-level statements bind, not looking inside functions and classes"""
+    names = []
+    for statement in statements:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(statement.name)
+            continue
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            names += [(alias.asname or alias.name).split('.')[0] for alias in statement.names]
+            continue
+        nodes = [statement]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                names.append(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                names.append(node.name)
+            elif not isinstance(node, SCOPES):
+                nodes.extend(ast.iter_child_nodes(node))
+    return [name for name in dict.fromkeys(names) if not name.startswith('__') and name != '*']
+
+
+def replacement(node, directory):
+    """What an import of sibling modules becomes once they are bundle globals"""
+    if isinstance(node, ast.ImportFrom):
+        return [f"{alias.asname or alias.name} = _m_{node.module}.{alias.name}" for alias in node.names]
+    lines = []
+    for alias in node.names:
+        if sibling(alias.name, directory):
+            lines.append(f"{alias.asname or alias.name} = _m_{alias.name}")
+        else:
+            lines.append(f"import {alias.name}" + (f" as {alias.asname}" if alias.asname else ""))
+    return lines
+
+
+def rewrite(source, tree, directory):
+    """source with its sibling imports swapped for assignments, as a list of lines"""
+    lines = source.split('\n')
+    for node, _ in sorted(set(sibling_imports(tree, directory)), key=lambda item: -item[0].lineno):
+        lines[node.lineno - 1:node.end_lineno] = replacement(node, directory)
+    return lines
+
+
+def string_continuations(text):
+    """Line numbers (from 1) that start inside a string spanning lines"""
+    inside = set()
+    for token in tokenize.generate_tokens(io.StringIO(text).readline):
+        if token.type == tokenize.STRING and token.end[0] > token.start[0]:
+            inside.update(range(token.start[0] + 1, token.end[0] + 1))
+    return inside
+
+
+def module_function(name, directory):
+    """A module as `def _load_name(): ...` that returns it as a _Module"""
+    with open(os.path.join(directory, name + '.py')) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    text = '\n'.join(rewrite(source, tree, directory))
+    # indenting a line inside a string would change the string
+    keep = string_continuations(text)
+    body = [line if number in keep or not line.strip() else '    ' + line
+            for number, line in enumerate(text.split('\n'), 1)]
+    names = bound_names(tree.body)
+    exports = ', '.join(f"'{n}': {n}" for n in names)
+    return (f"def _load_{name}():\n" + '\n'.join(body).rstrip() + "\n"
+            f"    return _Module('{name}', {{{exports}}})\n\n"
+            f"_m_{name} = _load_{name}()\n\n")
+
+
+def import_order(program):
+    """The program's directory modules, each after the modules it imports"""
+    directory = os.path.dirname(program)
+    order = []
+    visiting = []
+
+    def visit(path, name=None):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError("circular import: " + " -> ".join(visiting + [name]))
+        visiting.append(name)
+        with open(path) as f:
+            tree = ast.parse(f.read())
+        for _, module in sibling_imports(tree, directory):
+            visit(os.path.join(directory, module + '.py'), module)
+        visiting.pop()
+        if name is not None:
+            order.append(name)
+
+    visit(program)
+    return order
+
+
+def bundle(program):
+    """The program and its directory modules as one source text"""
+    program = os.path.abspath(program)
+    directory = os.path.dirname(program)
+    order = import_order(program)
+    with open(program, newline='') as f:
+        source = f.read()
+    newline = '\r\n' if '\r\n' in source else '\n'
+    source = source.replace('\r\n', '\n')
+    tree = ast.parse(source)
+    clashes = [name for name in bound_names(tree.body) if name.startswith(('_m_', '_load_', '_Module'))]
+    if clashes:
+        raise ValueError(f"{os.path.basename(program)} defines {', '.join(clashes)}, "
+                         "names the bundle keeps for its modules")
+
+    sources = f"Built by src/simulation/bundle.py from {os.path.basename(program)} and " \
+        + ", ".join(m + '.py' for m in order) + "."
+    text = HEADER.format(sources=textwrap.fill(sources, 78, initial_indent='# ', subsequent_indent='# '))
+    text += ''.join(module_function(name, directory) for name in order)
+    text += '\n'.join(rewrite(source, tree, directory))
+    compile(text, program, 'exec')
+    return text.replace('\n', newline), order
+
+
+class _BlockDirectory:
+    """Import hook that fails imports of modules from one directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def find_spec(self, name, path=None, target=None):
+        if '.' not in name and sibling(name, self.directory):
+            raise ImportError(f"{name} is not in the bundle")
+        return None
+
+
+DRIVER_CHECK_MS = 2000
+
+
+def autonomous_ms(program, auton, block=None):
+    """
+    Simulated autonomous time of a program, after which driver control
+    runs for DRIVER_CHECK_MS. block fails imports from a directory.
+    """
+    import physics
+    import runner
+
+    if block is not None:
+        for name in [name for name in sys.modules if sibling(name, block)]:
+            del sys.modules[name]
+        sys.meta_path.insert(0, _BlockDirectory(block))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            namespace = runner.load_program(program, auton)
+            physics.attach(namespace)
+            elapsed = runner.run_autonomous()
+            runner.run_driver(DRIVER_CHECK_MS)
+            return elapsed
+    finally:
+        if block is not None:
+            sys.meta_path.pop(0)
+
+
+def main():
+    import runner
+
+    parser = argparse.ArgumentParser(description="Bundle a robot program and its modules into one file")
+    parser.add_argument('program', nargs='?', default=os.path.join(SRC_DIR, 'main.py'))
+    parser.add_argument('--out', help="file to write, build/<program> by default")
+    parser.add_argument('--check', action='store_true',
+                        help="run the bundle's autonomous against the program's")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    args = parser.parse_args()
+
+    program = os.path.abspath(args.program)
+    out = args.out or os.path.join(BUILD_DIR, os.path.basename(program))
+    text, order = bundle(program)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', newline='') as f:
+        f.write(text)
+    print(f"wrote {out}: {os.path.basename(program)} and {len(order)} modules, {len(text) // 1024} KiB")
+
+    if args.check:
+        source_ms = autonomous_ms(program, args.auton)
+        bundle_ms = autonomous_ms(out, args.auton, block=os.path.dirname(program))
+        print(f"autonomous: {source_ms:.0f} ms from source, {bundle_ms:.0f} ms bundled")
+        if bundle_ms != source_ms:
+            sys.exit("the bundle runs differently from the program")
+
+
+if __name__ == "__main__":
+    main()
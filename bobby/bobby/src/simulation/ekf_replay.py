@@ -0,0 +1,311 @@
+"""
+Offline, batched version of ekf.py's PoseEKF: replays logged encoder,
+inertial and distance readings through the filter for many runs at once as
+NumPy arrays and reports its error against the simulated ground truth.
+
+    python ekf_replay.py
+    python ekf_replay.py --robots 500 --seconds 30 --save logs.npz
+    python ekf_replay.py --load logs.npz --wheel-noise 0.05 --heading-noise 1
+
+The logs come from the physics model: a batch of robots with the traction
+spread monte_carlo.py uses drive between random points on the field, and
+their encoders are read every period. The inertial reading is the true
+heading plus a per-robot drift rate and white noise. The wall sensors see
+the true distance to the first wall along their beam, plus noise as large
+as the V5 sensor's spec, and now and then something closer (another robot,
+a goal) or nothing at all.
+
+Each run is replayed three ways: encoders only, plus the inertial sensor,
+plus the wall sensors. For each the report gives the RMS and final
+position and heading error. Robot 0 is also replayed through the robot's own
+ekf.FusedOdometry as a check that both filters agree. The timing line is
+one FusedOdometry.step on this machine, for comparing changes only; the
+brain's MicroPython is much slower.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+from monte_carlo import Perturbation
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from ekf import PoseEKF, FusedOdometry, WallSensor, FIELD_INCHES, GATE, MAX_RANGE_MM, MIN_INCIDENCE
+
+PERIOD_MS = 10
+START_POSE = (72.0, 20.0, 0.0)
+MARGIN = 24  # random targets stay this far from the walls
+GYRO_NOISE_DEG = 0.1
+GYRO_DRIFT_DEG_PER_S = 0.01  # spread of the per-robot drift rate
+OCCLUDED = 0.05  # chance a wall reading sees something closer
+MISSED = 0.02  # chance a wall reading sees nothing
+# (forward, right, angle) of the wall sensors: one on the back, one on the left
+MOUNTS = ((-6.0, 0.0, 180.0), (0.0, -6.0, 270.0))
+
+# ---------------------------------------------------------------------------- #
+#  Logs                                                                        #
+# ---------------------------------------------------------------------------- #
+
+def wall_range(x, y, beam):
+    """Distance from (x, y) to the first wall along beam (radians clockwise from +y), inf if none"""
+    sb = np.sin(beam)
+    cb = np.cos(beam)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx = np.where(sb > 0, (FIELD_INCHES - x) / sb, np.where(sb < 0, -x / sb, np.inf))
+        ty = np.where(cb > 0, (FIELD_INCHES - y) / cb, np.where(cb < 0, -y / cb, np.inf))
+    return np.minimum(tx, ty)
+
+
+def record(n, seconds, seed=0):
+    """
+    Drives n robots around the field and logs every PERIOD_MS. Returns a
+    dict of (n, ticks) arrays: encoder degrees, inertial rotation, one range
+    per MOUNTS entry (NaN for nothing in range) and the true pose.
+    """
+    rng = np.random.default_rng(seed)
+    spread = Perturbation()
+    params = physics.ChassisParams(traction=np.minimum(1.0 + spread.traction * rng.standard_normal(n), 1.0))
+    model = physics.DriveModel([physics.LEFT, physics.RIGHT], [1.0, 1.0], 200.0, n_robots=n, params=params)
+    model.mode[:] = physics.VELOCITY_MODE
+    x0, y0, h0 = START_POSE
+    model.x[:] = x0
+    model.y[:] = y0
+    model.heading[:] = math.radians(h0)
+
+    ticks = int(seconds * 1000 / PERIOD_MS) + 1
+    steps_per_tick = int(round(PERIOD_MS / model.dt_ms))
+    logs = dict((name, np.zeros((n, ticks))) for name in ('left', 'right', 'rotation', 'x', 'y', 'heading'))
+    logs['ranges'] = np.zeros((len(MOUNTS), n, ticks))
+    drift = GYRO_DRIFT_DEG_PER_S * rng.standard_normal(n)
+    target = rng.uniform(MARGIN, FIELD_INCHES - MARGIN, (n, 2))
+    speed = rng.uniform(30, 90, n)
+
+    for tick in range(ticks):
+        # Head for the current target, pick another on arrival
+        dx = target[:, 0] - model.x
+        dy = target[:, 1] - model.y
+        arrived = np.hypot(dx, dy) < 6
+        target[arrived] = rng.uniform(MARGIN, FIELD_INCHES - MARGIN, (int(arrived.sum()), 2))
+        speed[arrived] = rng.uniform(30, 90, int(arrived.sum()))
+        error = (np.arctan2(dx, dy) - model.heading + np.pi) % (2 * np.pi) - np.pi
+        forward = speed * np.maximum(np.cos(error), 0)
+        turn = np.clip(80 * error, -60, 60)
+        output = np.clip(np.column_stack((forward + turn, forward - turn)), -100, 100)
+        model.command_speed[:] = output / 100 * model.free_speed
+        model.masks_stale = True
+
+        encoders = model.motor_positions()
+        logs['left'][:, tick] = encoders[:, 0]
+        logs['right'][:, tick] = encoders[:, 1]
+        logs['x'][:, tick] = model.x
+        logs['y'][:, tick] = model.y
+        logs['heading'][:, tick] = np.degrees(model.heading)
+        logs['rotation'][:, tick] = (np.degrees(model.heading) + drift * tick * PERIOD_MS / 1000
+                                     + GYRO_NOISE_DEG * rng.standard_normal(n))
+        for k, (forward_in, right_in, angle) in enumerate(MOUNTS):
+            st, ct = np.sin(model.heading), np.cos(model.heading)
+            sx = model.x + forward_in * st + right_in * ct
+            sy = model.y + forward_in * ct - right_in * st
+            true = wall_range(sx, sy, model.heading + math.radians(angle))
+            noisy = true + np.maximum(0.6, 0.05 * true) * rng.standard_normal(n)
+            noisy = np.where(rng.random(n) < OCCLUDED, rng.uniform(0.1, 0.9, n) * true, noisy)
+            noisy = np.where((rng.random(n) < MISSED) | (noisy * 25.4 > MAX_RANGE_MM), np.nan, noisy)
+            logs['ranges'][k, :, tick] = noisy
+        for _ in range(steps_per_tick):
+            model.step()
+    return logs
+
+# ---------------------------------------------------------------------------- #
+#  Batched filter                                                              #
+# ---------------------------------------------------------------------------- #
+
+class BatchEKF:
+    """PoseEKF for n runs at once; every method mirrors the scalar one in ekf.py"""
+
+    def __init__(self, n, track_width, wheel_noise, heading_noise_deg, range_noise=0.6, range_noise_fraction=0.05):
+        self.track_width = track_width
+        self.wheel_noise = wheel_noise
+        self.heading_variance = math.radians(heading_noise_deg) ** 2
+        self.range_noise = range_noise
+        self.range_noise_fraction = range_noise_fraction
+        self.state = np.zeros((n, 3))
+        self.P = np.zeros((n, 3, 3))
+        self.accepted = 0
+        self.rejected = 0
+
+    def reset(self, x, y, heading):
+        self.state[:] = (x, y, math.radians(heading))
+        self.P[:] = 0.0
+
+    def predict(self, d_left, d_right):
+        track = self.track_width
+        d_heading = (d_left - d_right) / track
+        half = d_heading / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chord = np.where(d_heading != 0, np.sin(half) / half, 1.0)
+        distance = (d_left + d_right) / 2 * chord
+        midpoint = self.state[:, 2] + half
+        s, c = np.sin(midpoint), np.cos(midpoint)
+        self.state[:, 0] += distance * s
+        self.state[:, 1] += distance * c
+        self.state[:, 2] += d_heading
+
+        n = len(distance)
+        F = np.broadcast_to(np.eye(3), (n, 3, 3)).copy()
+        F[:, 0, 2] = distance * c
+        F[:, 1, 2] = -distance * s
+        k = distance / (2 * track)
+        G = np.stack((np.column_stack((0.5 * s + k * c, 0.5 * c - k * s, np.full(n, 1 / track))),
+                      np.column_stack((0.5 * s - k * c, 0.5 * c + k * s, np.full(n, -1 / track)))), axis=2)
+        noise = self.wheel_noise * np.column_stack((np.abs(d_left), np.abs(d_right)))
+        self.P = F @ self.P @ F.transpose(0, 2, 1) + (G * noise[:, None, :]) @ G.transpose(0, 2, 1)
+
+    def correct(self, innovation, H, variance, valid, gate=None):
+        PH = np.einsum('nij,nj->ni', self.P, H)
+        s = np.einsum('ni,ni->n', H, PH) + variance
+        ok = valid.copy()
+        if gate is not None:
+            passed = innovation * innovation <= gate * s
+            self.rejected += int((valid & ~passed).sum())
+            ok &= passed
+        self.accepted += int(ok.sum())
+        scale = np.where(ok, innovation / s, 0.0)
+        self.state += PH * scale[:, None]
+        self.P -= np.where(ok, 1 / s, 0.0)[:, None, None] * PH[:, :, None] * PH[:, None, :]
+
+    def update_heading(self, heading):
+        innovation = (np.radians(heading) - self.state[:, 2] + np.pi) % (2 * np.pi) - np.pi
+        H = np.zeros((len(innovation), 3))
+        H[:, 2] = 1.0
+        self.correct(innovation, H, self.heading_variance, np.ones(len(innovation), dtype=bool))
+
+    def update_wall(self, distance, forward, right, angle):
+        x, y, theta = self.state.T
+        st, ct = np.sin(theta), np.cos(theta)
+        sx = x + forward * st + right * ct
+        sy = y + forward * ct - right * st
+        dsx = forward * ct - right * st
+        dsy = -forward * st - right * ct
+        beam = theta + math.radians(angle)
+        sb, cb = np.sin(beam), np.cos(beam)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tx = np.where(sb > 0, (FIELD_INCHES - sx) / sb, np.where(sb < 0, -sx / sb, np.inf))
+            ty = np.where(cb > 0, (FIELD_INCHES - sy) / cb, np.where(cb < 0, -sy / cb, np.inf))
+            on_x = tx < ty
+            H = np.where(on_x[:, None],
+                         np.column_stack((-1 / sb, np.zeros_like(sb), (-dsx * sb - tx * sb * cb) / (sb * sb))),
+                         np.column_stack((np.zeros_like(cb), -1 / cb, (-dsy * cb + ty * cb * sb) / (cb * cb))))
+        expected = np.where(on_x, tx, ty)
+        steep = np.where(on_x, np.abs(sb), np.abs(cb)) < MIN_INCIDENCE
+        valid = ~np.isnan(distance) & ~steep
+        distance = np.where(valid, distance, 0.0)
+        H = np.where(valid[:, None], H, 0.0)
+        sigma = np.maximum(self.range_noise, self.range_noise_fraction * distance)
+        self.correct(np.where(valid, distance - expected, 0.0), H, sigma * sigma, valid, GATE)
+
+
+def replay(logs, inches_per_degree, track_width, wheel_noise, heading_noise_deg, inertial=True, walls=True):
+    """Runs the logs through a BatchEKF. Returns the (n, ticks, 3) estimated poses and the filter."""
+    n, ticks = logs['left'].shape
+    f = BatchEKF(n, track_width, wheel_noise, heading_noise_deg)
+    f.reset(*START_POSE)
+    offset = START_POSE[2] - logs['rotation'][:, 0]
+    poses = np.zeros((n, ticks, 3))
+    poses[:, 0] = f.state
+    for t in range(1, ticks):
+        f.predict((logs['left'][:, t] - logs['left'][:, t - 1]) * inches_per_degree,
+                  (logs['right'][:, t] - logs['right'][:, t - 1]) * inches_per_degree)
+        if inertial:
+            f.update_heading(logs['rotation'][:, t] + offset)
+        if walls:
+            for k, mount in enumerate(MOUNTS):
+                f.update_wall(logs['ranges'][k, :, t], *mount)
+        poses[:, t] = f.state
+    poses[:, :, 2] = np.degrees(poses[:, :, 2])
+    return poses, f
+
+
+def replay_robot(logs, robot, inches_per_degree, track_width, wheel_noise, heading_noise_deg):
+    """One run through the robot's own FusedOdometry, with the inertial and wall sensors"""
+    walls = [WallSensor(None, *mount) for mount in MOUNTS]
+    odometry = FusedOdometry(None, None, inches_per_degree, track_width, None,
+                             PoseEKF(track_width, wheel_noise, heading_noise_deg), walls=walls)
+    odometry.set_pose(*START_POSE)
+    poses = []
+    start = time.perf_counter()
+    for t in range(logs['left'].shape[1]):
+        ranges = [None if np.isnan(r) else float(r) for r in logs['ranges'][:, robot, t]]
+        odometry.step(float(logs['left'][robot, t]), float(logs['right'][robot, t]),
+                      float(logs['rotation'][robot, t]), ranges)
+        poses.append(odometry.pose)
+    seconds = (time.perf_counter() - start) / len(poses)
+    return np.array(poses), seconds
+
+
+def errors(poses, logs):
+    """Position error in inches and heading error in degrees, (n, ticks) each"""
+    miss = np.hypot(poses[:, :, 0] - logs['x'], poses[:, :, 1] - logs['y'])
+    turn = np.abs((poses[:, :, 2] - logs['heading'] + 180) % 360 - 180)
+    return miss, turn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay sensor logs through the pose EKF and score it against ground truth")
+    parser.add_argument('--robots', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=15.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help="write the simulated logs to this .npz")
+    parser.add_argument('--load', help="replay logs from this .npz instead of simulating")
+    parser.add_argument('--wheel-noise', type=float, default=0.02, help="square inches per inch of wheel travel")
+    parser.add_argument('--heading-noise', type=float, default=0.5, help="inertial heading noise, degrees")
+    args = parser.parse_args()
+
+    chassis = physics.ChassisParams()
+    inches_per_degree = math.pi * chassis.wheel_diameter_in / 360
+    track_width = chassis.track_width_in
+
+    start = time.perf_counter()
+    if args.load:
+        with np.load(args.load) as data:
+            logs = dict((name, data[name]) for name in data.files)
+    else:
+        logs = record(args.robots, args.seconds, args.seed)
+    if args.save:
+        np.savez(args.save, **logs)
+    n, ticks = logs['left'].shape
+    print(f"{n} runs of {(ticks - 1) * PERIOD_MS / 1000:g} s, logs ready in {time.perf_counter() - start:.1f} s")
+
+    print(f"{'sensors':>27} | {'rms in':>7} {'final p50':>9} {'p99':>6} | {'rms deg':>7} {'final p99':>9}")
+    for label, inertial, walls in (('encoders', False, False), ('encoders + inertial', True, False),
+                                   ('encoders + inertial + walls', True, True)):
+        start = time.perf_counter()
+        poses, f = replay(logs, inches_per_degree, track_width, args.wheel_noise, args.heading_noise, inertial, walls)
+        wall = time.perf_counter() - start
+        miss, turn = errors(poses, logs)
+        print(f"{label:>27} | {np.sqrt(np.mean(miss ** 2)):7.2f} {np.median(miss[:, -1]):9.2f} "
+              f"{np.percentile(miss[:, -1], 99):6.2f} | {np.sqrt(np.mean(turn ** 2)):7.2f} "
+              f"{np.percentile(turn[:, -1], 99):9.2f}   ({wall:.1f} s)")
+    if f.accepted + f.rejected:
+        print(f"wall readings gated out: {f.rejected / (f.accepted + f.rejected) * 100:.1f}% "
+              f"(of which {OCCLUDED * 100:g}% were simulated as blocked)")
+
+    robot_poses, seconds = replay_robot(logs, 0, inches_per_degree, track_width, args.wheel_noise, args.heading_noise)
+    difference = np.abs(robot_poses - poses[0]).max(axis=0)
+    print(f"ekf.FusedOdometry on run 0 matches the batch filter to {difference[0]:.1e} / {difference[1]:.1e} in, "
+          f"{difference[2]:.1e} deg; {seconds * 1e6:.1f} us per step on this machine")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+"""
+Batch Monte Carlo runner for autonomous routines.
+
+A routine is traced once on the simulated brain: open-loop motor commands
+(timed turns, spin_for moves, conveyor, piston) and sleeps are recorded as
+they happen, while the closed-loop calls (pid_drive, motion_profile_pid_drive,
+turn_to_angle) are kept as steps. The trace is then replayed on N perturbed
+robots at once. Every robot has its own position in the step list, so
+robots whose drives settle at different times drift apart exactly like real
+runs would, but all of them live in the same NumPy arrays and step together.
+
+    python monte_carlo.py ../main.py --auton red_left --routine red_left_negative_corner
+    python monte_carlo.py ../motion.py --trials 20000 --workers 4
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+import vex
+
+# Loop constants shared by every pid_drive / motion_profile_pid_drive variant
+DRIVE_PERIOD_MS = 20
+DRIVE_THRESHOLD_DEG = 5
+DRIVE_OUTPUT_CAP = 75
+INTEGRAL_LIMIT = 1000
+
+TURN_PERIOD_MS = 10
+TURN_CONSTANTS = ('TURN_KP', 'TURN_KD', 'TURN_MAX_SPEED', 'TURN_ACCEL', 'TURN_DECEL',
+                  'TURN_MIN_SPEED', 'TURN_TOLERANCE', 'TURN_SETTLE_MS')
+
+ROUTINE_LIMIT_MS = 15000
+
+
+def drive_loop(namespace):
+    """
+    Exit rules of a program's drive loops: the settle window, speed limit and
+    timeout when it drives through controllers.ControlLoop (derivative on
+    the measurement, error sum cleared when the error changes sign), or the
+    bare threshold of the older inline loops (derivative on the error).
+    """
+    if 'ControlLoop' in namespace:
+        return {'tolerance': namespace['DRIVE_TOLERANCE_DEG'], 'settle_ms': namespace['DRIVE_SETTLE_MS'],
+                'settle_dps': namespace['DRIVE_SETTLE_DPS'], 'timeout_ms': namespace.get('DRIVE_TIMEOUT_MS', math.inf),
+                'on_measurement': True, 'reset_on_crossing': True}
+    return {'tolerance': DRIVE_THRESHOLD_DEG, 'settle_ms': 0, 'settle_dps': math.inf,
+            'timeout_ms': math.inf, 'on_measurement': False, 'reset_on_crossing': False}
+
+_MODES = {vex.BRAKE: physics.BRAKE_MODE, vex.HOLD: physics.HOLD_MODE, vex.COAST: physics.COAST_MODE}
+
+
+class Perturbation:
+    """
+    Spread of the robot-to-robot and run-to-run differences. Relative values
+    are standard deviations of a multiplier around 1.
+    """
+
+    def __init__(self, **overrides):
+        self.motor_strength = 0.05
+        self.traction = 0.03
+        self.mass = 0.05
+        self.rolling_resistance = 0.2
+        self.turn_scrub = 0.2
+        self.battery_voltage = 0.3  # volts
+        self.timing_jitter_ms = 5.0  # per sleep
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise AttributeError("unknown perturbation: %s" % name)
+            setattr(self, name, value)
+
+
+# ---------------------------------------------------------------------------- #
+#  Tracing                                                                     #
+# ---------------------------------------------------------------------------- #
+
+class _Trace:
+    def __init__(self):
+        self.items = []
+        self.stamp = vex.now()
+
+    def mark(self, item):
+        t = vex.now()
+        if t > self.stamp:
+            self.items.append(('wait', t - self.stamp))
+            self.stamp = t
+        self.items.append(item)
+
+
+class _RecordingPlant:
+    """
+    Plant that records every command sent to a drive motor. A spin_for is
+    recorded as a move relative to where the motor was told to be last,
+    and the program waiting on it (is_done) as a settle step.
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.positions = {}
+        self.moving = set()
+
+    def command_velocity(self, index, rpm):
+        self.trace.mark(('set', index, physics.VELOCITY_MODE, rpm))
+
+    def command_stop(self, index, mode):
+        self.trace.mark(('set', index, _MODES.get(mode, physics.COAST_MODE), 0.0))
+
+    def command_position(self, index, target, rpm):
+        self.trace.mark(('position', index, target - self.positions.get(index, 0.0), rpm))
+        self.positions[index] = target
+        self.moving.add(index)
+
+    def is_done(self, index):
+        if index in self.moving:
+            self.moving.discard(index)
+            self.trace.mark(('settle', index))
+        return True
+
+    def motor_position(self, index):
+        return self.positions.get(index, 0.0)
+
+    def set_motor_position(self, index, value):
+        self.positions[index] = value
+
+    def motor_velocity(self, index):
+        return 0.0
+
+    def motor_current(self, index):
+        return 0.0
+
+    def motor_torque(self, index):
+        return 0.0
+
+
+def _wrap_event(trace, name, action, method):
+    def event(*args, **kwargs):
+        trace.mark(('event', name, action))
+        return method(*args, **kwargs)
+    return event
+
+
+def trace_routine(namespace, routine='autonomous'):
+    """
+    Runs namespace[routine] on the simulated brain. Returns its step list,
+    the free speed of each drive motor and each motor's (side, sign).
+    """
+    trace = _Trace()
+    left, right = physics.drive_motors(namespace)
+    motors = left + right
+    plant = _RecordingPlant(trace)
+    for index, motor in enumerate(motors):
+        motor._plant = plant
+        motor._index = index
+
+    # Other actuators become named events so their timing can be scored
+    for name, obj in list(namespace.items()):
+        if isinstance(obj, vex.Pneumatics):
+            obj.open = _wrap_event(trace, name, 'open', obj.open)
+            obj.close = _wrap_event(trace, name, 'close', obj.close)
+        elif isinstance(obj, vex.DigitalOut):
+            obj.set = _wrap_event(trace, name, 'set', obj.set)
+        elif isinstance(obj, vex.Motor) and obj not in motors:
+            obj.spin = _wrap_event(trace, name, 'spin', obj.spin)
+            obj.stop = _wrap_event(trace, name, 'stop', obj.stop)
+
+    # Queued actuator steps (actions.ActionQueue) overlap the drives, which a
+    # step list can't express, so they fire as soon as they are queued and
+    # only the drives set the pace
+    actions = sys.modules.get('actions')
+    if actions is not None and hasattr(actions, 'ActionQueue'):
+        for obj in namespace.values():
+            if isinstance(obj, actions.ActionQueue):
+                obj.at_ms = lambda delay_ms, function: function()
+                obj.at_inches = lambda inches, function: function()
+
+    gains = namespace.get('get_scaled_pid_constants')
+    to_degrees = namespace['inches_to_degrees']
+    loop = drive_loop(namespace)
+
+    def pid_drive(distance):
+        kp, ki, kd = gains(distance)
+        trace.mark(('drive', 'pid', to_degrees(distance), (kp, ki, kd), None, loop))
+
+    def motion_profile_pid_drive(distance):
+        kp, ki, kd = gains(distance)
+        # Build the same table the program would and keep it as arrays, with
+        # the plan already converted to feedforward percent output
+        percent = namespace['MOTOR_MAX_DPS'] / 100.0
+        table = namespace['build_profile'](namespace['PROFILE_SHAPE'], to_degrees(distance),
+                                           namespace['MAX_VELOCITY'] * percent,
+                                           namespace['ACCELERATION'] * percent,
+                                           namespace['JERK'] * percent)
+        feedforward = namespace.get('DRIVE_FEEDFORWARD')
+        if feedforward is None:
+            planned = np.asarray(table.velocities, dtype=float) / percent
+        else:
+            planned = np.array([feedforward.calculate(v, a) for v, a in zip(table.velocities, table.accelerations)])
+        profile = (np.asarray(table.positions, dtype=float), planned,
+                   table.dt_ms, namespace['PROFILE_TIMEOUT_MS'])
+        trace.mark(('drive', 'profile', to_degrees(distance), (kp, ki, kd), profile, loop))
+
+    def turn_to_angle(target_heading, max_speed=None, timeout_ms=2000):
+        constants = dict((name, namespace[name]) for name in TURN_CONSTANTS)
+        if max_speed is not None:
+            constants['TURN_MAX_SPEED'] = max_speed
+        # Encoder heading: wheel radius over track width turns the difference
+        # in wheel angle into robot rotation
+        if namespace.get('inertial') is None:
+            scale = namespace['WHEEL_CIRCUMFERENCE_INCHES'] / (2 * math.pi) / namespace['TRACK_WIDTH_INCHES']
+        else:
+            scale = None
+        trace.mark(('turn', target_heading, constants, timeout_ms, scale))
+        # The traced robot never moves, so a turn by degrees from the
+        # odometry heading after this one needs the heading this one ends at
+        odometry = namespace.get('odometry')
+        if odometry is not None:
+            odometry.set_pose(odometry.pose[0], odometry.pose[1], target_heading)
+
+    if 'turn_to_angle' in namespace:
+        namespace['turn_to_angle'] = turn_to_angle
+    if 'pid_drive' in namespace:
+        namespace['pid_drive'] = pid_drive
+    if 'motion_profile_pid_drive' in namespace:
+        namespace['motion_profile_pid_drive'] = motion_profile_pid_drive
+
+    vex.run_task(namespace[routine], ROUTINE_LIMIT_MS)
+    trace.mark(('end',))
+    return trace.items, [m.max_rpm for m in motors], [
+        (physics.LEFT if m in left else physics.RIGHT,
+         (-1.0 if m.reversed else 1.0) * (1.0 if m in left else -1.0)) for m in motors]
+
+
+# ---------------------------------------------------------------------------- #
+#  Batched replay                                                              #
+# ---------------------------------------------------------------------------- #
+
+def _perturbed_params(n, rng, spread, n_motors):
+    def jitter(sigma, shape=(n,)):
+        scale = 1.0 + sigma * rng.standard_normal(shape)
+        scale[0] = 1.0  # robot 0 is the nominal robot everyone is compared to
+        return scale
+
+    base = physics.ChassisParams()
+    voltage = base.battery_voltage + spread.battery_voltage * rng.standard_normal(n)
+    voltage[0] = base.battery_voltage
+    return physics.ChassisParams(
+        motor_scale=jitter(spread.motor_strength, (n, n_motors)),
+        traction=np.minimum(jitter(spread.traction), 1.0),
+        mass_kg=base.mass_kg * jitter(spread.mass),
+        rolling_resistance=base.rolling_resistance * jitter(spread.rolling_resistance),
+        turn_scrub_nm=base.turn_scrub_nm * jitter(spread.turn_scrub),
+        battery_voltage=voltage,
+    )
+
+
+def replay(items, max_rpm, motor_layout, n_robots, seed=0, spread=None):
+    """
+    Replays a traced routine on n_robots perturbed robots. Returns the final
+    poses, the finish time of every robot (NaN if it ran out of time) and the
+    pose of every robot at each event.
+    """
+    spread = spread or Perturbation()
+    rng = np.random.default_rng(seed)
+    n = n_robots
+    sides = [side for side, _ in motor_layout]
+    signs = [sign for _, sign in motor_layout]
+    model = physics.DriveModel(sides, signs, max_rpm, n_robots=n,
+                               params=_perturbed_params(n, rng, spread, len(sides)))
+    left_index = sides.index(physics.LEFT)
+    right_index = sides.index(physics.RIGHT)
+    all_motors = np.arange(len(sides))
+
+    pc = np.zeros(n, dtype=int)
+    entered = np.zeros(n, dtype=bool)
+    wait_end = np.zeros(n)
+    next_tick = np.zeros(n)
+    base = np.zeros(n)
+    error_sum = np.zeros(n)
+    last_error = np.zeros(n)
+    last_position = np.zeros(n)
+    velocity = np.zeros(n)
+    started = np.zeros(n)
+    settled_since = np.full(n, np.nan)
+    turn_sign = np.where(np.asarray(sides) == physics.LEFT, 1.0, -1.0)
+    finish = np.full(n, np.nan)
+    jitter = spread.timing_jitter_ms
+    events = {}
+
+    def encoder_average(mask):
+        positions = model.motor_positions()
+        return (positions[mask, left_index] + positions[mask, right_index]) / 2
+
+    def encoder_speed(mask):
+        speeds = model.motor_velocities()
+        return (speeds[mask, left_index] + speeds[mask, right_index]) / 2
+
+    def set_drive(mask, output):
+        model.masks_stale = True
+        model.mode[np.ix_(mask, all_motors)] = physics.VELOCITY_MODE
+        model.command_speed[mask] = output[:, None] / 100.0 * model.free_speed
+
+    def brake_drive(mask):
+        model.masks_stale = True
+        model.mode[np.ix_(mask, all_motors)] = physics.BRAKE_MODE
+        model.command_speed[mask] = 0.0
+
+    def turn_heading(robots, scale):
+        if scale is None:
+            return np.degrees(model.heading[robots])
+        spread = model.wheel_angle[robots, physics.LEFT] - model.wheel_angle[robots, physics.RIGHT]
+        return np.degrees(spread * scale)
+
+    def turn_tick(mask, item, now):
+        # Same arithmetic as turn_to_angle, one robot per array entry
+        _, target, c, timeout_ms, scale = item
+        robots = np.flatnonzero(mask)
+        error = target - turn_heading(robots, scale)
+        inside = np.abs(error) < c['TURN_TOLERANCE']
+        since = settled_since[robots]
+        done = inside & (now - since >= c['TURN_SETTLE_MS'])
+        since = np.where(inside, np.where(np.isnan(since), now, since), np.nan)
+        done |= now - started[robots] >= timeout_ms
+
+        cap = np.minimum(np.minimum(velocity[robots] + c['TURN_ACCEL'] * 0.01, c['TURN_MAX_SPEED']),
+                         c['TURN_DECEL'] * np.sqrt(np.abs(error)))
+        output = c['TURN_KP'] * error + c['TURN_KD'] * (error - last_error[robots])
+        output = np.clip(output, -cap, cap)
+        boost = np.isnan(since) & (np.abs(output) < c['TURN_MIN_SPEED'])
+        output = np.where(boost, np.where(error > 0, c['TURN_MIN_SPEED'], -c['TURN_MIN_SPEED']), output)
+        velocity[robots] = cap
+        settled_since[robots] = since
+        last_error[robots] = error
+
+        going = robots[~done]
+        if len(going):
+            model.masks_stale = True
+            model.mode[np.ix_(going, all_motors)] = physics.VELOCITY_MODE
+            model.command_speed[going] = output[~done][:, None] / 100.0 * model.free_speed * turn_sign
+            next_tick[going] = now + TURN_PERIOD_MS
+        finished = robots[done]
+        if len(finished):
+            brake_drive(finished)
+            pc[finished] += 1
+            entered[finished] = False
+
+    def enter_turn(robots, item, now):
+        started[robots] = now
+        last_error[robots] = item[1] - turn_heading(robots, item[4])
+        velocity[robots] = 0
+        settled_since[robots] = np.nan
+
+    def enter_drive(robots, item, now):
+        started[robots] = now
+        base[robots] = encoder_average(robots)
+        error_sum[robots] = 0
+        last_error[robots] = 0
+        velocity[robots] = 0
+        settled_since[robots] = np.nan
+
+    def drive_tick(mask, item, now):
+        # Same arithmetic as pid_drive / motion_profile_pid_drive, one
+        # robot per array entry
+        _, kind, target, (kp, ki, kd), profile, loop = item
+        robots = np.flatnonzero(mask)
+        position = encoder_average(mask) - base[mask]
+        elapsed = now - started[mask]
+        inside = (np.abs(target - position) < loop['tolerance']) & (np.abs(encoder_speed(mask)) < loop['settle_dps'])
+        timeout_ms = loop['timeout_ms']
+        setpoint = target
+        if kind == 'profile':
+            # The PID tracks the table's planned position; only the final
+            # stop looks at the real target
+            positions, feedforward, dt_ms, extra_ms = profile
+            duration = (len(positions) - 1) * dt_ms
+            i = np.minimum((elapsed // dt_ms).astype(int), len(positions) - 1)
+            inside &= elapsed >= duration
+            timeout_ms = duration + extra_ms
+            setpoint = positions[i]
+        since = np.where(inside, np.where(np.isnan(settled_since[robots]), now, settled_since[robots]), np.nan)
+        settled = (inside & (now - since >= loop['settle_ms'])) | (elapsed >= timeout_ms)
+        settled_since[robots] = since
+
+        error = setpoint - position
+        err_sum = error_sum[mask]
+        if loop['reset_on_crossing']:
+            err_sum = np.where(error * err_sum < 0, 0.0, err_sum)
+        err_sum = np.clip(err_sum + error, -INTEGRAL_LIMIT, INTEGRAL_LIMIT)
+        if loop['on_measurement']:
+            change = np.where(elapsed > 0, last_position[mask] - position, 0.0)
+        else:
+            change = error - last_error[mask]
+        output = kp * error + ki * err_sum + kd * change
+        if kind == 'pid':
+            output = np.clip(output, -DRIVE_OUTPUT_CAP, DRIVE_OUTPUT_CAP)
+        else:
+            output = np.clip(feedforward[i] + output, -100, 100)
+        error_sum[mask] = err_sum
+        last_error[mask] = error
+        last_position[mask] = position
+
+        done = robots[settled]
+        going = robots[~settled]
+        if len(going):
+            set_drive(going, output[~settled])
+            next_tick[going] = now + DRIVE_PERIOD_MS
+        if len(done):
+            brake_drive(done)
+            pc[done] += 1
+            entered[done] = False
+
+    closed_loop = {'drive': (enter_drive, drive_tick), 'turn': (enter_turn, turn_tick)}
+    now = 0.0
+    while now <= ROUTINE_LIMIT_MS:
+        changed = True
+        while changed:
+            changed = False
+            active = np.isnan(finish)
+            if not active.any():
+                break
+            for k in np.unique(pc[active]):
+                robots = np.flatnonzero(active & (pc == k))
+                item = items[k]
+                kind = item[0]
+                if kind == 'set':
+                    _, index, mode, rpm = item
+                    model.masks_stale = True
+                    model.mode[robots, index] = mode
+                    model.command_speed[robots, index] = rpm * physics.RPM_TO_RAD_S
+                    if mode == physics.HOLD_MODE:
+                        model.target_deg[robots, index] = model.motor_positions()[robots, index]
+                    pc[robots] += 1
+                    changed = True
+                elif kind == 'position':
+                    _, index, travel, rpm = item
+                    model.masks_stale = True
+                    model.mode[robots, index] = physics.POSITION_MODE
+                    model.command_speed[robots, index] = rpm * physics.RPM_TO_RAD_S
+                    model.target_deg[robots, index] = model.motor_positions()[robots, index] + travel
+                    pc[robots] += 1
+                    changed = True
+                elif kind == 'settle':
+                    # the same test as the model's is_done for a single robot
+                    index = item[1]
+                    off = model.target_deg[robots, index] - model.motor_positions()[robots, index]
+                    there = robots[(model.mode[robots, index] != physics.POSITION_MODE) | (np.abs(off) < 1.0)]
+                    if len(there):
+                        pc[there] += 1
+                        changed = True
+                elif kind == 'event':
+                    key = (k,) + item[1:]
+                    record = events.setdefault(key, np.full((n, 4), np.nan))
+                    record[robots] = np.column_stack((model.x[robots], model.y[robots],
+                                                      np.degrees(model.heading[robots]),
+                                                      np.full(len(robots), now)))
+                    pc[robots] += 1
+                    changed = True
+                elif kind == 'wait':
+                    fresh = robots[~entered[robots]]
+                    if len(fresh):
+                        delay = item[1] + jitter * rng.standard_normal(len(fresh))
+                        delay[fresh == 0] = item[1]
+                        wait_end[fresh] = now + np.maximum(delay, 0)
+                        entered[fresh] = True
+                    over = robots[wait_end[robots] <= now]
+                    if len(over):
+                        entered[over] = False
+                        pc[over] += 1
+                        changed = True
+                elif kind in closed_loop:
+                    enter, tick = closed_loop[kind]
+                    fresh = robots[~entered[robots]]
+                    if len(fresh):
+                        enter(fresh, item, now)
+                        next_tick[fresh] = now
+                        entered[fresh] = True
+                    due = robots[next_tick[robots] <= now]
+                    if len(due):
+                        mask = np.zeros(n, dtype=bool)
+                        mask[due] = True
+                        before = pc[due].copy()
+                        tick(mask, item, now)
+                        changed = changed or bool((pc[due] != before).any())
+                else:
+                    finish[robots] = now
+        if not np.isnan(finish).any():
+            break
+        model.step()
+        now += model.dt_ms
+
+    poses = np.column_stack((model.x, model.y, np.degrees(model.heading)))
+    return poses, finish, events
+
+
+def _replay_chunk(args):
+    return replay(*args)
+
+
+def run_batch(items, max_rpm, motor_layout, trials, workers=1, seed=0, spread=None):
+    """Splits `trials` over a process pool and stitches the results back together."""
+    if workers <= 1:
+        return replay(items, max_rpm, motor_layout, trials, seed, spread)
+    sizes = [len(c) for c in np.array_split(np.arange(trials), workers)]
+    jobs = [(items, max_rpm, motor_layout, size, seed + i, spread) for i, size in enumerate(sizes)]
+    with ProcessPoolExecutor(workers) as pool:
+        chunks = list(pool.map(_replay_chunk, jobs))
+    poses = np.concatenate([c[0] for c in chunks])
+    finish = np.concatenate([c[1] for c in chunks])
+    events = {}
+    for key in chunks[0][2]:
+        events[key] = np.concatenate([c[2].get(key, np.full((size, 4), np.nan))
+                                      for c, size in zip(chunks, sizes)])
+    return poses, finish, events
+
+
+def summarize(poses, finish, events, tolerance_in=2.0, tolerance_deg=10.0):
+    """
+    Scores a batch against robot 0, the unperturbed robot. An event counts as
+    a success when the robot was within tolerance of where the nominal robot
+    was when it did the same thing.
+    """
+    nominal = poses[0]
+    error = np.hypot(poses[:, 0] - nominal[0], poses[:, 1] - nominal[1])
+    summary = {
+        'trials': len(poses),
+        'finished': float(np.mean(~np.isnan(finish))),
+        'finish_ms': np.nanpercentile(finish, [50, 90, 99]) if (~np.isnan(finish)).any() else None,
+        'pose_mean': poses.mean(axis=0),
+        'pose_std': poses.std(axis=0),
+        'position_error_in': np.percentile(error, [50, 90, 99]),
+        'events': [],
+    }
+    for key in sorted(events):
+        record = events[key]
+        reached = ~np.isnan(record[:, 0])
+        ref = record[0]
+        off = np.hypot(record[:, 0] - ref[0], record[:, 1] - ref[1])
+        turn = np.abs((record[:, 2] - ref[2] + 180) % 360 - 180)
+        ok = reached & (off <= tolerance_in) & (turn <= tolerance_deg)
+        summary['events'].append((key, float(ok.mean()), np.nanpercentile(record[:, 3], [50, 99])))
+    return summary
+
+
+def main():
+    import runner
+
+    parser = argparse.ArgumentParser(description="Monte Carlo an autonomous routine over perturbed robots")
+    parser.add_argument('program', help="path to the robot program")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--routine', default='autonomous', help="function to run, e.g. red_left_negative_corner")
+    parser.add_argument('--trials', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=2.0, help="pickup position tolerance, inches")
+    args = parser.parse_args()
+
+    namespace = runner.load_program(args.program, args.auton)
+    items, max_rpm, layout = trace_routine(namespace, args.routine)
+
+    start = time.perf_counter()
+    poses, finish, events = run_batch(items, max_rpm, layout, args.trials, args.workers, args.seed)
+    wall = time.perf_counter() - start
+    s = summarize(poses, finish, events, args.tolerance)
+
+    print(f"{s['trials']} trials in {wall:.2f} s ({args.workers} worker(s))")
+    print(f"finished within {ROUTINE_LIMIT_MS} ms: {s['finished'] * 100:.1f}%")
+    if s['finish_ms'] is not None:
+        print("finish time p50/p90/p99: %.0f / %.0f / %.0f ms" % tuple(s['finish_ms']))
+    mean, std = s['pose_mean'], s['pose_std']
+    print(f"final pose x {mean[0]:.1f} +/- {std[0]:.2f} in, y {mean[1]:.1f} +/- {std[1]:.2f} in, "
+          f"heading {mean[2]:.1f} +/- {std[2]:.2f} deg")
+    print("distance from nominal p50/p90/p99: %.2f / %.2f / %.2f in" % tuple(s['position_error_in']))
+    for (step, name, action), rate, timing in s['events']:
+        print(f"  step {step:3d} {name}.{action:<6} success {rate * 100:5.1f}%  "
+              f"at {timing[0]:.0f} ms (p99 {timing[1]:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
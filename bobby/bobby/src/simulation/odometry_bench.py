@@ -0,0 +1,190 @@
+"""
+Drift and cost benchmark for odometry.py, the robot's encoder pose tracker.
+
+    python odometry_bench.py
+    python odometry_bench.py --robots 200 --seconds 30 --periods 5 10 20 50
+    python odometry_bench.py --program ../main.py --auton red_left
+
+A batch of robots on the physics model drive random curvy paths while one
+odometry.Odometry per robot and update period reads their encoders. Its
+pose is compared with the model's true pose at the end, as drift per meter
+driven: position error in mm per m and heading error in degrees per m.
+Integrating along a straight line instead of the arc is scored on the same
+encoder readings for comparison. The slip rows give the wheels the
+traction spread monte_carlo.py uses, which no encoder-only estimate can see.
+Update periods should be multiples of the model's 5 ms step. The model
+itself moves in straight 5 ms steps, so the arc rows bottom out around
+0.6 mm/m of the model's own error rather than the estimate's.
+
+The timing section measures Odometry.step on this machine. The brain runs
+MicroPython, which is much slower, so use it to compare changes rather
+than as the cost on the robot.
+
+With --program the program's own autonomous runs on the model instead and
+its odometry (started with the program) is checked against where the
+robot really ended up.
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+import runner
+import vex
+from monte_carlo import Perturbation
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from odometry import Odometry
+
+SEGMENT_MS = 750  # how long each random left/right command is held
+MAX_TURN = 60  # percent of output added to one side and taken from the other
+TIMING_UPDATES = 20000
+
+
+def drive_batch(n, seconds, periods, traction_spread, seed=0):
+    """
+    Drives n robots on random paths and tracks each with an Odometry per
+    update period. Returns {period: (arc errors, straight-line errors)}, each
+    an (n, 2) array of position error in inches and heading error in
+    degrees, and the distance every robot drove in inches.
+    """
+    rng = np.random.default_rng(seed)
+    params = physics.ChassisParams()
+    if traction_spread:
+        params.traction = np.minimum(1.0 + traction_spread * rng.standard_normal(n), 1.0)
+    model = physics.DriveModel([physics.LEFT, physics.RIGHT], [1.0, 1.0], 200.0, n_robots=n, params=params)
+    model.mode[:] = physics.VELOCITY_MODE
+    inches_per_degree = math.pi * physics.ChassisParams().wheel_diameter_in / 360
+    track_width = physics.ChassisParams().track_width_in
+
+    trackers = dict((p, [Odometry(None, None, inches_per_degree, track_width, None, p) for _ in range(n)])
+                    for p in periods)
+    straight = dict((p, np.zeros((n, 3))) for p in periods)  # x, y, heading in radians
+    last = dict((p, None) for p in periods)
+    distance = np.zeros(n)
+
+    steps = int(round(seconds * 1000 / model.dt_ms))
+    for step in range(steps + 1):
+        now = step * model.dt_ms
+        if now % SEGMENT_MS == 0:
+            forward = rng.uniform(-100, 100, n)
+            turn = rng.uniform(-MAX_TURN, MAX_TURN, n)
+            output = np.clip(np.column_stack((forward + turn, forward - turn)), -100, 100)
+            model.command_speed[:] = output / 100 * model.free_speed
+            model.masks_stale = True
+        for p in periods:
+            if now % p:
+                continue
+            encoders = model.motor_positions()
+            for robot, tracker in enumerate(trackers[p]):
+                tracker.step(encoders[robot, 0], encoders[robot, 1])
+            if last[p] is not None:
+                d = (encoders - last[p]) * inches_per_degree
+                pose = straight[p]
+                travel = (d[:, 0] + d[:, 1]) / 2
+                pose[:, 0] += travel * np.sin(pose[:, 2])
+                pose[:, 1] += travel * np.cos(pose[:, 2])
+                pose[:, 2] += (d[:, 0] - d[:, 1]) / track_width
+            last[p] = encoders
+        if step < steps:
+            x, y = model.x.copy(), model.y.copy()
+            model.step()
+            distance += np.hypot(model.x - x, model.y - y)
+
+    def errors(poses):
+        poses = np.asarray(poses)
+        miss = np.hypot(poses[:, 0] - model.x, poses[:, 1] - model.y)
+        turn = np.abs((poses[:, 2] - np.degrees(model.heading) + 180) % 360 - 180)
+        return np.column_stack((miss, turn))
+
+    results = {}
+    for p in periods:
+        arc = errors([t.pose for t in trackers[p]])
+        line = straight[p].copy()
+        line[:, 2] = np.degrees(line[:, 2])
+        results[p] = (arc, errors(line))
+    return results, distance
+
+
+def time_step(updates=TIMING_UPDATES):
+    """Seconds per Odometry.step on this machine, over a slow curve"""
+    tracker = Odometry(None, None, math.pi * 4 / 360, 12.0, None)
+    left = np.cumsum(np.full(updates, 7.0)).tolist()
+    right = np.cumsum(np.full(updates, 5.0)).tolist()
+    start = time.perf_counter()
+    for a, b in zip(left, right):
+        tracker.step(a, b)
+    return (time.perf_counter() - start) / updates
+
+
+def check_program(program, auton, traction):
+    """The program's odometry pose after autonomous against the model's, in field coordinates"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runner.load_program(program, auton)
+        model = physics.attach(namespace, physics.ChassisParams(traction=traction))
+        finish_ms = runner.run_autonomous()
+        vex.run_for(500)
+    odometry = namespace['odometry']
+    x0, y0, h0 = namespace['AUTON_START_POSE']
+    # The model starts at its origin facing +y; put its pose where the program's start is
+    turn = math.radians(h0)
+    x = x0 + model.x[0] * math.cos(turn) + model.y[0] * math.sin(turn)
+    y = y0 - model.x[0] * math.sin(turn) + model.y[0] * math.cos(turn)
+    heading = h0 + math.degrees(model.heading[0])
+    return finish_ms, odometry.pose, (x, y, heading)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure odometry drift and update cost on the physics model")
+    parser.add_argument('--robots', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=15.0, help="length of each random drive")
+    parser.add_argument('--periods', type=int, nargs='+', default=(5, 10, 20, 50), help="update periods, ms")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--program', help="also check this program's odometry over its autonomous")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--traction', type=float, default=1.0, help="wheel traction for --program")
+    args = parser.parse_args()
+
+    print(f"{args.robots} robots, {args.seconds:g} s of random driving each")
+    print(f"{'':>7} {'period':>6} | {'arc mm/m':>9} {'p99':>7} {'deg/m':>7} | "
+          f"{'line mm/m':>9} {'p99':>7} {'deg/m':>7}")
+    for label, spread in (('no slip', 0.0), ('slip', Perturbation().traction)):
+        results, distance = drive_batch(args.robots, args.seconds, args.periods, spread, args.seed)
+        meters = distance * physics.IN_TO_M
+        for p in args.periods:
+            cells = []
+            for errors in results[p]:
+                per_m = errors[:, 0] * physics.IN_TO_M * 1000 / meters
+                cells.append(f"{np.median(per_m):9.2f} {np.percentile(per_m, 99):7.2f} "
+                             f"{np.median(errors[:, 1] / meters):7.3f}")
+            print(f"{label:>7} {p:6d} | {cells[0]} | {cells[1]}")
+
+    seconds = time_step()
+    print(f"Odometry.step: {seconds * 1e6:.2f} us per update on this machine "
+          f"({seconds * 1e6 / 10000 * 100:.3f}% of a 10 ms period)")
+
+    if args.program:
+        finish_ms, estimate, truth = check_program(os.path.abspath(args.program), args.auton, args.traction)
+        miss = math.hypot(estimate[0] - truth[0], estimate[1] - truth[1])
+        print(f"{os.path.basename(args.program)} autonomous ({finish_ms:.0f} ms): odometry "
+              f"x {estimate[0]:.2f} y {estimate[1]:.2f} heading {estimate[2]:.2f}, true "
+              f"x {truth[0]:.2f} y {truth[1]:.2f} heading {truth[2]:.2f}, off by {miss:.2f} in")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Searches a routine's drive distances and waits for the fastest version that
+still ends where the original does.
+
+    python optimize_routine.py ../motion.py --routine motion
+    python optimize_routine.py ../main.py --auton red_left --routine red_left --workers 4
+
+Every candidate is the routine's text from routines.py with its numbers
+changed, run through the program's own autonomous on the physics model. The
+original routine's final pose is the target, and a candidate that ends
+further than --tolerance / --tolerance-deg from it pays a penalty on top of
+its time. The search is Nelder-Mead; each iteration evaluates its
+reflection, expansion and both contractions at once, so they spread across
+the worker processes.
+
+Only the drivetrain is simulated, so a wait that lets a piston or the
+conveyor finish looks like pure padding here. Leave those out with
+--verbs drive, or check the waits the search removes before pasting the
+result into routines.py.
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+import runner
+import vex
+
+SETTLE_MS = 500  # time allowed after autonomous for the robot to coast to a stop
+PENALTY_MS = 10000  # cost of ending one tolerance outside the target pose
+DRIVE_STEP = 0.1  # initial simplex step, fraction of each drive distance
+WAIT_STEP = 0.5  # initial simplex step, fraction of each wait
+
+# ---------------------------------------------------------------------------- #
+#  Routine text                                                                #
+# ---------------------------------------------------------------------------- #
+
+def parameters(text, verbs=('drive', 'wait')):
+    """(line number, word number, value, verb) of every tunable number in the routine text"""
+    found = []
+    for i, line in enumerate(text.split('\n')):
+        words = line.split('#')[0].split()
+        if len(words) == 2 and words[0] in verbs:
+            found.append((i, 1, float(words[1]), words[0]))
+    return found
+
+
+def substitute(text, params, values):
+    """
+    The routine text with each parameter replaced. Waits can't go below
+    zero and a drive keeps the direction it had.
+    """
+    lines = text.split('\n')
+    for (i, w, original, verb), value in zip(params, values):
+        if verb == 'wait':
+            number = '%d' % max(round(value), 0)
+        else:
+            number = '%.2f' % (math.copysign(max(abs(value), 0.5), original) if value * original > 0
+                               else math.copysign(0.5, original))
+        code, _, comment = lines[i].partition('#')
+        words = code.split()
+        words[w] = number
+        lines[i] = ' '.join(words) + ('  #' + comment if comment else '')
+    return '\n'.join(lines)
+
+# ---------------------------------------------------------------------------- #
+#  Evaluation                                                                  #
+# ---------------------------------------------------------------------------- #
+
+def evaluate(program, auton, name, text):
+    """
+    Runs the program's autonomous with routine name replaced by text.
+    Returns (finish ms, x, y, heading) with the pose in inches and degrees
+    after SETTLE_MS of coasting. Whatever the program prints is dropped.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runner.load_program(program, auton)
+        model = physics.attach(namespace)
+        namespace['routines'].ROUTINES[name] = text
+        finish_ms = runner.run_autonomous()
+        vex.run_for(SETTLE_MS)
+    return finish_ms, model.x[0], model.y[0], math.degrees(model.heading[0])
+
+
+def _evaluate_job(args):
+    return evaluate(*args)
+
+
+def cost(result, target, tolerance_in, tolerance_deg):
+    """Finish time plus PENALTY_MS per tolerance the final pose is outside the target"""
+    finish_ms, x, y, heading = result
+    if finish_ms is None:
+        return float('inf')
+    miss_in = math.hypot(x - target[1], y - target[2])
+    miss_deg = abs((heading - target[3] + 180) % 360 - 180)
+    excess = max(miss_in - tolerance_in, 0) / tolerance_in + max(miss_deg - tolerance_deg, 0) / tolerance_deg
+    return finish_ms + PENALTY_MS * excess
+
+
+class Evaluator:
+    """Scores batches of parameter vectors, in a process pool when workers > 1"""
+
+    def __init__(self, program, auton, name, text, params, target, tolerance_in, tolerance_deg, workers=1):
+        self.program = program
+        self.auton = auton
+        self.name = name
+        self.text = text
+        self.params = params
+        self.target = target
+        self.tolerance_in = tolerance_in
+        self.tolerance_deg = tolerance_deg
+        self.pool = ProcessPoolExecutor(workers) if workers > 1 else None
+        self.evaluations = 0
+        self.best = (float('inf'), None, None)  # (cost, values, result)
+
+    def __call__(self, points):
+        jobs = [(self.program, self.auton, self.name, substitute(self.text, self.params, p)) for p in points]
+        results = list(self.pool.map(_evaluate_job, jobs) if self.pool else map(_evaluate_job, jobs))
+        self.evaluations += len(points)
+        costs = [cost(r, self.target, self.tolerance_in, self.tolerance_deg) for r in results]
+        for c, p, r in zip(costs, points, results):
+            if c < self.best[0]:
+                self.best = (c, np.array(p), r)
+        return costs
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+
+# ---------------------------------------------------------------------------- #
+#  Search                                                                      #
+# ---------------------------------------------------------------------------- #
+
+def nelder_mead(evaluate_batch, x0, steps, iterations=60, tolerance=1.0):
+    """
+    Minimizes a function of a vector with Nelder-Mead. evaluate_batch takes
+    a list of points and returns their costs, so every candidate an
+    iteration might need is scored in one batch. Stops after iterations or
+    once the simplex's costs are within tolerance of each other.
+    """
+    n = len(x0)
+    simplex = [np.array(x0, dtype=float)]
+    for i in range(n):
+        point = np.array(x0, dtype=float)
+        point[i] += steps[i]
+        simplex.append(point)
+    costs = evaluate_batch(simplex)
+
+    for _ in range(iterations):
+        order = np.argsort(costs)
+        simplex = [simplex[i] for i in order]
+        costs = [costs[i] for i in order]
+        if costs[-1] - costs[0] <= tolerance:
+            break
+        centroid = np.mean(simplex[:-1], axis=0)
+        worst = simplex[-1]
+        reflected = centroid + (centroid - worst)
+        expanded = centroid + 2 * (centroid - worst)
+        outside = centroid + 0.5 * (centroid - worst)
+        inside = centroid - 0.5 * (centroid - worst)
+        c_reflected, c_expanded, c_outside, c_inside = evaluate_batch([reflected, expanded, outside, inside])
+
+        if c_reflected < costs[0]:
+            simplex[-1], costs[-1] = (expanded, c_expanded) if c_expanded < c_reflected else (reflected, c_reflected)
+        elif c_reflected < costs[-2]:
+            simplex[-1], costs[-1] = reflected, c_reflected
+        elif c_reflected < costs[-1] and c_outside <= c_reflected:
+            simplex[-1], costs[-1] = outside, c_outside
+        elif c_inside < costs[-1]:
+            simplex[-1], costs[-1] = inside, c_inside
+        else:
+            # Shrink every point halfway toward the best one
+            simplex = [simplex[0]] + [simplex[0] + 0.5 * (p - simplex[0]) for p in simplex[1:]]
+            costs = [costs[0]] + evaluate_batch(simplex[1:])
+
+    best = int(np.argmin(costs))
+    return simplex[best], costs[best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shorten a routine's drives and waits against the physics model")
+    parser.add_argument('program', help="path to the robot program, e.g. ../motion.py")
+    parser.add_argument('--routine', required=True, help="routine name in routines.py")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--verbs', default='drive,wait', help="steps whose numbers may change")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="final position tolerance, inches")
+    parser.add_argument('--tolerance-deg', type=float, default=3.0, help="final heading tolerance, degrees")
+    parser.add_argument('--iterations', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    program = os.path.abspath(args.program)
+    namespace = runner.load_program(program, args.auton)
+    text = namespace['routines'].ROUTINES[args.routine]
+    params = parameters(text, tuple(args.verbs.split(',')))
+    if not params:
+        parser.error(f"routine {args.routine} has no {args.verbs} steps to tune")
+
+    target = evaluate(program, args.auton, args.routine, text)
+    print(f"original: {target[0]:.0f} ms, ends at x {target[1]:.1f} y {target[2]:.1f} in, "
+          f"heading {target[3]:.1f} deg")
+
+    x0 = [value for _, _, value, _ in params]
+    steps = [-WAIT_STEP * v if verb == 'wait' else DRIVE_STEP * v for _, _, v, verb in params]
+    steps = [s if s else 100.0 for s in steps]
+    evaluator = Evaluator(program, args.auton, args.routine, text, params, target,
+                          args.tolerance, args.tolerance_deg, args.workers)
+    start = time.perf_counter()
+    try:
+        nelder_mead(evaluator, x0, steps, args.iterations)
+    finally:
+        evaluator.close()
+    wall = time.perf_counter() - start
+
+    best_cost, best, result = evaluator.best
+    print(f"{evaluator.evaluations} candidates in {wall:.1f} s ({args.workers} worker(s))")
+    if best is None or result[0] >= target[0]:
+        print("nothing faster stays inside the tolerance")
+        return
+    miss = math.hypot(result[1] - target[1], result[2] - target[2])
+    print(f"best: {result[0]:.0f} ms ({target[0] - result[0]:.0f} ms faster), "
+          f"{miss:.2f} in and {abs((result[3] - target[3] + 180) % 360 - 180):.1f} deg from the original")
+    if best_cost > result[0]:
+        print("warning: best candidate is outside the tolerance")
+    print(substitute(text, params, best))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Compares drive-then-turn routines with following a smooth path through the
+same points, on the physics model.
+
+    python path_compare.py
+    python path_compare.py ../main.py --routine red_left skills_chain
+    python path_compare.py --text "drive 24; turn 90; drive -27" --show
+
+Each routine first runs as written, with the program's pid_drive and timed
+turns, and the robot's field pose is recorded after every move. Then every
+run of moves between piston and conveyor steps is rewritten as goto steps
+through those poses (goto ... back for the backing-up moves), dropping the
+waits between moves that only let the robot stop, and the rewritten routine
+runs on a fresh robot. Turns are folded into the curve unless nothing
+follows them, in which case they stay point turns.
+
+The report shows both routines' total time and where the path version ended
+up against the chain's final pose. --show prints the rewritten routines, to
+paste into routines.py. The program needs a goto handler (main.py's
+follow_path); "skills_chain" is the 20pskil.py chain in 90 degree turns,
+rewritten as routines.py's skills.
+
+The last lines time pursuit.PathIndex against measuring every path point.
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+import runner
+import vex
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import routine
+import routines
+from path import smooth_path
+
+# 20pskil.py's commented-out autonomous, its timed turns rounded to 90 degrees
+SKILLS_CHAIN = """
+drive 24
+wait 500
+turn 90
+wait 300
+drive -27
+wait 1000
+turn 90
+wait 500
+drive -28
+wait 1000
+turn -90
+wait 1000
+drive 45
+"""
+
+MOVES = (routine.DRIVE, routine.TURN)
+ROUTINE_NAME = "path_compare"
+LIMIT_MS = 30000
+REST_MS = 500
+QUERIES = 20000
+
+
+def field_pose(model, start):
+    """The model's pose in the field frame, for a robot that started at start (x, y, heading)"""
+    turn = math.radians(start[2])
+    x = start[0] + model.x[0] * math.cos(turn) + model.y[0] * math.sin(turn)
+    y = start[1] - model.x[0] * math.sin(turn) + model.y[0] * math.cos(turn)
+    return x, y, start[2] + math.degrees(model.heading[0])
+
+
+def run_text(program, auton, text):
+    """
+    Runs routine text on a fresh simulated robot from the program's
+    AUTON_START_POSE. Returns the time it took, the field pose after each
+    step and the pose the robot came to rest at.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runner.load_program(program, auton)
+        model = physics.attach(namespace)
+    start = namespace['AUTON_START_POSE']
+    namespace['routines'].ROUTINES[ROUTINE_NAME] = text
+    poses = []
+
+    def recorded(function):
+        def step(*args):
+            result = function(*args)
+            poses.append(field_pose(model, start))
+            return result
+        return step
+
+    # every step but a run of gotos is one handler call
+    program_routine = namespace['routine']
+    run = program_routine.run
+    program_routine.run = lambda steps, handlers: run(
+        steps, dict((op, recorded(handler)) for op, handler in handlers.items()))
+
+    def go():
+        namespace['drivetrain'].invalidate()
+        namespace['odometry'].set_pose(*start)
+        namespace['auton_actions'].start()
+        namespace['run_routine'](ROUTINE_NAME)
+        namespace['auton_actions'].stop()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed = vex.run_task(go, LIMIT_MS)
+        vex.run_for(REST_MS)
+    return elapsed, poses, field_pose(model, start)
+
+
+def as_path(steps, poses):
+    """
+    Routine text with each run of moves replaced by goto steps through the
+    poses the moves ended at
+    """
+    lines = []
+    i = 0
+    while i < len(steps):
+        op, a, b = steps[i]
+        if op not in MOVES:
+            lines.append(step_text(steps[i]))
+            i += 1
+            continue
+        run = []
+        while i < len(steps) and (steps[i][0] in MOVES or steps[i][0] == routine.WAIT):
+            run.append(i)
+            i += 1
+        # waits after the last move belong to whatever comes next
+        while steps[run[-1]][0] == routine.WAIT:
+            i = run.pop()
+        last_drive = max([j for j in run if steps[j][0] == routine.DRIVE] or [-1])
+        for j in run:
+            op, a, b = steps[j]
+            if op == routine.DRIVE and a != 0:
+                x, y, _ = poses[j]
+                lines.append("goto %.1f %.1f%s" % (x, y, " back" if a < 0 else ""))
+            elif op == routine.TURN and j > last_drive:
+                lines.append(step_text(steps[j]))
+    return "\n".join(lines) + "\n"
+
+
+def step_text(step):
+    op, a, b = step
+    if op == routine.PISTON:
+        return "piston %s" % ("open" if a else "close")
+    if op == routine.CONVEYOR and b > 0:
+        return "conveyor %g for %g" % (a, b)
+    if op in (routine.GOTO, routine.GOTO_BACK):
+        return "goto %g %g%s" % (a, b, " back" if op == routine.GOTO_BACK else "")
+    if op == routine.NAVIGATE:
+        return "navigate %g %g" % (a, b)
+    return "%s %g" % (routine.NAMES[op], a)
+
+
+def compare(program, auton, text):
+    """(chain ms, path ms, rewritten text, chain end pose, path end pose)"""
+    steps = routine.parse(text)
+    chain_ms, poses, chain_end = run_text(program, auton, text)
+    path_text = as_path(steps, poses)
+    path_ms, _, path_end = run_text(program, auton, path_text)
+    return chain_ms, path_ms, path_text, chain_end, path_end
+
+
+def time_nearest(queries=QUERIES, seed=0):
+    """
+    Seconds per nearest-point query on a long path, with PathIndex and by
+    checking every point, which must agree
+    """
+    rng = np.random.default_rng(seed)
+    path = smooth_path([(20, 20), (120, 30), (110, 120), (30, 110), (40, 50), (90, 70)])
+    targets = rng.uniform(10, 130, (queries, 2)).tolist()
+    # the same probe the follower makes: near the path, most of the time
+    points = [(path.xs[i] + dx / 20, path.ys[i] + dy / 20) for i, (dx, dy) in
+              zip(rng.integers(0, path.last + 1, queries).tolist(), targets)]
+
+    begin = time.perf_counter()
+    found = [path.nearest(x, y) for x, y in points]
+    indexed = (time.perf_counter() - begin) / queries
+
+    xs, ys = path.xs, path.ys
+    checked = []
+    begin = time.perf_counter()
+    for x, y in points:
+        best = 0
+        best_distance = (xs[0] - x) ** 2 + (ys[0] - y) ** 2
+        for i in range(1, path.last + 1):
+            d = (xs[i] - x) ** 2 + (ys[i] - y) ** 2
+            if d < best_distance:
+                best = i
+                best_distance = d
+        checked.append(best)
+    linear = (time.perf_counter() - begin) / queries
+    if found != checked:
+        raise AssertionError("PathIndex disagrees with checking every point")
+    return path.last + 1, indexed, linear
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time drive-then-turn routines against following a path through them")
+    parser.add_argument('program', nargs='?', default=os.path.join(SRC_DIR, 'main.py'))
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--routine', nargs='+', default=['red_left', 'red_right', 'skills_chain'],
+                        help="routines in routines.py, or skills_chain")
+    parser.add_argument('--text', help="routine text to compare instead, ; between steps")
+    parser.add_argument('--show', action='store_true', help="print the rewritten routines")
+    args = parser.parse_args()
+
+    program = os.path.abspath(args.program)
+    if args.text:
+        chains = [('text', args.text.replace(';', '\n'))]
+    else:
+        chains = [(name, SKILLS_CHAIN if name == 'skills_chain' else routines.ROUTINES[name])
+                  for name in args.routine]
+
+    print(f"{os.path.basename(program)}, path pose is compared with where the chain ended")
+    print(f"{'routine':>12} | {'chain ms':>8} {'path ms':>8} {'saved':>6} | {'off in':>6} {'off deg':>7}")
+    for name, text in chains:
+        chain_ms, path_ms, path_text, chain_end, path_end = compare(program, args.auton, text)
+        miss = math.hypot(path_end[0] - chain_end[0], path_end[1] - chain_end[1])
+        turn = (path_end[2] - chain_end[2] + 180) % 360 - 180
+        print(f"{name:>12} | {chain_ms:8.0f} {path_ms:8.0f} {1 - path_ms / chain_ms:6.0%} | "
+              f"{miss:6.2f} {turn:7.1f}")
+        if args.show:
+            print("    " + path_text.strip().replace("\n", "\n    "))
+
+    points, indexed, linear = time_nearest()
+    print(f"nearest of {points} path points: {indexed * 1e6:.1f} us with PathIndex, "
+          f"{linear * 1e6:.1f} us checking every point")
+
+
+if __name__ == "__main__":
+    main()
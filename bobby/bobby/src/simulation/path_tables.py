@@ -0,0 +1,292 @@
+"""
+Makes the path table the brain loads at startup (path.py) for every run of
+goto steps in routines.py.
+
+    python path_tables.py
+    python path_tables.py ../main.py --out /media/sdcard --spline cubic
+    python path_tables.py --png paths.png --check skills
+
+Each run of gotos becomes a quintic Hermite spline (or cubic with --spline
+cubic, the same curve path.smooth_path makes on the brain) from where the
+routine should be by then, resampled every PATH_SPACING inches of arc
+length. Every point gets a speed limit: slow enough that the outer wheel
+stays under the program's PATH_MAX_SPEED_IPS and the sideways acceleration
+under its PATH_ACCELERATION, and low enough before a bend to brake for it.
+The quintic keeps the curvature continuous through the waypoints, where
+the cubic's can jump, so its limits don't jump either. A table of a season's
+routines takes a few milliseconds.
+
+The routine's planned pose comes from the program's AUTON_START_POSE and
+its drive and turn steps, so a drive before the first goto counts with the
+program's CORRECTION_FACTOR like on the robot. The table is written as the
+program's PATH_TABLE_FILE in --out; copy it to the SD card.
+
+--png or --show draws the paths on the field, coloured by speed. --check
+runs routines on the physics model with and without the table.
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import runner
+import vex
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import path
+import routine
+import routines
+
+SAMPLES = 64  # spline samples per waypoint gap before resampling
+
+# Basis polynomials, one row per control value, coefficients of t^0 .. t^5
+CUBIC = np.array([  # p0, m0, p1, m1
+    [1, 0, -3, 2, 0, 0],
+    [0, 1, -2, 1, 0, 0],
+    [0, 0, 3, -2, 0, 0],
+    [0, 0, -1, 1, 0, 0],
+], dtype=float)
+QUINTIC = np.array([  # p0, m0, a0, a1, m1, p1
+    [1, 0, 0, -10, 15, -6],
+    [0, 1, 0, -6, 8, -3],
+    [0, 0, 0.5, -1.5, 1.5, -0.5],
+    [0, 0, 0, 0.5, -1, 0.5],
+    [0, 0, 0, -4, 7, -3],
+    [0, 0, 0, 10, -15, 6],
+])
+
+
+def derivative(basis):
+    """Coefficients of the derivative of each basis row"""
+    return np.hstack((basis[:, 1:] * np.arange(1, basis.shape[1]), np.zeros((len(basis), 1))))
+
+
+def controls(points, quintic):
+    """
+    (gaps, control values, 2) for a spline through points: Catmull-Rom
+    tangents as in path.smooth_path, and for a quintic second derivatives
+    averaged from the cubic pieces either side of each point
+    """
+    p = np.asarray(points, dtype=float)
+    m = np.empty_like(p)
+    m[1:-1] = (p[2:] - p[:-2]) / 2
+    m[0] = p[1] - p[0]
+    m[-1] = p[-1] - p[-2]
+    if not quintic:
+        return np.stack((p[:-1], m[:-1], p[1:], m[1:]), axis=1)
+    chord = p[1:] - p[:-1]
+    start = 6 * chord - 4 * m[:-1] - 2 * m[1:]  # cubic's second derivative leaving each point
+    end = -6 * chord + 2 * m[:-1] + 4 * m[1:]  # and arriving at the next
+    a = np.empty_like(p)
+    a[0] = start[0]
+    a[-1] = end[-1]
+    a[1:-1] = (end[:-1] + start[1:]) / 2
+    return np.stack((p[:-1], m[:-1], a[:-1], a[1:], m[1:], p[1:]), axis=1)
+
+
+def make_path(points, spacing, max_speed, acceleration, track_width, quintic=True, samples=SAMPLES):
+    """A path.Path through points with a speed limit at every point"""
+    basis = QUINTIC if quintic else CUBIC
+    control = controls(points, quintic)
+    t = np.linspace(0, 1, samples + 1)[:-1]
+    powers = t[:, None] ** np.arange(6)
+    d1 = derivative(basis)
+    weights = [powers @ b.T for b in (basis, d1, derivative(d1))]
+    # (gaps, samples, 2) for position, first and second derivative, then the final point
+    position, velocity, accel = (np.einsum('kb,gbd->gkd', w, control).reshape(-1, 2) for w in weights)
+    position = np.vstack((position, points[-1]))
+    speed = np.hypot(velocity[:, 0], velocity[:, 1])
+    curvature = np.abs(velocity[:, 0] * accel[:, 1] - velocity[:, 1] * accel[:, 0]) / np.maximum(speed, 1e-9) ** 3
+    curvature = np.append(curvature, curvature[-1])
+
+    arc = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(position, axis=0).T))))
+    s = np.arange(0, arc[-1], spacing)
+    if arc[-1] - s[-1] > 1e-3:
+        s = np.append(s, arc[-1])
+    else:
+        s[-1] = arc[-1]
+    xs = np.interp(s, arc, position[:, 0])
+    ys = np.interp(s, arc, position[:, 1])
+    kappa = np.interp(s, arc, curvature)
+
+    # outer wheel under max_speed, sideways acceleration under acceleration
+    limit = np.minimum(max_speed / (1 + kappa * track_width / 2),
+                       np.sqrt(acceleration / np.maximum(kappa, 1e-9)))
+    # and slow enough to brake into every later limit: v^2 <= limit_j^2 + 2 a (s_j - s)
+    reach = limit ** 2 + 2 * acceleration * s
+    speeds = np.sqrt(np.minimum.accumulate(reach[::-1])[::-1] - 2 * acceleration * s)
+    return path.Path(xs.tolist(), ys.tolist(), spacing, speeds.tolist())
+
+
+def goto_runs(text, start, drive_inches):
+    """
+    [(points, backwards, planned start pose), ...] for every run of goto
+    steps in routine text, following the routine's moves from start
+    """
+    x, y, heading = start
+    runs = []
+    steps = routine.parse(text)
+    i = 0
+    while i < len(steps):
+        op, a, b = steps[i]
+        i += 1
+        if op == routine.DRIVE:
+            d = drive_inches(a)
+            x += d * math.sin(math.radians(heading))
+            y += d * math.cos(math.radians(heading))
+        elif op == routine.TURN:
+            heading += a
+        elif op in (routine.GOTO, routine.GOTO_BACK):
+            points = [(a, b)]
+            while i < len(steps) and steps[i][0] == op:
+                points.append(steps[i][1:])
+                i += 1
+            runs.append((points, op == routine.GOTO_BACK, (x, y, heading)))
+            (px, py), (qx, qy) = ((x, y), points[0]) if len(points) == 1 else points[-2:]
+            x, y = points[-1]
+            heading = math.degrees(math.atan2(qx - px, qy - py)) + (180 if op == routine.GOTO_BACK else 0)
+        elif op == routine.NAVIGATE:
+            # planned on the robot, so only where it ends up is known here
+            heading = math.degrees(math.atan2(a - x, b - y))
+            x, y = a, b
+    return runs
+
+
+def program_constants(program, auton):
+    """The loaded program's namespace, for its path constants and drive conversion"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return runner.load_program(program, auton)
+
+
+def build(namespace, texts, quintic=True):
+    """[(name, key, backwards, Path), ...] for every distinct run of gotos in texts {name: text}"""
+    per_inch = namespace['WHEEL_CIRCUMFERENCE_INCHES'] / 360
+    drive_inches = lambda distance: namespace['inches_to_degrees'](distance) * per_inch
+    entries = []
+    seen = {}
+    for name, text in texts.items():
+        for n, (points, backwards, start) in enumerate(goto_runs(text, namespace['AUTON_START_POSE'], drive_inches)):
+            key = path.path_key(points, backwards)
+            if (key, backwards) in seen:
+                if seen[(key, backwards)] != start[:2]:
+                    print(f"warning: {name} run {n + 1} has the same points as an earlier run "
+                          f"but starts elsewhere, keeping the first")
+                continue
+            seen[(key, backwards)] = start[:2]
+            p = make_path([start[:2]] + points, path.PATH_SPACING, namespace['PATH_MAX_SPEED_IPS'],
+                          namespace['PATH_ACCELERATION'], namespace['TRACK_WIDTH_INCHES'], quintic)
+            entries.append((f"{name} {n + 1}", key, backwards, p))
+    return entries
+
+
+def render(entries, max_speed, png=None):
+    """Draws the paths on the visualizer's field, coloured by their speed limit"""
+    sys.path.insert(0, os.path.join(SRC_DIR, 'visualization'))
+    if png:
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from auton_visualizer import AutonVisualizer
+
+    viz = AutonVisualizer()
+    viz.hide_controls()
+    for artist in (viz.robot_patch, viz.direction_indicator, viz.status_text):
+        artist.set_visible(False)
+    for name, key, backwards, p in entries:
+        dots = viz.ax.scatter(p.xs, p.ys, c=p.speeds, s=4, cmap='viridis', vmin=0, vmax=max_speed, zorder=3)
+        viz.ax.annotate(name, (p.xs[0], p.ys[0]), color='white', fontsize=7, zorder=4)
+    viz.fig.colorbar(dots, ax=viz.ax, label="speed limit, in/s")
+    if png:
+        viz.fig.savefig(png, dpi=150)
+        print(f"wrote {png}")
+    else:
+        plt.show()
+
+
+def check(program, auton, table_file, data, names):
+    """
+    Each routine's simulated time and how far it came to rest from its last
+    goto point, without and with the table on the SD card
+    """
+    from path_compare import run_text
+    results = []
+    card = tempfile.mkdtemp()
+    try:
+        for name in names:
+            text = routines.ROUTINES[name]
+            goals = [step[1:] for step in routine.parse(text) if step[0] in (routine.GOTO, routine.GOTO_BACK)]
+            if not goals:
+                raise ValueError(f"{name} has no goto steps")
+            goal = goals[-1]
+            row = [name]
+            for directory in (None, card):
+                if directory is not None:
+                    with open(os.path.join(card, table_file), 'wb') as f:
+                        f.write(data)
+                vex.set_sdcard(directory)
+                elapsed, _, end = run_text(program, auton, text)
+                row += [elapsed, math.hypot(end[0] - goal[0], end[1] - goal[1])]
+            results.append(row)
+    finally:
+        vex.set_sdcard()
+        shutil.rmtree(card)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the goto paths of every routine for the brain")
+    parser.add_argument('program', nargs='?', default=os.path.join(SRC_DIR, 'main.py'))
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--out', default='.', help="directory to write the table to")
+    parser.add_argument('--spline', choices=('quintic', 'cubic'), default='quintic')
+    parser.add_argument('--png', help="draw the paths on the field to this file")
+    parser.add_argument('--show', action='store_true', help="draw the paths on the field in a window")
+    parser.add_argument('--check', nargs='+', metavar='ROUTINE', help="time these routines with and without the table")
+    args = parser.parse_args()
+
+    program = os.path.abspath(args.program)
+    namespace = program_constants(program, args.auton)
+    begin = time.perf_counter()
+    entries = build(namespace, routines.ROUTINES, args.spline == 'quintic')
+    data = path.pack_table([entry[1:] for entry in entries])
+    elapsed = time.perf_counter() - begin
+
+    table = path.unpack_table(data)
+    for name, key, backwards, p in entries:
+        loaded = table[(key, backwards)]
+        error = max(abs(a - b) for a, b in zip(loaded.xs + loaded.ys, p.xs + p.ys))
+        print(f"{name:>12}: {p.length:6.1f} in, {p.last + 1:4d} points, "
+              f"speed {min(p.speeds):5.1f}-{max(p.speeds):5.1f} in/s, stored to {error:.3f} in")
+    os.makedirs(args.out, exist_ok=True)
+    table_file = os.path.join(args.out, namespace['PATH_TABLE_FILE'])
+    with open(table_file, 'wb') as f:
+        f.write(data)
+    print(f"{len(entries)} paths in {elapsed * 1000:.1f} ms, {len(data)} bytes to {table_file}")
+
+    if args.check:
+        for name, without, miss, with_table, table_miss in check(program, args.auton, namespace['PATH_TABLE_FILE'],
+                                                                 data, args.check):
+            print(f"{name}: {without:.0f} ms and {miss:.2f} in off the end with paths made on the brain, "
+                  f"{with_table:.0f} ms and {table_miss:.2f} in with the table")
+    if args.png or args.show:
+        render(entries, namespace['PATH_MAX_SPEED_IPS'], args.png)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Differential-drive physics model for the simulated drivetrain.
+
+Each drive motor is a V5 smart motor: a DC motor whose torque falls off
+linearly with speed, wrapped in the motor's own velocity loop, fed from a
+battery that sags under load. The chassis is a rigid body with mass, yaw
+inertia, rolling resistance and wheel scrub when turning. Everything is
+stored as NumPy arrays with a leading robot axis, so the same model can step
+one robot behind the `vex` stand-in or thousands of perturbed robots at once.
+
+    python physics.py ../main.py 24 --auton red_left
+
+runs one pid_drive(24) from the program against the model and reports how
+far the robot really went, how much it overshot and how long it took, which
+is what the CORRECTION_FACTOR values in inches_to_degrees try to paper over.
+"""
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import vex
+
+IN_TO_M = 0.0254
+GRAVITY = 9.81
+RPM_TO_RAD_S = 2.0 * math.pi / 60.0
+
+# Fixed integration step in seconds
+DEFAULT_DT = 0.005
+
+# Per-motor control modes
+COAST_MODE = 0
+VELOCITY_MODE = 1
+BRAKE_MODE = 2
+HOLD_MODE = 3
+POSITION_MODE = 4
+
+LEFT = 0
+RIGHT = 1
+
+
+class ChassisParams:
+    """
+    Physical constants of the robot. Every value may be a scalar or an array
+    with one entry per simulated robot.
+    """
+
+    def __init__(self, **overrides):
+        self.mass_kg = 6.8
+        self.inertia_kgm2 = 0.19
+        self.wheel_diameter_in = 4.0
+        self.track_width_in = 12.0
+        self.stall_torque_nm = 2.1  # 18:1 cartridge, scaled for other cartridges
+        self.stall_current_a = 2.5
+        self.motor_voltage = 12.0  # most the motor controller will apply
+        self.battery_voltage = 12.4
+        self.battery_resistance = 0.15
+        self.rolling_resistance = 0.04  # fraction of weight
+        self.viscous_drag = 2.0  # N per m/s on each side
+        self.turn_scrub_nm = 1.5
+        self.velocity_kp = 2.0  # internal velocity loop, volts per rad/s of error
+        self.brake_kp = 2.0
+        self.position_kp = 0.3  # rad/s of target speed per degree of error
+        self.motor_scale = 1.0  # torque multiplier, e.g. for a worn motor
+        self.traction = 1.0  # fraction of wheel travel that reaches the floor
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise AttributeError("unknown chassis parameter: %s" % name)
+            setattr(self, name, value)
+
+
+class DriveModel:
+    """
+    Fixed-step model of n_robots identical drivetrains. motor_sides gives
+    LEFT/RIGHT for each motor and motor_signs is +1 when spinning the motor
+    FORWARD pushes its side of the robot forward.
+    """
+
+    def __init__(self, motor_sides, motor_signs=None, max_rpm=200.0, n_robots=1,
+                 dt=DEFAULT_DT, params=None):
+        params = params or ChassisParams()
+        n = n_robots
+        m = len(motor_sides)
+        self.n_robots = n
+        self.n_motors = m
+        self.dt = dt
+        self.dt_ms = dt * 1000.0
+        self.time_ms = 0.0
+
+        def per_robot(value):
+            return np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+
+        self.side = np.asarray(motor_sides, dtype=int)
+        self.sign = np.ones(m) if motor_signs is None else np.asarray(motor_signs, dtype=float)
+        self.free_speed = np.broadcast_to(np.asarray(max_rpm, dtype=float), (m,)) * RPM_TO_RAD_S
+
+        # (motors, sides) matrix that sums signed motor torques into each side
+        self.side_matrix = np.zeros((m, 2))
+        self.side_matrix[np.arange(m), self.side] = self.sign
+
+        self.mass = per_robot(params.mass_kg)
+        self.inertia = per_robot(params.inertia_kgm2)
+        self.wheel_radius = per_robot(params.wheel_diameter_in) * IN_TO_M / 2.0
+        self.half_track = per_robot(params.track_width_in) * IN_TO_M / 2.0
+        self.rolling_force = per_robot(params.rolling_resistance) * self.mass * GRAVITY / 2.0
+        self.viscous_drag = per_robot(params.viscous_drag)
+        self.turn_scrub = per_robot(params.turn_scrub_nm)
+        self.motor_voltage = per_robot(params.motor_voltage)
+        self.battery_voltage = per_robot(params.battery_voltage)
+        self.battery_resistance = per_robot(params.battery_resistance)
+        self.traction = per_robot(params.traction)
+        self.velocity_kp = params.velocity_kp
+        self.brake_kp = params.brake_kp
+        self.position_kp = params.position_kp
+
+        # Cartridges trade speed for torque at constant power
+        stall = params.stall_torque_nm * (200.0 * RPM_TO_RAD_S) / self.free_speed
+        scale = np.asarray(params.motor_scale, dtype=float)
+        if scale.ndim == 1:
+            scale = scale[:, None]
+        self.stall_torque = np.broadcast_to(scale, (n, m)) * stall
+        self.stall_current = params.stall_current_a
+
+        # Linear motor model: torque = volts * torque_per_volt - speed * back_emf
+        self.feedforward = self.motor_voltage[:, None] / self.free_speed
+        self.torque_per_volt = self.stall_torque / self.motor_voltage[:, None]
+        self.back_emf = self.stall_torque / self.free_speed
+        self.amps_per_nm = self.stall_current / self.stall_torque
+
+        # Commands
+        self.mode = np.full((n, m), COAST_MODE)
+        self.command_speed = np.zeros((n, m))  # rad/s at the motor, user frame
+        self.target_deg = np.zeros((n, m))
+        self._update_masks()
+
+        # State
+        self.offset_deg = np.zeros((n, m))
+        self.wheel_angle = np.zeros((n, 2))  # rad, positive = that side moved forward
+        self.v = np.zeros(n)  # m/s forward
+        self.w = np.zeros(n)  # rad/s, clockwise positive like the inertial sensor
+        self.x = np.zeros(n)  # inches
+        self.y = np.zeros(n)  # inches
+        self.heading = np.zeros(n)  # rad, clockwise from +y
+        self.torque = np.zeros((n, m))
+        self.current = np.zeros((n, m))
+        self.supply_voltage = np.minimum(self.battery_voltage, self.motor_voltage)
+
+    # ------------------------------------------------------------------ #
+    #  Stepping                                                          #
+    # ------------------------------------------------------------------ #
+
+    def wheel_speeds(self):
+        """(n, 2) angular speed of the left and right wheels in rad/s."""
+        spin = self.w * self.half_track
+        return np.stack((self.v + spin, self.v - spin), axis=1) / self.wheel_radius[:, None]
+
+    def motor_positions(self):
+        """(n, m) encoder reading of every motor in degrees."""
+        return np.degrees(self.wheel_angle[:, self.side]) * self.sign + self.offset_deg
+
+    def motor_velocities(self):
+        """(n, m) speed of every motor in degrees per second."""
+        return np.degrees(self.wheel_speeds()[:, self.side]) * self.sign
+
+    def _update_masks(self):
+        self.positional = (self.mode == POSITION_MODE) | (self.mode == HOLD_MODE)
+        self.any_positional = bool(self.positional.any())
+        self.braking = self.mode == BRAKE_MODE
+        self.powered = (self.mode != COAST_MODE).astype(float)
+        self.masks_stale = False
+
+    def step(self):
+        dt = self.dt
+        if self.masks_stale:
+            self._update_masks()
+        wheel_speed = self.wheel_speeds()
+        motor_speed = wheel_speed[:, self.side] * self.sign
+
+        # Speed each motor's internal controller is trying to hold
+        target = self.command_speed
+        if self.any_positional:
+            chase = self.position_kp * (self.target_deg - self.motor_positions())
+            limit = np.where(self.mode == POSITION_MODE, self.command_speed, self.free_speed)
+            target = np.where(self.positional, np.clip(chase, -limit, limit), target)
+
+        volts = np.where(self.braking,
+                         -self.brake_kp * motor_speed,
+                         target * self.feedforward + self.velocity_kp * (target - motor_speed))
+        supply = self.supply_voltage[:, None]
+        volts = np.clip(volts, -supply, supply)
+        torque = (volts * self.torque_per_volt - motor_speed * self.back_emf) * self.powered
+        self.torque = torque
+        self.current = torque * self.amps_per_nm
+
+        # Battery sag from this step's draw limits what the next step can apply
+        draw = np.abs(self.current).sum(axis=1)
+        self.supply_voltage = np.minimum(self.motor_voltage,
+                                         self.battery_voltage - self.battery_resistance * draw)
+
+        # Chassis dynamics
+        radius = self.wheel_radius[:, None]
+        side_v = wheel_speed * radius
+        net = (torque @ self.side_matrix) / radius - self.rolling_force[:, None] * np.tanh(side_v / 0.02) \
+            - self.viscous_drag[:, None] * side_v
+        accel = (net[:, LEFT] + net[:, RIGHT]) / self.mass
+        moment = (net[:, LEFT] - net[:, RIGHT]) * self.half_track - self.turn_scrub * np.tanh(self.w / 0.2)
+
+        self.v += accel * dt
+        self.w += moment / self.inertia * dt
+        # Slipping wheels turn further than the chassis moves
+        self.wheel_angle += self.wheel_speeds() * (dt / self.traction[:, None])
+        self.heading += self.w * dt
+        travel = self.v * (dt / IN_TO_M)
+        self.x += travel * np.sin(self.heading)
+        self.y += travel * np.cos(self.heading)
+        self.time_ms += self.dt_ms
+
+    def advance_to(self, t_ms):
+        while self.time_ms + self.dt_ms <= t_ms + 1e-9:
+            self.step()
+
+    # ------------------------------------------------------------------ #
+    #  Plant interface used by vex.Motor (robot 0 of the batch)          #
+    # ------------------------------------------------------------------ #
+
+    def command_velocity(self, index, rpm):
+        self.masks_stale = True
+        self.mode[:, index] = VELOCITY_MODE
+        self.command_speed[:, index] = rpm * RPM_TO_RAD_S
+
+    def command_position(self, index, target, rpm):
+        self.masks_stale = True
+        self.mode[:, index] = POSITION_MODE
+        self.command_speed[:, index] = rpm * RPM_TO_RAD_S
+        self.target_deg[:, index] = target
+
+    def command_stop(self, index, mode):
+        self.masks_stale = True
+        self.command_speed[:, index] = 0.0
+        if mode is vex.HOLD:
+            self.mode[:, index] = HOLD_MODE
+            self.target_deg[:, index] = self.motor_positions()[:, index]
+        elif mode is vex.BRAKE:
+            self.mode[:, index] = BRAKE_MODE
+        else:
+            self.mode[:, index] = COAST_MODE
+
+    def is_done(self, index):
+        if self.mode[0, index] != POSITION_MODE:
+            return True
+        return abs(self.target_deg[0, index] - self.motor_positions()[0, index]) < 1.0
+
+    def motor_position(self, index):
+        return float(self.motor_positions()[0, index])
+
+    def set_motor_position(self, index, value):
+        self.offset_deg[:, index] += value - self.motor_positions()[:, index]
+
+    def motor_velocity(self, index):
+        speed = self.wheel_speeds()[0, self.side[index]] * self.sign[index]
+        return float(speed / RPM_TO_RAD_S)
+
+    def motor_current(self, index):
+        return float(self.current[0, index])
+
+    def motor_torque(self, index):
+        return float(self.torque[0, index])
+
+
+def drive_motors(namespace):
+    """Finds the left_drive_* / right_drive_* motors a robot program declares."""
+    left = [namespace[k] for k in sorted(namespace) if k.startswith('left_drive')]
+    right = [namespace[k] for k in sorted(namespace) if k.startswith('right_drive')]
+    return left, right
+
+
+def attach(namespace, params=None, dt=DEFAULT_DT):
+    """
+    Puts the drive motors of a loaded program behind a DriveModel, points
+    any inertial sensors at its heading and steps it with the simulated
+    clock. Returns the model.
+    """
+    left, right = drive_motors(namespace)
+    motors = left + right
+    sides = [LEFT] * len(left) + [RIGHT] * len(right)
+    # A right-side motor has to be reversed for FORWARD to push the robot forward
+    signs = [(-1.0 if m.reversed else 1.0) * (1.0 if side == LEFT else -1.0)
+             for m, side in zip(motors, sides)]
+    model = DriveModel(sides, signs, [m.max_rpm for m in motors], params=params, dt=dt)
+    model.time_ms = vex.now()
+    for index, motor in enumerate(motors):
+        motor.attach_plant(model, index)
+    for obj in list(namespace.values()):
+        if isinstance(obj, vex.Inertial):
+            obj.attach_source(lambda: math.degrees(model.heading[0]))
+    vex.attach_model(model)
+    return model
+
+
+def measure_drive(namespace, model, distance_in, function='pid_drive', sample_ms=10, coast_ms=1000):
+    """
+    Runs the program's pid_drive(distance_in) (or another drive function
+    named by `function`) and watches the real chassis.
+    Returns a dict with the distance travelled, peak travel, overshoot and
+    the time the loop took to exit.
+    """
+    start = (model.x[0], model.y[0])
+    samples = []
+
+    def sample():
+        while True:
+            samples.append(math.hypot(model.x[0] - start[0], model.y[0] - start[1]))
+            vex.sleep(sample_ms)
+
+    def drive():
+        vex.Thread(sample)
+        namespace[function](distance_in)
+
+    exit_ms = vex.run_task(drive, 30000)
+    travel_at_exit = samples[-1] if samples else 0.0
+    vex.run_for(coast_ms)
+    travel = math.hypot(model.x[0] - start[0], model.y[0] - start[1])
+    peak = max(samples + [travel])
+    return {
+        'commanded_in': distance_in,
+        'travel_at_exit_in': travel_at_exit,
+        'final_travel_in': travel,
+        'peak_travel_in': peak,
+        'overshoot_in': max(peak - abs(distance_in), 0.0),
+        'exit_ms': exit_ms,
+    }
+
+
+def main():
+    import runner
+
+    parser = argparse.ArgumentParser(description="Step-test a program's pid_drive against the physics model")
+    parser.add_argument('program', help="path to the robot program")
+    parser.add_argument('distances', type=float, nargs='+', help="distances to drive, inches")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH))
+    parser.add_argument('--function', default='pid_drive',
+                        help="drive function to test, e.g. motion_profile_pid_drive")
+    args = parser.parse_args()
+
+    print(f"{'cmd in':>7} {'travel':>8} {'peak':>8} {'overshoot':>10} {'exit ms':>8}")
+    for distance in args.distances:
+        namespace = runner.load_program(args.program, args.auton)
+        model = attach(namespace)
+        r = measure_drive(namespace, model, distance, args.function)
+        print(f"{r['commanded_in']:7.1f} {r['final_travel_in']:8.2f} {r['peak_travel_in']:8.2f} "
+              f"{r['overshoot_in']:10.2f} {r['exit_ms']:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Grid-search benchmark for pid_drive gains: every (KP, KI, KD, distance)
+combination is a robot in one batched physics model, and the pid_drive loop
+is stepped for all of them at once as NumPy arrays. The loop's exit rules
+(settle window, speed limit, timeout) are read from the program, so the
+grid scores gains for the loop the program really runs.
+
+    python pid_grid.py ../main.py
+    python pid_grid.py ../main.py --auton red_left --kp 0.1 2 20 --ki 0 0.05 5 --kd 0 0.5 20 --distances 6 24 48
+    python pid_grid.py ../main.py --auton red_left --workers 4 --save grid.npz --plot grid.png
+
+For each candidate it reports the time pid_drive takes to exit (settle
+time), how far the robot overshoots the target, how far from the target it
+ends up once it has coasted to a stop (steady-state error) and the
+integrated absolute error over the whole run. The heatmaps show those over
+KP and KD at the KI that settles fastest, averaged over the distances,
+and are only drawn with --plot.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+from monte_carlo import DRIVE_PERIOD_MS, DRIVE_OUTPUT_CAP, INTEGRAL_LIMIT, drive_loop
+
+DURATION_MS = 4000  # a loop still running after this counts as never settling
+COAST_MS = 500  # time after the loop exits for the robot to come to rest
+CHUNK = 16384  # robots per model; smaller batches stay in cache
+METRICS = ('settle_ms', 'overshoot_in', 'steady_state_in', 'iae_in_s')
+
+
+def step_batch(kp, ki, kd, target_deg, inches_per_degree, layout, max_rpm, loop):
+    """
+    Runs pid_drive once for every entry of the equal-length arrays kp, ki,
+    kd and target_deg (the encoder target pid_drive computes), exiting by
+    the rules in loop (see monte_carlo.drive_loop). Returns a dict of
+    METRICS arrays; settle_ms is NaN for loops that never settle.
+    """
+    n = len(kp)
+    sides = [side for side, _ in layout]
+    signs = [sign for _, sign in layout]
+    model = physics.DriveModel(sides, signs, max_rpm, n_robots=n)
+    left_index = sides.index(physics.LEFT)
+    right_index = sides.index(physics.RIGHT)
+
+    target_in = target_deg * inches_per_degree
+    direction = np.sign(target_in)
+    goal = np.abs(target_in)
+    error_sum = np.zeros(n)
+    last_error = np.zeros(n)
+    last_position = np.zeros(n)
+    since = np.full(n, np.nan)
+    stop_ms = min(DURATION_MS, loop['timeout_ms'])
+    running = np.ones(n, dtype=bool)
+    settle_ms = np.full(n, np.nan)
+    peak = np.zeros(n)
+    iae = np.zeros(n)
+    last_exit = 0.0
+
+    ticks_per_period = int(round(DRIVE_PERIOD_MS / model.dt_ms))
+    for step in range(int(round((DURATION_MS + COAST_MS) / model.dt_ms))):
+        now = step * model.dt_ms
+        if step % ticks_per_period == 0 and running.any():
+            # Same arithmetic as pid_drive, one candidate per array entry
+            positions = model.motor_positions()
+            velocities = model.motor_velocities()
+            position = (positions[:, left_index] + positions[:, right_index]) / 2
+            speed = (velocities[:, left_index] + velocities[:, right_index]) / 2
+            error = target_deg - position
+            inside = (np.abs(error) < loop['tolerance']) & (np.abs(speed) < loop['settle_dps'])
+            since = np.where(inside, np.where(np.isnan(since), now, since), np.nan)
+            done = running & inside & (now - since >= loop['settle_ms'])
+            settle_ms[done] = now
+            if now >= stop_ms:
+                done = running
+            if done.any():
+                running &= ~done
+                model.mode[done] = physics.BRAKE_MODE
+                model.command_speed[done] = 0.0
+                last_exit = now
+            if loop['reset_on_crossing']:
+                error_sum = np.where(error * error_sum < 0, 0.0, error_sum)
+            error_sum = np.clip(error_sum + error, -INTEGRAL_LIMIT, INTEGRAL_LIMIT)
+            if loop['on_measurement']:
+                change = -(position - last_position) if step else np.zeros(n)
+            else:
+                change = error - last_error
+            output = np.clip(kp * error + ki * error_sum + kd * change, -DRIVE_OUTPUT_CAP, DRIVE_OUTPUT_CAP)
+            last_error = error
+            last_position = position
+            model.mode[running] = physics.VELOCITY_MODE
+            model.command_speed[running] = output[running, None] / 100.0 * model.free_speed
+            model.masks_stale = True
+        elif not running.any() and now >= last_exit + COAST_MS:
+            break
+        model.step()
+        along = model.y * direction
+        np.maximum(peak, along, out=peak)
+        iae += np.abs(goal - along) * (model.dt_ms / 1000.0)
+
+    return {
+        'settle_ms': settle_ms,
+        'overshoot_in': np.maximum(peak - goal, 0.0),
+        'steady_state_in': np.abs(model.y * direction - goal),
+        'iae_in_s': iae,
+    }
+
+
+def _step_chunk(args):
+    return step_batch(*args)
+
+
+def run_grid(kp, ki, kd, target_deg, inches_per_degree, layout, max_rpm, loop, workers=1, chunk=CHUNK):
+    """
+    Benchmarks every combination of the kp, ki, kd and target_deg vectors.
+    Returns a dict of METRICS arrays shaped (len(kp), len(ki), len(kd),
+    len(target_deg)).
+    """
+    grid = np.meshgrid(kp, ki, kd, target_deg, indexing='ij')
+    shape = grid[0].shape
+    flat = [g.ravel() for g in grid]
+    jobs = [tuple(f[i:i + chunk] for f in flat) + (inches_per_degree, layout, max_rpm, loop)
+            for i in range(0, len(flat[0]), chunk)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_step_chunk, jobs))
+    else:
+        parts = [_step_chunk(job) for job in jobs]
+    return dict((name, np.concatenate([p[name] for p in parts]).reshape(shape)) for name in METRICS)
+
+
+def best_ki_index(results):
+    """KI slice with the fastest mean settle time, counting loops that never settle as DURATION_MS"""
+    settle = np.where(np.isnan(results['settle_ms']), DURATION_MS, results['settle_ms'])
+    return int(np.argmin(settle.mean(axis=(0, 2, 3))))
+
+
+def plot(results, kp, ki, kd, path, ki_index):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(11, 9))
+    titles = {
+        'settle_ms': 'settle time (ms)',
+        'overshoot_in': 'overshoot (in)',
+        'steady_state_in': 'steady-state error (in)',
+        'iae_in_s': 'IAE (in*s)',
+    }
+    for ax, name in zip(axes.ravel(), METRICS):
+        values = results[name][:, ki_index]
+        if name == 'settle_ms':
+            values = np.where(np.isnan(values), DURATION_MS, values)
+        image = ax.imshow(values.mean(axis=-1).T, origin='lower', aspect='auto',
+                          extent=(kp[0], kp[-1], kd[0], kd[-1]), cmap='viridis')
+        fig.colorbar(image, ax=ax)
+        ax.set_title(titles[name])
+        ax.set_xlabel('KP')
+        ax.set_ylabel('KD')
+    fig.suptitle(f"pid_drive at KI = {ki[ki_index]:.4g}, mean over distances")
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+
+
+def main():
+    import runner
+
+    parser = argparse.ArgumentParser(description="Benchmark a grid of pid_drive gains on the batched physics model")
+    parser.add_argument('program', help="path to the robot program")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--kp', type=float, nargs=3, default=(0.05, 3.0, 50), metavar=('MIN', 'MAX', 'N'))
+    parser.add_argument('--ki', type=float, nargs=3, default=(0.0, 0.1, 50), metavar=('MIN', 'MAX', 'N'))
+    parser.add_argument('--kd', type=float, nargs=3, default=(0.0, 1.0, 50), metavar=('MIN', 'MAX', 'N'))
+    parser.add_argument('--distances', type=float, nargs='+', default=(24,), help="inches")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--plot', help="heatmap image to write")
+    parser.add_argument('--save', help="write every metric to this .npz")
+    parser.add_argument('--top', type=int, default=10, help="fastest settling candidates to list")
+    args = parser.parse_args()
+
+    namespace = runner.load_program(args.program, args.auton)
+    left, right = physics.drive_motors(namespace)
+    motors = left + right
+    layout = [(physics.LEFT if m in left else physics.RIGHT,
+               (-1.0 if m.reversed else 1.0) * (1.0 if m in left else -1.0)) for m in motors]
+    max_rpm = [m.max_rpm for m in motors]
+    kp, ki, kd = (np.linspace(a, b, int(count)) for a, b, count in (args.kp, args.ki, args.kd))
+    target_deg = np.array([namespace['inches_to_degrees'](d) for d in args.distances])
+    inches_per_degree = physics.ChassisParams().wheel_diameter_in * np.pi / 360
+
+    count = len(kp) * len(ki) * len(kd) * len(target_deg)
+    start = time.perf_counter()
+    results = run_grid(kp, ki, kd, target_deg, inches_per_degree, layout, max_rpm, drive_loop(namespace),
+                       args.workers)
+    wall = time.perf_counter() - start
+    print(f"{count} runs ({len(kp)} KP x {len(ki)} KI x {len(kd)} KD x {len(target_deg)} distances) "
+          f"in {wall:.1f} s ({args.workers} worker(s))")
+
+    settle = results['settle_ms']
+    print(f"settled within {DURATION_MS} ms: {np.mean(~np.isnan(settle)) * 100:.1f}%")
+    # Rank gains by their worst distance so one good distance can't hide a
+    # bad one, ties (settle time moves in 20 ms loop ticks) go to the lower total IAE
+    worst = np.where(np.isnan(settle), np.inf, settle).max(axis=-1)
+    order = np.lexsort((results['iae_in_s'].sum(axis=-1).ravel(), worst.ravel()))[:args.top]
+    print(f"{'KP':>7} {'KI':>8} {'KD':>7} {'settle':>8} {'overshoot':>10} {'ss err':>8} {'IAE sum':>8}")
+    for flat in order:
+        i, j, k = np.unravel_index(flat, worst.shape)
+        if not np.isfinite(worst[i, j, k]):
+            break
+        print(f"{kp[i]:7.3f} {ki[j]:8.4f} {kd[k]:7.3f} {worst[i, j, k]:8.0f} "
+              f"{results['overshoot_in'][i, j, k].max():10.2f} {results['steady_state_in'][i, j, k].max():8.2f} "
+              f"{results['iae_in_s'][i, j, k].sum():8.2f}")
+
+    if args.save:
+        np.savez(args.save, kp=kp, ki=ki, kd=kd, distances=np.array(args.distances), **results)
+    if args.plot:
+        plot(results, kp, ki, kd, args.plot, best_ki_index(results))
+        print(f"heatmaps written to {args.plot}")
+
+
+if __name__ == "__main__":
+    main()
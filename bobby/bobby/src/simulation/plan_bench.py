@@ -0,0 +1,171 @@
+"""
+Times planner.py's theta* on the field at a few grid sizes.
+
+    python plan_bench.py
+    python plan_bench.py --cells 3 4 --pairs 500
+    python plan_bench.py --png plans.png
+
+For every cell size the report shows how long building the FieldGrid
+takes, then plans between random pairs of free field points four ways:
+
+    cold      nothing kept: the goal's cost-to-goal field is worked out first
+    warm      the goal's cost-to-goal field kept from an earlier plan
+    cached    the same start and goal cells planned before
+    euclid    straight-line distance as the heuristic, precomputed per goal
+
+with the median and 99th percentile milliseconds, the cells each search
+expanded, and how much longer the grid heuristic's paths come out than
+euclid's. The grid heuristic overestimates once theta* cuts corners, so it
+trades a little length for expanding far fewer cells. The 13.1 inch cells
+are the 11 by 11 grid in primary/src/pidtest.py.
+
+--png draws the blocked and too-close cells and the first plans on the
+field.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from array import array
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(SIM_DIR)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from planner import FieldGrid, Planner
+
+CELLS = [2, 3, 4, 6, 144 / 11]
+PAIRS = 200
+DRAWN = 8  # plans drawn with --png
+
+
+class EuclideanPlanner(Planner):
+    """Planner with straight-line distance to the goal as its heuristic"""
+
+    def cost_to_goal(self, goal):
+        field = self.heuristics.get(goal)
+        if field is None:
+            grid = self.grid
+            gx, gy = grid.center(goal)
+            field = array('f', [math.hypot(x - gx, y - gy)
+                                for x, y in (grid.center(i) for i in range(grid.n * grid.n))])
+            self.heuristics[goal] = field
+        return field
+
+
+def length(points):
+    return sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(points, points[1:]))
+
+
+def free_pairs(grid, count, seed):
+    """count random (start, goal) field points the robot fits at, at least a foot apart"""
+    rng = np.random.default_rng(seed)
+    pairs = []
+    while len(pairs) < count:
+        a, b = rng.uniform(0, grid.field, (2, 2)).tolist()
+        if (grid.free[grid.cell_at(*a)] and grid.free[grid.cell_at(*b)]
+                and math.hypot(b[0] - a[0], b[1] - a[1]) >= 12):
+            pairs.append((tuple(a), tuple(b)))
+    return pairs
+
+
+def timed(plan, start, goal):
+    begin = time.perf_counter()
+    points = plan(start, goal)
+    return (time.perf_counter() - begin) * 1000, points
+
+
+def bench(cell, pairs, seed):
+    """one report row and the grid and plans for drawing"""
+    begin = time.perf_counter()
+    grid = FieldGrid(cell)
+    build_ms = (time.perf_counter() - begin) * 1000
+
+    cold, warm, cached, euclid = [], [], [], []
+    expanded, euclid_expanded, longer = [], [], []
+    plans = []
+    for start, goal in free_pairs(grid, pairs, seed):
+        planner = Planner(grid)
+        ms, points = timed(planner.plan, start, goal)
+        if points is None:
+            continue
+        cold.append(ms)
+        expanded.append(planner.expanded)
+        plans.append(points)
+        cached.append(timed(planner.plan, start, goal)[0])
+        planner.plans.clear()
+        warm.append(timed(planner.plan, start, goal)[0])
+
+        straight = EuclideanPlanner(grid)
+        straight.cost_to_goal(grid.nearest_free(grid.cell_at(*goal)))  # precomputed, as the name says
+        ms, other = timed(straight.plan, start, goal)
+        euclid.append(ms)
+        euclid_expanded.append(straight.expanded)
+        longer.append(length(points) / length(other) - 1)
+    row = (grid.n, build_ms, cold, warm, cached, euclid, expanded, euclid_expanded, longer)
+    return row, grid, plans
+
+
+def render(grid, plans, png=None):
+    """Draws the cells the robot can't use and some plans on the visualizer's field"""
+    sys.path.insert(0, os.path.join(SRC_DIR, 'visualization'))
+    if png:
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from auton_visualizer import AutonVisualizer
+
+    viz = AutonVisualizer()
+    viz.hide_controls()
+    for artist in (viz.robot_patch, viz.direction_indicator, viz.status_text):
+        artist.set_visible(False)
+    cells = np.array([grid.center(i) for i in range(grid.n * grid.n)])
+    blocked = np.frombuffer(grid.blocked, dtype=np.uint8).astype(bool)
+    free = np.frombuffer(grid.free, dtype=np.uint8).astype(bool)
+    viz.ax.scatter(*cells[~free & ~blocked].T, s=3, color='orange', alpha=0.5, zorder=3)
+    viz.ax.scatter(*cells[blocked].T, s=3, color='red', zorder=3)
+    for points in plans[:DRAWN]:
+        xs, ys = zip(*points)
+        viz.ax.plot(xs, ys, '-o', markersize=2, linewidth=1, zorder=4)
+    if png:
+        viz.fig.savefig(png, dpi=150)
+        print(f"wrote {png}")
+    else:
+        plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time theta* field plans at a few grid sizes")
+    parser.add_argument('--cells', type=float, nargs='+', default=CELLS, help="cell sizes, inches")
+    parser.add_argument('--pairs', type=int, default=PAIRS, help="start and goal pairs per cell size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--png', help="draw the first cell size's grid and plans to this file")
+    parser.add_argument('--show', action='store_true', help="draw them in a window")
+    args = parser.parse_args()
+
+    def ms(values):
+        return f"{np.percentile(values, 50):6.2f} {np.percentile(values, 99):6.2f}"
+
+    print("plan ms as p50 p99; expanded is the mean cells a search expanded")
+    print(f"{'cell':>5} {'grid':>5} {'build':>6} | {'cold':>13} | {'warm':>13} | {'cached':>13} | "
+          f"{'euclid':>13} | {'expanded':>8} {'euclid':>6} {'longer':>6}")
+    drawn = None
+    for cell in args.cells:
+        row, grid, plans = bench(cell, args.pairs, args.seed)
+        n, build_ms, cold, warm, cached, euclid, expanded, euclid_expanded, longer = row
+        if drawn is None:
+            drawn = grid, plans
+        print(f"{cell:5.1f} {n:>2}x{n:<2} {build_ms:6.1f} | {ms(cold)} | {ms(warm)} | {ms(cached)} | "
+              f"{ms(euclid)} | {np.mean(expanded):8.0f} {np.mean(euclid_expanded):6.0f} "
+              f"{np.mean(longer):6.1%}")
+    if args.png or args.show:
+        render(*drawn, args.png)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Loads a robot program against the simulated `vex` module and runs its
+competition phases on the virtual clock.
+
+    python runner.py ../motion.py
+    python runner.py ../main.py --auton red_left --runs 1000
+
+By default the drive motors sit behind the physics model in physics.py;
+--ideal swaps it for motors that reach their commanded speed instantly.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import vex
+
+AUTON_PERIOD_MS = 15000
+DRIVER_PERIOD_MS = 105000
+
+# Touch points for the buttons drawn by select_autonomous() in main.py
+AUTON_TOUCH = {
+    'red_left': (100, 60),
+    'red_right': (350, 60),
+    'blue_left': (100, 200),
+    'blue_right': (350, 200),
+}
+
+
+def load_program(path, auton=None, time_limit_ms=vex.DEFAULT_TIME_LIMIT_MS):
+    """
+    Executes a robot program from scratch on a fresh simulated brain and
+    returns its module namespace. `auton` picks the touchscreen button for
+    programs that ask for one at startup.
+    """
+    path = os.path.abspath(path)
+    program_dir = os.path.dirname(path)
+    if program_dir not in sys.path:
+        sys.path.insert(1, program_dir)
+
+    # Modules the program imports from its own directory (drivetrain,
+    # telemetry, ...) start fresh on every load, as they would after a reboot
+    for name, module in list(sys.modules.items()):
+        if os.path.dirname(os.path.abspath(getattr(module, '__file__', None) or os.sep)) == program_dir:
+            del sys.modules[name]
+
+    vex.reset(time_limit_ms)
+    if auton is not None:
+        vex.set_touch(*AUTON_TOUCH[auton])
+    with open(path) as f:
+        code = compile(f.read(), path, 'exec')
+    # Keep the live globals (runpy hands back a copy) so callers can swap
+    # out functions the program's routines look up at call time
+    namespace = {'__name__': '__sim__', '__file__': path}
+    exec(code, namespace)
+    vex.set_touch()
+    return namespace
+
+
+def run_autonomous(duration_ms=AUTON_PERIOD_MS):
+    """
+    Runs the loaded program's autonomous callback for at most duration_ms of
+    simulated time. Returns the simulated time it took to finish.
+    """
+    competition = vex.competition()
+    if competition is None:
+        raise RuntimeError("program never created a Competition")
+    competition.mode = 'autonomous'
+    try:
+        return vex.run_task(competition.autonomous, duration_ms)
+    finally:
+        competition.mode = None
+
+
+def run_driver(duration_ms=DRIVER_PERIOD_MS):
+    """Runs the loaded program's driver control callback for duration_ms."""
+    competition = vex.competition()
+    if competition is None:
+        raise RuntimeError("program never created a Competition")
+    competition.mode = 'driver'
+    try:
+        return vex.run_task(competition.driver_control, duration_ms)
+    finally:
+        competition.mode = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a robot program's autonomous in simulation")
+    parser.add_argument('program', help="path to the robot program, e.g. ../motion.py")
+    parser.add_argument('--auton', choices=sorted(AUTON_TOUCH), help="touchscreen selection to make at startup")
+    parser.add_argument('--runs', type=int, default=1, help="number of back-to-back runs to time")
+    parser.add_argument('--ideal', action='store_true', help="skip the physics model")
+    args = parser.parse_args()
+
+    if not args.ideal:
+        import physics
+
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        namespace = load_program(args.program, args.auton)
+        if not args.ideal:
+            physics.attach(namespace)
+        sim_ms = run_autonomous()
+    wall_ms = (time.perf_counter() - start) * 1000.0
+
+    print(f"autonomous finished after {sim_ms:.0f} ms of simulated time")
+    print(f"{args.runs} run(s) in {wall_ms:.1f} ms of wall time "
+          f"({wall_ms / args.runs:.2f} ms per run)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Tunes a program's drive PID gains against the physics model and collects them
+into a GainSchedule table over distance (see gain_schedule.py).
+
+    python tune_pid.py ../main.py --auton red_left
+    python tune_pid.py ../motion.py --function motion_profile_pid_drive --workers 4
+
+Every distance in --distances is step-tested with candidate (KP, KI, KD)
+triples, and each candidate is scored on how long the loop takes to exit
+plus penalties for overshoot and for where the robot ends up. A single
+Nelder-Mead run stops in whichever local minimum is nearest its start, so
+each distance first scores a coarse grid of gains (COARSE_GRID) and runs
+Nelder-Mead from the program's current gains and from the best --starts - 1
+grid points; the best of those optima is the row. The distances are tuned
+in parallel across the worker processes.
+
+The tuned rows are printed as a PID_GAINS table to paste into the program,
+which interpolates between them. Interpolating between two rows that sit
+in different minima gives gains neither was tuned for, so where
+neighbouring rows' best optima are far apart, another optimum a row found
+that scores within NEAR_BEST of its best and sits next to its neighbour's
+is used instead. If rows still disagree the table is rejected: no table is
+printed and the exit status is nonzero. Otherwise the table is checked
+halfway between its rows, where no gains were tuned, against the
+program's current gains.
+
+Smoothing the rows with a polynomial over distance was tried and scored
+worse between rows than interpolating the raw optima, so the rows are used
+as tuned.
+
+A gain that ends at its MAX_GAINS clip is marked with *: the search wanted
+to go further than the model can be trusted, so that row says more about
+the model than the robot. Try gains like that on the field before using
+them.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+import runner
+from optimize_routine import nelder_mead
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from gain_schedule import GainSchedule
+
+DEFAULT_DISTANCES = (3, 6, 12, 18, 24, 36, 48)
+OVERSHOOT_MS_PER_IN = 400  # cost of an inch past the target, in ms of settle time
+ERROR_MS_PER_IN = 400  # cost of ending an inch from the target once coasting stops
+GAIN_STEPS = (0.1, 0.004, 0.05)  # initial simplex steps for KP, KI, KD
+# The model has no encoder noise, backlash or sensor lag, so it would happily
+# take gains that shake a real robot apart; candidates are clipped to these
+MAX_GAINS = (3.0, 0.1, 1.0)
+# Gains every distance is scored at before Nelder-Mead, KP x KI x KD
+COARSE_GRID = ((0.2, 0.6, 1.5, 3.0), (0.0, 0.02, 0.1), (0.0, 0.3, 1.0))
+STARTS = 3  # Nelder-Mead runs per distance, from the current gains and the best grid points
+SAME_OPTIMUM = 0.15  # gains this fraction of MAX_GAINS apart or closer count as one optimum
+NEAR_BEST = 1.05  # an optimum scoring within this factor of a row's best may stand in for it
+
+
+def step_response(program, auton, function, distance, gains):
+    """
+    Drives distance with the program's drive function and fixed gains.
+    Returns (exit ms, overshoot in, final error in), measured against the
+    travel the loop is really aiming for (after inches_to_degrees'
+    correction factor).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runner.load_program(program, auton)
+        model = physics.attach(namespace)
+        namespace['get_scaled_pid_constants'] = lambda _: tuple(gains)
+        r = physics.measure_drive(namespace, model, distance, function)
+    target = abs(namespace['inches_to_degrees'](distance) / 360 * namespace['WHEEL_CIRCUMFERENCE_INCHES'])
+    return r['exit_ms'], max(r['peak_travel_in'] - target, 0.0), abs(r['final_travel_in'] - target)
+
+
+def score(response):
+    exit_ms, overshoot, error = response
+    return exit_ms + OVERSHOOT_MS_PER_IN * overshoot + ERROR_MS_PER_IN * error
+
+
+def tune_distance(args):
+    """
+    Worker: Nelder-Mead over (KP, KI, KD) for one distance from the
+    current gains and the best coarse grid points. Returns the optima as
+    (gains, score) best first, and the current gains' score.
+    """
+    program, auton, function, distance, current, iterations, starts = args
+
+    def evaluate_batch(points):
+        return [score(step_response(program, auton, function, distance, np.clip(p, 0, MAX_GAINS))) for p in points]
+
+    grid = [np.array(p, dtype=float) for p in itertools.product(*COARSE_GRID)]
+    grid_scores = evaluate_batch(grid)
+    seeds = [current] + [grid[i] for i in np.argsort(grid_scores)[:starts - 1]]
+    optima = []
+    for seed in seeds:
+        best, best_score = nelder_mead(evaluate_batch, seed, GAIN_STEPS, iterations)
+        optima.append((np.clip(best, 0, MAX_GAINS), best_score))
+    optima.sort(key=lambda optimum: optimum[1])
+    return optima, evaluate_batch([current])[0]
+
+
+def apart(a, b):
+    """Whether two gain triples are too far apart to be the same optimum"""
+    return bool((np.abs(a - b) / np.array(MAX_GAINS) > SAME_OPTIMUM).any())
+
+
+def choose_rows(results):
+    """
+    One (gains, score) per distance: the best optimum, or when that is
+    apart from the previous row's, the nearest one to it that scores
+    within NEAR_BEST of the best.
+    """
+    rows = []
+    for optima, _ in results:
+        best = optima[0]
+        if rows and apart(best[0], rows[-1][0]):
+            near = [o for o in optima if o[1] <= best[1] * NEAR_BEST]
+            best = min(near, key=lambda o: np.abs((o[0] - rows[-1][0]) / np.array(MAX_GAINS)).max())
+        rows.append(best)
+    return rows
+
+
+def format_table(distances, gains):
+    """A PID_GAINS GainSchedule for pasting into a program"""
+    def row(values, fmt):
+        return '(' + ', '.join(fmt % v for v in values) + ')'
+    return ("PID_GAINS = GainSchedule(\n"
+            f"    {row(distances, '%g')},  # inches\n"
+            f"    {row(gains[:, 0], '%.3f')},  # KP\n"
+            f"    {row(gains[:, 1], '%.4f')},  # KI\n"
+            f"    {row(gains[:, 2], '%.3f')})  # KD")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a distance-scheduled PID gain table against the physics model")
+    parser.add_argument('program', help="path to the robot program")
+    parser.add_argument('--auton', choices=sorted(runner.AUTON_TOUCH), default='red_left',
+                        help="touchscreen selection the program waits for")
+    parser.add_argument('--function', default='pid_drive', help="drive function to tune, e.g. motion_profile_pid_drive")
+    parser.add_argument('--distances', type=float, nargs='+', default=DEFAULT_DISTANCES, help="inches")
+    parser.add_argument('--iterations', type=int, default=40, help="iterations per Nelder-Mead run")
+    parser.add_argument('--starts', type=int, default=STARTS, help="Nelder-Mead runs per distance")
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    program = os.path.abspath(args.program)
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runner.load_program(program, args.auton)
+    current = namespace['get_scaled_pid_constants']
+    jobs = [(program, args.auton, args.function, d, np.array(current(d), dtype=float), args.iterations,
+             args.starts) for d in args.distances]
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as pool:
+            results = list(pool.map(tune_distance, jobs))
+    else:
+        results = [tune_distance(job) for job in jobs]
+    rows = choose_rows(results)
+    tuned = np.array([gains for gains, _ in rows])
+    wall = time.perf_counter() - start
+
+    print(f"tuned {len(args.distances)} distances in {wall:.1f} s ({args.workers} worker(s))")
+    print(f"{'inches':>7} {'old score':>10} {'tuned':>8}   KP / KI / KD")
+    pinned = tuned >= np.array(MAX_GAINS) * 0.99
+    for d, (g, tuned_score), (_, old_score), clipped in zip(args.distances, rows, results, pinned):
+        print(f"{d:7g} {old_score:10.0f} {tuned_score:8.0f}   {g[0]:.3f} / {g[1]:.4f} / {g[2]:.3f}"
+              + ("  *" if clipped.any() else ""))
+
+    split = [(a, b) for a, b, ga, gb in zip(args.distances, args.distances[1:], tuned, tuned[1:]) if apart(ga, gb)]
+    if split:
+        sys.exit("rejected: the rows at " + ", ".join(f"{a:g} and {b:g}" for a, b in split)
+                 + " in come from different optima; tune distances between them or raise --starts")
+
+    schedule = GainSchedule(tuple(args.distances), *[tuple(tuned[:, k]) for k in range(3)])
+    print("between the rows:")
+    for a, b in zip(args.distances, args.distances[1:]):
+        d = (a + b) / 2
+        old_score = score(step_response(program, args.auton, args.function, d, current(d)))
+        new_score = score(step_response(program, args.auton, args.function, d, schedule.lookup(d)))
+        print(f"{d:7g} {old_score:10.0f} {new_score:8.0f}")
+    print(format_table(args.distances, tuned))
+    if pinned.any():
+        print(f"* {pinned.any(axis=1).sum()} row(s) ended at the MAX_GAINS clip {MAX_GAINS}")
+
+
+if __name__ == "__main__":
+    main()
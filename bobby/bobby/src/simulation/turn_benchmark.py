@@ -0,0 +1,153 @@
+"""
+Benchmarks closed-loop turn_to_angle against the timed rotate_left/rotate_right
+turns on the physics model.
+
+    python turn_benchmark.py ../actualskills.py
+    python turn_benchmark.py ../redleftMOREbob.py --inertial --battery 11.6
+    python turn_benchmark.py --copies
+
+Timed turns are given the duration a driver would pick by scaling the
+program's default 90 degree turn linearly. For each target the report shows
+how long the robot took to come to rest and how far off the heading was.
+
+The standalone programs are uploaded as single files, so each carries its
+own copy of turn_to_angle; --copies checks that they still match.
+"""
+
+import argparse
+import ast
+import math
+import os
+import sys
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
+
+import physics
+import runner
+import vex
+
+SRC_DIR = os.path.dirname(SIM_DIR)
+# programs that each carry a copy of get_heading, turn_to_angle and the TURN_* constants
+TURN_COPIES = [os.path.join(SRC_DIR, name) for name in ('skills.py', 'actualskills.py', 'redleftMOREbob.py')]
+
+TARGETS = (15, 30, 45, 60, 90, 120, 135, 180)
+TIMED_90_MS = 450
+SETTLE_TOLERANCE_DEG = 2.0
+SAMPLE_MS = 5
+
+
+def _run_turn(program, turn, inertial, battery):
+    namespace = runner.load_program(program)
+    if inertial:
+        namespace['inertial'] = vex.Inertial(vex.Ports.PORT10)
+    model = physics.attach(namespace, physics.ChassisParams(battery_voltage=battery))
+    samples = []
+
+    def sample():
+        while True:
+            samples.append((vex.now(), math.degrees(model.heading[0])))
+            vex.sleep(SAMPLE_MS)
+
+    def go():
+        vex.Thread(sample)
+        turn(namespace)
+
+    vex.run_task(go, 5000)
+    vex.run_for(500)
+    return samples
+
+
+def settle_stats(samples, target):
+    """
+    Returns the time from which the heading stayed within tolerance of where
+    it finally came to rest, and how far that rest heading is from target.
+    """
+    final = samples[-1][1]
+    settle = samples[-1][0]
+    for t, heading in reversed(samples):
+        if abs(heading - final) > SETTLE_TOLERANCE_DEG:
+            break
+        settle = t
+    return settle, final - target
+
+
+def timed_turn(namespace, duration_ms, speed=50):
+    """The rotate_right recipe: spin the sides apart for a fixed time, then brake."""
+    left, right = physics.drive_motors(namespace)
+    for motor in left:
+        motor.spin(vex.REVERSE, speed, vex.PERCENT)
+    for motor in right:
+        motor.spin(vex.FORWARD, speed, vex.PERCENT)
+    vex.sleep(duration_ms)
+    for motor in left + right:
+        motor.stop(vex.BRAKE)
+
+
+def benchmark(program, targets=TARGETS, inertial=False, battery=12.4):
+    """Returns (target, closed settle ms, closed error, timed settle ms, timed error) rows."""
+    rows = []
+    for target in targets:
+        # rotate_right spins the left side in REVERSE, i.e. counter-clockwise
+        closed = _run_turn(program, lambda ns: ns['turn_to_angle'](-target), inertial, battery)
+        duration = round(TIMED_90_MS * target / 90.0)
+        timed = _run_turn(program, lambda ns: timed_turn(ns, duration), inertial, battery)
+        rows.append((target,) + settle_stats(closed, -target) + settle_stats(timed, -target))
+    return rows
+
+
+def turn_code(program):
+    """The source of a program's turn functions and TURN_* constants, comments aside"""
+    with open(program) as f:
+        tree = ast.parse(f.read())
+    parts = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in ('get_heading', 'turn_to_angle'):
+            parts.append(ast.dump(node))
+        elif isinstance(node, ast.Assign) and any(
+                isinstance(t, ast.Name) and (t.id.startswith('TURN_') or t.id == 'TRACK_WIDTH_INCHES')
+                for t in node.targets):
+            parts.append(ast.dump(node))
+    return parts
+
+
+def differing_copies(programs=TURN_COPIES):
+    """The programs whose turn code differs from the first one's"""
+    first = turn_code(programs[0])
+    return [program for program in programs[1:] if turn_code(program) != first]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare closed-loop and timed turns in simulation")
+    parser.add_argument('program', nargs='?', help="robot program that defines turn_to_angle")
+    parser.add_argument('--inertial', action='store_true', help="close the loop on an inertial sensor")
+    parser.add_argument('--battery', type=float, default=12.4, help="battery voltage")
+    parser.add_argument('--copies', action='store_true',
+                        help="only check the standalone programs' turn code still matches")
+    args = parser.parse_args()
+
+    if args.copies:
+        differing = differing_copies()
+        names = ", ".join(os.path.basename(p) for p in differing)
+        if differing:
+            sys.exit(f"turn code differs from {os.path.basename(TURN_COPIES[0])} in {names}")
+        print(f"turn code matches in all {len(TURN_COPIES)} programs")
+        return
+    if args.program is None:
+        parser.error("a program is needed unless --copies is given")
+
+    rows = benchmark(args.program, inertial=args.inertial, battery=args.battery)
+    print(f"{'target':>6} | {'closed-loop':^20} | {'timed':^20}")
+    print(f"{'deg':>6} | {'settle ms':>9} {'error':>9}  | {'settle ms':>9} {'error':>9}")
+    for target, c_ms, c_err, t_ms, t_err in rows:
+        print(f"{target:6d} | {c_ms:9.0f} {c_err:+9.2f}  | {t_ms:9.0f} {t_err:+9.2f}")
+    closed = [abs(r[2]) for r in rows]
+    timed = [abs(r[4]) for r in rows]
+    print(f"mean |error|: closed-loop {sum(closed) / len(rows):.2f} deg, timed {sum(timed) / len(rows):.2f} deg")
+    print(f"mean settle: closed-loop {sum(r[1] for r in rows) / len(rows):.0f} ms, "
+          f"timed {sum(r[3] for r in rows) / len(rows):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
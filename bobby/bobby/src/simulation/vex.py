@@ -0,0 +1,870 @@
+"""
+Headless stand-in for the VEX V5 `vex` module.
+
+Robot programs do `from vex import *` and block in `sleep()` loops. With this
+file on sys.path in place of the real module, every `sleep()` advances a
+virtual clock instead of blocking, so a full 15 s autonomous replays in a few
+milliseconds of wall time.
+
+Threads are cooperative: only one robot task runs at a time and control only
+changes hands inside `sleep()`/`wait()`, the same points where the brain's
+scheduler switches tasks. The task with the earliest wake-up time always runs
+next, so a run is fully deterministic.
+
+Anything not in __all__ (reset, run_for, run_task, set_touch, ...) is a
+simulator control and does not exist on the real brain.
+"""
+
+import heapq
+import os
+import threading
+from collections import deque
+
+__all__ = [
+    'Brain', 'Controller', 'Motor', 'Inertial', 'Distance', 'Pneumatics', 'DigitalOut', 'Thread',
+    'Competition', 'Timer', 'Ports', 'GearSetting', 'Color',
+    'DirectionType', 'VelocityUnits', 'RotationUnits', 'TimeUnits',
+    'BrakeType', 'TemperatureUnits', 'PercentUnits', 'CurrentUnits', 'DistanceUnits',
+    'FORWARD', 'REVERSE', 'PERCENT', 'RPM', 'DPS', 'DEGREES', 'TURNS',
+    'MSEC', 'SECONDS', 'BRAKE', 'COAST', 'HOLD', 'CELSIUS', 'FAHRENHEIT',
+    'AMP', 'MM', 'INCHES', 'sleep', 'wait',
+]
+
+# Interval used by blocking device calls (spin_for, touch polling) when
+# they have to wait on simulated hardware.
+POLL_INTERVAL_MS = 5
+
+# Default amount of simulated time the main task may run before a run is
+# considered stuck (e.g. waiting forever on a touch that never comes).
+DEFAULT_TIME_LIMIT_MS = 10 * 60 * 1000
+
+
+class SimTimeout(Exception):
+    """Raised in the main task when a run exceeds its simulated time limit."""
+
+
+class _TaskCancelled(BaseException):
+    # BaseException so that robot code catching Exception can't swallow it
+    pass
+
+
+class _Constant:
+    def __init__(self, name, value=None):
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        return self.name
+
+
+class DirectionType:
+    FORWARD = _Constant('FORWARD', 1)
+    REVERSE = _Constant('REVERSE', -1)
+
+
+class VelocityUnits:
+    PERCENT = _Constant('PERCENT')
+    RPM = _Constant('RPM')
+    DPS = _Constant('DPS')
+
+
+class PercentUnits:
+    PERCENT = VelocityUnits.PERCENT
+
+
+class RotationUnits:
+    DEG = _Constant('DEGREES', 1.0)
+    REV = _Constant('TURNS', 360.0)
+
+
+class TimeUnits:
+    MSEC = _Constant('MSEC', 1.0)
+    SECONDS = _Constant('SECONDS', 1000.0)
+
+
+class BrakeType:
+    COAST = _Constant('COAST')
+    BRAKE = _Constant('BRAKE')
+    HOLD = _Constant('HOLD')
+
+
+class TemperatureUnits:
+    CELSIUS = _Constant('CELSIUS')
+    FAHRENHEIT = _Constant('FAHRENHEIT')
+
+
+class CurrentUnits:
+    AMP = _Constant('AMP')
+
+
+class DistanceUnits:
+    MM = _Constant('MM', 1.0)
+    INCHES = _Constant('INCHES', 25.4)
+
+
+class GearSetting:
+    # value is the free speed of the cartridge in RPM
+    RATIO_6_1 = _Constant('RATIO_6_1', 600.0)
+    RATIO_18_1 = _Constant('RATIO_18_1', 200.0)
+    RATIO_36_1 = _Constant('RATIO_36_1', 100.0)
+
+
+class Ports:
+    pass
+
+
+for _n in range(1, 22):
+    setattr(Ports, 'PORT%d' % _n, _Constant('PORT%d' % _n, _n))
+
+
+class Color:
+    BLACK = _Constant('BLACK', 0x000000)
+    WHITE = _Constant('WHITE', 0xFFFFFF)
+    RED = _Constant('RED', 0xFF0000)
+    GREEN = _Constant('GREEN', 0x00FF00)
+    BLUE = _Constant('BLUE', 0x0000FF)
+    YELLOW = _Constant('YELLOW', 0xFFFF00)
+    ORANGE = _Constant('ORANGE', 0xFFA500)
+    PURPLE = _Constant('PURPLE', 0xFF00FF)
+    CYAN = _Constant('CYAN', 0x00FFFF)
+    TRANSPARENT = _Constant('TRANSPARENT')
+
+
+FORWARD = DirectionType.FORWARD
+REVERSE = DirectionType.REVERSE
+PERCENT = VelocityUnits.PERCENT
+RPM = VelocityUnits.RPM
+DPS = VelocityUnits.DPS
+DEGREES = RotationUnits.DEG
+TURNS = RotationUnits.REV
+MSEC = TimeUnits.MSEC
+SECONDS = TimeUnits.SECONDS
+COAST = BrakeType.COAST
+BRAKE = BrakeType.BRAKE
+HOLD = BrakeType.HOLD
+CELSIUS = TemperatureUnits.CELSIUS
+FAHRENHEIT = TemperatureUnits.FAHRENHEIT
+AMP = CurrentUnits.AMP
+MM = DistanceUnits.MM
+INCHES = DistanceUnits.INCHES
+
+
+# ---------------------------------------------------------------------------- #
+#  Virtual clock and cooperative task switching                                #
+# ---------------------------------------------------------------------------- #
+
+class _Task:
+    def __init__(self, fn=None, args=()):
+        self.fn = fn
+        self.args = args
+        self.gate = threading.Semaphore(0)
+        self.token = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.joiners = []
+        self.thread = None
+
+
+class _Kernel:
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []
+        self.seq = 0
+        self.main = _Task()
+        self.current = self.main
+        self.tasks = []
+        self.competition = None
+        self.touch = None
+        self.time_limit = DEFAULT_TIME_LIMIT_MS
+        self.models = []
+
+    def schedule(self, task, when):
+        task.token += 1
+        self.seq += 1
+        heapq.heappush(self.queue, (when, self.seq, task, task.token))
+
+    def switch(self):
+        """Hand control to the earliest runnable task, advancing the clock."""
+        me = self.current
+        while True:
+            if not self.queue:
+                raise RuntimeError("every simulated task is blocked")
+            when, _, task, token = heapq.heappop(self.queue)
+            if token == task.token and not task.done:
+                break
+        if when > self.now:
+            for model in self.models:
+                model.advance_to(when)
+            self.now = when
+        self.current = task
+        if task is me:
+            return
+        task.gate.release()
+        if me.done:
+            return
+        me.gate.acquire()
+        if me.cancelled:
+            raise _TaskCancelled()
+
+    def sleep(self, ms):
+        me = self.current
+        self.schedule(me, self.now + max(ms, 0))
+        self.switch()
+        if me is self.main and self.now > self.time_limit:
+            raise SimTimeout("simulated time limit of %d ms exceeded" % self.time_limit)
+
+    def spawn(self, fn, args=()):
+        task = _Task(fn, args)
+        task.thread = threading.Thread(target=self._bootstrap, args=(task,), daemon=True)
+        self.tasks.append(task)
+        task.thread.start()
+        self.schedule(task, self.now)
+        return task
+
+    def _bootstrap(self, task):
+        task.gate.acquire()
+        if task.cancelled:
+            return
+        try:
+            task.fn(*task.args)
+        except _TaskCancelled:
+            if self.current is not task:
+                return
+        except Exception as e:
+            task.error = e
+        self.finish(task)
+
+    def finish(self, task):
+        task.done = True
+        for joiner in task.joiners:
+            self.schedule(joiner, self.now)
+        task.joiners = []
+        self.switch()
+
+    def cancel(self, task):
+        if task.done:
+            return
+        task.cancelled = True
+        task.done = True
+        task.token += 1
+        for joiner in task.joiners:
+            self.schedule(joiner, self.now)
+        task.joiners = []
+        task.gate.release()
+
+    def shutdown(self):
+        for task in self.tasks:
+            if task is not self.current:
+                self.cancel(task)
+        for task in self.tasks:
+            if task.thread is not threading.current_thread():
+                task.thread.join()
+
+
+_kernel = _Kernel()
+_sdcard_dir = None
+
+
+def _to_ms(value, units):
+    if units is None or units is MSEC:
+        return value
+    if units is SECONDS:
+        return value * 1000.0
+    raise ValueError("unsupported time units: %r" % (units,))
+
+
+def sleep(duration, units=MSEC):
+    """Block the calling task for `duration` of simulated time."""
+    _kernel.sleep(_to_ms(duration, units))
+
+
+def wait(duration, units=MSEC):
+    sleep(duration, units)
+
+
+# ---------------------------------------------------------------------------- #
+#  Simulator controls (not part of the real vex API)                           #
+# ---------------------------------------------------------------------------- #
+
+def reset(time_limit_ms=DEFAULT_TIME_LIMIT_MS):
+    """Stop every simulated task and restart the clock at zero."""
+    global _kernel
+    _kernel.shutdown()
+    _kernel = _Kernel()
+    _kernel.time_limit = time_limit_ms
+
+
+def now():
+    """Current simulated time in milliseconds."""
+    return _kernel.now
+
+
+def run_for(duration_ms):
+    """Let the background tasks run for `duration_ms` of simulated time."""
+    _kernel.sleep(duration_ms)
+
+
+def run_task(fn, timeout_ms=None, args=()):
+    """
+    Runs fn as its own task until it returns or timeout_ms of simulated time
+    passes, whichever comes first. Returns the simulated time taken and
+    re-raises anything fn raised. An unfinished task is cancelled.
+    """
+    k = _kernel
+    start = k.now
+    task = k.spawn(fn, args)
+    task.joiners.append(k.main)
+    if timeout_ms is not None:
+        k.schedule(k.main, start + timeout_ms)
+    k.switch()
+    if not task.done:
+        k.cancel(task)
+    task.joiners = []
+    if task.error is not None:
+        raise task.error
+    return k.now - start
+
+
+def attach_model(model):
+    """
+    Steps `model` along with the clock. Every time simulated time moves
+    forward, model.advance_to(now_ms) is called before any task resumes.
+    """
+    _kernel.models.append(model)
+
+
+def set_touch(x=None, y=None):
+    """Press the brain screen at (x, y), or release it when called with no args."""
+    _kernel.touch = None if x is None else (x, y)
+
+
+def competition():
+    """The Competition object created by the loaded program, if any."""
+    return _kernel.competition
+
+
+def set_sdcard(directory=None):
+    """
+    Makes brain.sdcard read and write files in `directory`, or removes the
+    card when called with no args. Survives reset().
+    """
+    global _sdcard_dir
+    _sdcard_dir = directory
+
+
+# ---------------------------------------------------------------------------- #
+#  Devices                                                                     #
+# ---------------------------------------------------------------------------- #
+
+class Timer:
+    def __init__(self):
+        self._start = _kernel.now
+
+    def time(self, units=MSEC):
+        elapsed = _kernel.now - self._start
+        return elapsed / 1000.0 if units is SECONDS else elapsed
+
+    def value(self):
+        return (_kernel.now - self._start) / 1000.0
+
+    def clear(self):
+        self._start = _kernel.now
+
+    def reset(self):
+        self.clear()
+
+    def system(self):
+        return int(_kernel.now)
+
+    def system_high_res(self):
+        return int(_kernel.now * 1000)
+
+
+class _Screen:
+    def __init__(self, rows=12):
+        self.lines = deque(maxlen=rows * 4)
+        self.row = 1
+        self.col = 1
+
+    def print(self, *args, sep=" ", **kwargs):
+        self.lines.append(sep.join(str(a) for a in args))
+
+    def set_cursor(self, row, col):
+        self.row = row
+        self.col = col
+
+    def new_line(self):
+        self.row += 1
+        self.col = 1
+
+    def next_row(self):
+        self.new_line()
+
+    def clear_screen(self, color=None):
+        self.lines.clear()
+
+    def clear_line(self, number=None, color=None):
+        pass
+
+    def clear_row(self, number=None):
+        pass
+
+    def set_font(self, font):
+        pass
+
+    def set_pen_color(self, color):
+        pass
+
+    def set_fill_color(self, color):
+        pass
+
+    def set_pen_width(self, width):
+        pass
+
+    def draw_rectangle(self, x, y, width, height, color=None):
+        pass
+
+    def draw_line(self, x1, y1, x2, y2):
+        pass
+
+    def draw_circle(self, x, y, radius, color=None):
+        pass
+
+    def draw_pixel(self, x, y):
+        pass
+
+    def render(self):
+        return True
+
+
+class _BrainScreen(_Screen):
+    def pressing(self):
+        if _kernel.touch is None:
+            # Touch loops poll without sleeping; let simulated time pass so
+            # a run waiting on a press that never comes still hits its limit.
+            _kernel.sleep(POLL_INTERVAL_MS)
+            return False
+        return True
+
+    def x_position(self):
+        return _kernel.touch[0] if _kernel.touch else 0
+
+    def y_position(self):
+        return _kernel.touch[1] if _kernel.touch else 0
+
+
+class _ThreeWirePort:
+    def __init__(self, name):
+        self.name = name
+
+
+class _ThreeWire:
+    def __init__(self):
+        for name in 'abcdefgh':
+            setattr(self, name, _ThreeWirePort(name))
+
+
+class _Battery:
+    def capacity(self, units=None):
+        return 100
+
+    def voltage(self, units=None):
+        return 12.8
+
+    def current(self, units=None):
+        return 0
+
+
+class _SDCard:
+    """Brain SD card backed by the directory given to set_sdcard(), if any."""
+
+    def _path(self, filename):
+        return os.path.join(_sdcard_dir, filename)
+
+    def is_inserted(self):
+        return _sdcard_dir is not None
+
+    def savefile(self, filename, data):
+        with open(self._path(filename), 'wb') as f:
+            return f.write(data)
+
+    def appendfile(self, filename, data):
+        with open(self._path(filename), 'ab') as f:
+            return f.write(data)
+
+    def loadfile(self, filename):
+        with open(self._path(filename), 'rb') as f:
+            return bytearray(f.read())
+
+    def exists(self, filename):
+        return _sdcard_dir is not None and os.path.exists(self._path(filename))
+
+    def filesize(self, filename):
+        return os.path.getsize(self._path(filename)) if self.exists(filename) else 0
+
+
+class Brain:
+    def __init__(self):
+        self.screen = _BrainScreen()
+        self.timer = Timer()
+        self.three_wire_port = _ThreeWire()
+        self.battery = _Battery()
+        self.sdcard = _SDCard()
+
+
+class _Axis:
+    def __init__(self):
+        self.value = 0
+
+    def position(self):
+        return self.value
+
+
+class _Button:
+    def __init__(self):
+        self.state = False
+
+    def pressing(self):
+        return self.state
+
+
+class Controller:
+    def __init__(self, controller_type=None):
+        self.screen = _Screen(rows=3)
+        for n in range(1, 5):
+            setattr(self, 'axis%d' % n, _Axis())
+        for name in ('L1', 'L2', 'R1', 'R2', 'Up', 'Down', 'Left', 'Right',
+                     'A', 'B', 'X', 'Y'):
+            setattr(self, 'button' + name, _Button())
+
+    def rumble(self, pattern):
+        pass
+
+
+class _IdealMotor:
+    """
+    Default plant: the motor reaches its commanded velocity instantly.
+    Position is integrated lazily from the last command, so reading it costs
+    nothing between commands no matter how far the clock has moved.
+    """
+
+    def __init__(self):
+        self.rpm = 0.0
+        self.position = 0.0
+        self.stamp = _kernel.now
+        self.target = None
+
+    def sync(self):
+        t = _kernel.now
+        if t != self.stamp:
+            travel = self.rpm * 6.0 * (t - self.stamp) / 1000.0
+            if self.target is None:
+                self.position += travel
+            elif abs(self.target - self.position) <= abs(travel):
+                self.position = self.target
+                self.target = None
+                self.rpm = 0.0
+            else:
+                self.position += travel
+            self.stamp = t
+
+    def command_velocity(self, index, rpm):
+        self.sync()
+        self.target = None
+        self.rpm = rpm
+
+    def command_position(self, index, target, rpm):
+        self.sync()
+        if target == self.position or rpm == 0:
+            self.target = None
+            self.rpm = 0.0
+            return
+        self.target = target
+        self.rpm = rpm if target > self.position else -rpm
+
+    def command_stop(self, index, mode):
+        self.sync()
+        self.rpm = 0.0
+        self.target = None
+
+    def is_done(self, index):
+        self.sync()
+        return self.target is None
+
+    def motor_position(self, index):
+        self.sync()
+        return self.position
+
+    def set_motor_position(self, index, value):
+        self.sync()
+        if self.target is not None:
+            self.target += value - self.position
+        self.position = value
+
+    def motor_velocity(self, index):
+        self.sync()
+        return self.rpm
+
+    def motor_current(self, index):
+        return 0.0
+
+    def motor_torque(self, index):
+        return 0.0
+
+
+class Motor:
+    """
+    Smart motor. Commands are forwarded to a plant that decides how the shaft
+    actually moves: an ideal instant-velocity motor by default, or a physics
+    model once one is attached (see physics.py).
+    """
+
+    def __init__(self, port, gears=GearSetting.RATIO_18_1, reverse=False):
+        self.port = port
+        self.gears = gears
+        self.reversed = reverse
+        self.max_rpm = gears.value if isinstance(gears, _Constant) else 200.0
+        self.brake_mode = COAST
+        self._velocity_setting = 50.0
+        self._plant = _IdealMotor()
+        self._index = 0
+
+    def attach_plant(self, plant, index):
+        """Simulator only: hand this motor over to another plant."""
+        position = self.position(DEGREES)
+        self._plant = plant
+        self._index = index
+        plant.set_motor_position(index, position)
+
+    def _to_rpm(self, velocity, units):
+        if units is None or units is PERCENT:
+            rpm = velocity * self.max_rpm / 100.0
+        elif units is RPM:
+            rpm = velocity
+        elif units is DPS:
+            rpm = velocity / 6.0
+        else:
+            raise ValueError("unsupported velocity units: %r" % (units,))
+        return max(min(rpm, self.max_rpm), -self.max_rpm)
+
+    def spin(self, direction, velocity=None, units=PERCENT):
+        if velocity is None:
+            velocity = self._velocity_setting
+        self._plant.command_velocity(self._index, direction.value * self._to_rpm(velocity, units))
+
+    def spin_for(self, direction, value, units=DEGREES, velocity=None,
+                 units_v=PERCENT, wait=True):
+        self.spin_to_position(self.position(DEGREES) + direction.value * value * units.value,
+                              DEGREES, velocity, units_v, wait)
+
+    def spin_to_position(self, rotation, units=DEGREES, velocity=None,
+                         units_v=PERCENT, wait=True):
+        if velocity is None:
+            velocity = self._velocity_setting
+        speed = abs(self._to_rpm(velocity, units_v))
+        self._plant.command_position(self._index, rotation * units.value, speed)
+        if wait:
+            while not self.is_done():
+                sleep(POLL_INTERVAL_MS)
+
+    def stop(self, mode=None):
+        self._plant.command_stop(self._index, self.brake_mode if mode is None else mode)
+
+    def is_done(self):
+        return self._plant.is_done(self._index)
+
+    def is_spinning(self):
+        return not self.is_done() or self.velocity(RPM) != 0
+
+    def position(self, units=DEGREES):
+        return self._plant.motor_position(self._index) / units.value
+
+    def set_position(self, value, units=DEGREES):
+        self._plant.set_motor_position(self._index, value * units.value)
+
+    def reset_position(self):
+        self.set_position(0, DEGREES)
+
+    def velocity(self, units=PERCENT):
+        rpm = self._plant.motor_velocity(self._index)
+        if units is RPM:
+            return rpm
+        if units is DPS:
+            return rpm * 6.0
+        return rpm * 100.0 / self.max_rpm
+
+    def set_velocity(self, velocity, units=PERCENT):
+        if units is not PERCENT:
+            velocity = self._to_rpm(velocity, units) * 100.0 / self.max_rpm
+        self._velocity_setting = velocity
+
+    def set_stopping(self, mode):
+        self.brake_mode = mode
+
+    def set_max_torque(self, value, units=None):
+        pass
+
+    def set_timeout(self, value, units=MSEC):
+        pass
+
+    def temperature(self, units=CELSIUS):
+        return 25.0
+
+    def current(self, units=AMP):
+        return self._plant.motor_current(self._index)
+
+    def torque(self, units=None):
+        return self._plant.motor_torque(self._index)
+
+    def installed(self):
+        return True
+
+
+class Inertial:
+    """
+    Inertial sensor. Reads the chassis heading from whatever was attached
+    with attach_source() (physics.attach does this), clockwise positive.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self._source = None
+        self._offset = 0.0
+
+    def attach_source(self, source):
+        """Simulator only: source() returns the true rotation in degrees."""
+        rotation = self.rotation()
+        self._source = source
+        self._offset = rotation - source()
+
+    def _raw(self):
+        return self._source() if self._source is not None else 0.0
+
+    def calibrate(self):
+        pass
+
+    def is_calibrating(self):
+        return False
+
+    def rotation(self, units=DEGREES):
+        return self._raw() + self._offset
+
+    def heading(self, units=DEGREES):
+        return self.rotation() % 360.0
+
+    def set_rotation(self, value, units=DEGREES):
+        self._offset = value - self._raw()
+
+    def set_heading(self, value, units=DEGREES):
+        self.set_rotation(value)
+
+    def reset_rotation(self):
+        self.set_rotation(0)
+
+    def reset_heading(self):
+        self.set_rotation(0)
+
+    def installed(self):
+        return True
+
+
+class Distance:
+    """
+    Distance sensor. Reads whatever was attached with attach_source(), or
+    nothing in range (9999 mm) until then.
+    """
+
+    NO_OBJECT_MM = 9999.0
+
+    def __init__(self, port):
+        self.port = port
+        self._source = None
+
+    def attach_source(self, source):
+        """Simulator only: source() returns the distance in mm, or None for nothing in range."""
+        self._source = source
+
+    def object_distance(self, units=MM):
+        mm = self._source() if self._source is not None else None
+        if mm is None:
+            mm = self.NO_OBJECT_MM
+        return mm / units.value
+
+    def is_object_detected(self):
+        return self.object_distance() < self.NO_OBJECT_MM
+
+    def installed(self):
+        return True
+
+
+class Pneumatics:
+    def __init__(self, port):
+        self.port = port
+        self.state = False
+
+    def open(self):
+        self.state = True
+
+    def close(self):
+        self.state = False
+
+    def value(self):
+        return 1 if self.state else 0
+
+
+class DigitalOut:
+    def __init__(self, port):
+        self.port = port
+        self.state = False
+
+    def set(self, value):
+        self.state = bool(value)
+
+    def value(self):
+        return 1 if self.state else 0
+
+
+class Thread:
+    """Runs callback as a cooperative task on the simulated scheduler."""
+
+    def __init__(self, callback, args=()):
+        self._task = _kernel.spawn(callback, tuple(args))
+
+    def stop(self):
+        if self._task is _kernel.current:
+            raise _TaskCancelled()
+        _kernel.cancel(self._task)
+
+    @staticmethod
+    def sleep_for(duration, units=MSEC):
+        sleep(duration, units)
+
+
+class Competition:
+    """
+    Records the driver and autonomous callbacks. Nothing runs until the
+    simulator starts a phase (see runner.py), mirroring a robot that sits
+    disabled until field control enables it.
+    """
+
+    def __init__(self, driver_control, autonomous):
+        self.driver_control = driver_control
+        self.autonomous = autonomous
+        self.mode = None
+        _kernel.competition = self
+
+    def is_enabled(self):
+        return self.mode is not None
+
+    def is_driver_control(self):
+        return self.mode == 'driver'
+
+    def is_autonomous(self):
+        return self.mode == 'autonomous'
+
+    def is_competition_switch(self):
+        return False
+
+    def is_field_control(self):
+        return False
@@ -0,0 +1,103 @@
+# ---------------------------------------------------------------------------- #
+#                                                                              #
+# 	Module:       telemetry.py                                                 #
+# 	Author:       Advay Chandorkar                                             #
+# 	Created:      12/3/2024, 6:24:37 PM                                        #
+# 	Description:  fixed-record binary log written to the brain sd card         #
+#                                                                              #
+# ---------------------------------------------------------------------------- #
+
+# Control loops log one fixed-size record per tick into a preallocated ring
+# buffer with struct.pack_into, so logging never grows the heap. Between
+# phases (end of autonomous, every few seconds of driver control) the
+# buffered records are appended to a file on the sd card in one or two large
+# writes.
+#
+# File layout: a HEADER_FORMAT header, then RECORD_FORMAT records back to
+# back. visualization/telemetry_log.py maps a file straight into numpy.
+
+import struct
+
+MAGIC = b'BTLM'
+VERSION = 1
+
+# (name, struct code) for every field of a record, in file order
+FIELDS = (
+    ('time_ms', 'I'),
+    ('left_position', 'f'),  # degrees, from a motor pid_drive never resets
+    ('right_position', 'f'),  # degrees, from a motor pid_drive never resets
+    ('left_output', 'f'),  # percent
+    ('right_output', 'f'),  # percent
+    ('p_term', 'f'),
+    ('i_term', 'f'),
+    ('d_term', 'f'),
+    ('conveyor', 'f'),  # percent
+    ('piston', 'B'),  # 1 open, 0 closed
+    ('source', 'B'),  # which loop wrote the record, see below
+)
+RECORD_FORMAT = '<' + ''.join(code for _, code in FIELDS) + 'xx'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+HEADER_FORMAT = '<4sHH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Record sources
+SOURCE_PID_DRIVE = 1
+SOURCE_DRIVER = 2
+SOURCE_PROFILE_DRIVE = 3
+SOURCE_PATH = 4
+SOURCE_TURN = 5
+
+class Telemetry:
+    """
+    ring buffer of capacity records waiting to be written to the sd card
+
+    if the buffer fills before a flush the oldest records are overwritten
+    and counted in dropped.
+    """
+
+    def __init__(self, capacity=1024, enabled=True):
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.capacity = capacity
+        self.enabled = enabled
+        self.head = 0  # slot the next record goes in
+        self.count = 0  # records not flushed yet
+        self.dropped = 0
+        self.filename = None
+
+    def log(self, time_ms, left_position, right_position, left_output, right_output,
+            p_term, i_term, d_term, conveyor, piston, source):
+        if not self.enabled:
+            return
+        struct.pack_into(RECORD_FORMAT, self.buffer, self.head * RECORD_SIZE,
+                         int(time_ms), left_position, right_position, left_output, right_output,
+                         p_term, i_term, d_term, conveyor, piston, source)
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+        if self.count == self.capacity:
+            self.dropped += 1
+        else:
+            self.count += 1
+
+    def start(self, sdcard, filename):
+        """starts a new log file, replacing any old one with the same name"""
+        self.filename = None
+        self.count = 0
+        if self.enabled and sdcard.is_inserted():
+            sdcard.savefile(filename, bytearray(struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE)))
+            self.filename = filename
+
+    def flush(self, sdcard):
+        """
+        appends every buffered record to the file from start(), oldest first,
+        in at most two writes. records are discarded if there is no card.
+        """
+        if self.count == 0:
+            return
+        if self.filename is not None and sdcard.is_inserted():
+            first = self.head - self.count
+            if first < 0:
+                sdcard.appendfile(self.filename, self.buffer[(first + self.capacity) * RECORD_SIZE:])
+                first = 0
+            sdcard.appendfile(self.filename, self.buffer[first * RECORD_SIZE:self.head * RECORD_SIZE])
+        self.count = 0
@@ -5,13 +5,48 @@ from matplotlib.animation import FuncAnimation
 from matplotlib.patches import Rectangle, Circle
 import matplotlib.image as mpimg
 import os
+import time
+import argparse
+import tempfile
 from matplotlib.widgets import Button, TextBox
 
+import telemetry_log
+import routine  # robot-side, on the path via telemetry_log
+from path import smooth_path
+from planner import FieldGrid, Planner
+import routines
+
+def dead_reckon(left_degrees, right_degrees, wheel_diameter=4.0, track_width=12.0, start=(72, 20, 0)):
+    """
+    Turns left/right encoder positions (motor degrees, one per sample) into a
+    pose per sample. Heading is in degrees, clockwise from +y like the
+    visualizer's robot_angle. Each step moves along the heading halfway
+    through the step's turn.
+    """
+    inches_per_degree = math.pi * wheel_diameter / 360
+    left = np.asarray(left_degrees, dtype=float)
+    right = np.asarray(right_degrees, dtype=float)
+    d_left = np.diff(left, prepend=left[:1]) * inches_per_degree
+    d_right = np.diff(right, prepend=right[:1]) * inches_per_degree
+
+    d_distance = (d_left + d_right) / 2
+    d_heading = (d_left - d_right) / track_width
+    heading = math.radians(start[2]) + np.cumsum(d_heading)
+    midpoint = heading - d_heading / 2
+    x = start[0] + np.cumsum(d_distance * np.sin(midpoint))
+    y = start[1] + np.cumsum(d_distance * np.cos(midpoint))
+    return x, y, np.degrees(heading)
+
 class AutonVisualizer:
+    SCRIPT_STEP_MS = 5  # playback time of one move_robot/rotate_robot step
+    FRAME_INTERVAL_MS = 20  # redraw rate, frames are skipped to keep up with real time
+    PATH_RESOLUTION = 0.25  # inches, about one screen pixel; finer path detail isn't drawn
+
     def __init__(self, field_size=(144, 144)):  # Field size in inches
         self.field_size = field_size
         self.robot_width = 14  # inches
         self.robot_length = 18  # inches
+        self.planner = None  # built on the first navigate step
         
         # Setup plot with smaller size
         self.fig, self.ax = plt.subplots(figsize=(8, 6))  # Smaller figure size
@@ -32,13 +67,15 @@ class AutonVisualizer:
         self.robot_x = field_size[0]/2
         self.robot_y = 20
         self.robot_angle = 0
-        self.path_x = [self.robot_x]
-        self.path_y = [self.robot_y]
-        self.events = []
+        self.replay_source = None  # telemetry log to replay instead of the routine
+        self.routine = match_auton  # routine Start runs, set to the one picked on the command line
+        self.speed = 1.0  # playback speed, 1 is real time
+        self.frame_skip = None  # path points per frame, None picks them to keep real time
         
         # Initialize system states
         self.piston_state = "closed"
         self.conveyor_running = False
+        self.conveyor_stop_ms = None  # path time a timed conveyor run ends
         
         # Create robot and direction indicator
         self.robot_patch = Rectangle((self.robot_x - self.robot_width/2, self.robot_y - self.robot_length/2),
@@ -50,6 +87,9 @@ class AutonVisualizer:
         # Path line and status text
         self.path_line, = self.ax.plot([], [], 'b-', linewidth=2, alpha=0.5)
         self.status_text = self.ax.text(5, field_size[1]-10, '', fontsize=10, color='white', bbox=dict(facecolor='black', alpha=0.7))
+        for artist in (self.robot_patch, self.direction_indicator, self.path_line, self.status_text):
+            artist.set_animated(True)  # drawn by blitting only, never part of the background
+        self.set_start_position(self.robot_x, self.robot_y, self.robot_angle)
         
         # Setup buttons and textboxes
         self.setup_buttons()
@@ -115,7 +155,10 @@ class AutonVisualizer:
 
     def start_animation(self, event):
         self.reset_visualization(None)  # Reset visualization with new start position
-        self.run_auton(match_auton)
+        if self.replay_source is not None:
+            self.replay_log(self.replay_source)
+        else:
+            self.run_auton(self.routine)
 
     def stop_animation(self, event):
         if hasattr(self, 'anim'):
@@ -123,9 +166,6 @@ class AutonVisualizer:
 
     def reset_visualization(self, event):
         self.set_start_position(self.robot_x, self.robot_y, self.robot_angle)
-        self.path_x = [self.robot_x]
-        self.path_y = [self.robot_y]
-        self.events = []
         self.path_line.set_data([], [])
         plt.draw()
 
@@ -134,44 +174,88 @@ class AutonVisualizer:
         self.robot_x = x
         self.robot_y = y
         self.robot_angle = angle
-        self.path_x = [x]
-        self.path_y = [y]
-        self.events = []
+        # Path columns: time (ms), x, y, angle, piston open, conveyor on
+        self.path = np.empty((1024, 6))
+        self.path_len = 0
+        self.append_path([x], [y], [angle])
+
+    def append_path(self, xs, ys, angles):
+        """Add points to the path, one SCRIPT_STEP_MS apart, with the current piston/conveyor state"""
+        n = len(xs)
+        if self.path_len + n > len(self.path):
+            grown = np.empty((max(2 * len(self.path), self.path_len + n), 6))
+            grown[:self.path_len] = self.path[:self.path_len]
+            self.path = grown
+        rows = self.path[self.path_len:self.path_len + n]
+        start_ms = self.path[self.path_len - 1, 0] + self.SCRIPT_STEP_MS if self.path_len else 0
+        rows[:, 0] = start_ms + self.SCRIPT_STEP_MS * np.arange(n)
+        rows[:, 1] = xs
+        rows[:, 2] = ys
+        rows[:, 3] = angles
+        rows[:, 4] = self.piston_state == "open"
+        rows[:, 5] = self.conveyor_running
+        if self.conveyor_stop_ms is not None:
+            rows[:, 5] *= rows[:, 0] < self.conveyor_stop_ms
+            if rows[-1, 0] >= self.conveyor_stop_ms:
+                self.conveyor_running = False
+                self.conveyor_stop_ms = None
+        self.path_len += n
+
+    @property
+    def path_x(self):
+        return self.path[:self.path_len, 1]
+
+    @property
+    def path_y(self):
+        return self.path[:self.path_len, 2]
+
+    @property
+    def path_angle(self):
+        return self.path[:self.path_len, 3]
         
     def move_robot(self, distance):
         """Move robot forward/backward by distance (inches)"""
         angle_rad = math.radians(self.robot_angle)
         steps = np.linspace(0, distance, 100)  # Increased steps for smoother animation
         
-        start_x = self.robot_x
-        start_y = self.robot_y
-        
-        for step in steps:
-            dx = step * math.sin(angle_rad)
-            dy = step * math.cos(angle_rad)
-            
-            self.robot_x = start_x + dx
-            self.robot_y = start_y + dy
-            self.path_x.append(self.robot_x)
-            self.path_y.append(self.robot_y)
-            self.events.append({
-                'piston': self.piston_state,
-                'conveyor': self.conveyor_running
-            })
+        xs = self.robot_x + steps * math.sin(angle_rad)
+        ys = self.robot_y + steps * math.cos(angle_rad)
+        self.append_path(xs, ys, np.full(len(steps), self.robot_angle))
+        self.robot_x = xs[-1]
+        self.robot_y = ys[-1]
             
+    def follow_path(self, points, backwards=False):
+        """Drive a smooth path through field points [(x, y), ...], as the robot's goto steps do"""
+        path = smooth_path(points, start=(self.robot_x, self.robot_y))
+        xs = np.asarray(path.xs, dtype=float)
+        ys = np.asarray(path.ys, dtype=float)
+        # face along the path, or away from it when backing up
+        angles = np.degrees(np.arctan2(np.gradient(xs), np.gradient(ys)))
+        if backwards:
+            angles += 180
+        angles %= 360
+        self.append_path(xs, ys, angles)
+        self.robot_x = xs[-1]
+        self.robot_y = ys[-1]
+        self.robot_angle = angles[-1]
+
+    def navigate(self, x, y):
+        """Drive to field point (x, y) around the ladder and stakes, as the robot's navigate steps do"""
+        if self.planner is None:
+            self.planner = Planner(FieldGrid())
+        points = self.planner.plan((self.robot_x, self.robot_y), (x, y))
+        if points is None:
+            print(f"no way to {x:.1f}, {y:.1f}")
+            return
+        self.follow_path(points[1:])
+
     def rotate_robot(self, angle_degrees):
         """Rotate robot by angle_degrees"""
         steps = np.linspace(0, angle_degrees, 50)  # Increased steps for smoother rotation
-        start_angle = self.robot_angle
         
-        for step in steps:
-            self.robot_angle = (start_angle + step) % 360
-            self.path_x.append(self.robot_x)
-            self.path_y.append(self.robot_y)
-            self.events.append({
-                'piston': self.piston_state,
-                'conveyor': self.conveyor_running
-            })
+        angles = (self.robot_angle + steps) % 360
+        self.append_path(np.full(len(steps), self.robot_x), np.full(len(steps), self.robot_y), angles)
+        self.robot_angle = angles[-1]
     
     def piston_open(self):
         """Simulate opening the piston."""
@@ -183,72 +267,217 @@ class AutonVisualizer:
         self.piston_state = "closed"
         print("Piston closed.")
 
-    def conveyor_start(self):
-        """Simulate starting the conveyor."""
+    def conveyor_start(self, for_ms=None):
+        """Simulate starting the conveyor, for for_ms of path time if given, while the robot keeps moving."""
         self.conveyor_running = True
+        self.conveyor_stop_ms = None
+        if for_ms:
+            self.conveyor_stop_ms = self.path[self.path_len - 1, 0] + for_ms
         print("Conveyor started.")
 
     def conveyor_stop(self):
         """Simulate stopping the conveyor."""
         self.conveyor_running = False
+        self.conveyor_stop_ms = None
         print("Conveyor stopped.")
+
+    def wait(self, ms):
+        """Stand still for ms"""
+        steps = max(1, round(ms / self.SCRIPT_STEP_MS))
+        self.append_path(np.full(steps, self.robot_x), np.full(steps, self.robot_y), np.full(steps, self.robot_angle))
         
+    def decimate_path(self):
+        """
+        Pick the path points worth drawing: the first point in each
+        PATH_RESOLUTION square the path passes through, plus the last one.
+        """
+        cells = np.floor(self.path[:self.path_len, 1:3] / self.PATH_RESOLUTION)
+        keep = np.ones(self.path_len, dtype=bool)
+        keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+        keep[-1] = True
+        self.draw_index = np.flatnonzero(keep)
+        self.draw_x = self.path_x[self.draw_index]
+        self.draw_y = self.path_y[self.draw_index]
+
+    def frames(self):
+        """
+        Path indices to draw. With no frame_skip the index follows the wall
+        clock, so slow redraws skip points instead of slowing playback.
+        """
+        times = self.path[:self.path_len, 0]
+        last = self.path_len - 1
+        start = time.perf_counter()
+        frame = 0
+        while True:
+            if self.frame_skip is None:
+                elapsed_ms = (time.perf_counter() - start) * 1000 * self.speed + times[0]
+                frame = min(int(np.searchsorted(times, elapsed_ms, side='right')) - 1, last)
+            yield frame
+            if frame >= last:
+                return
+            if self.frame_skip is not None:
+                frame = min(frame + self.frame_skip, last)
+
     def update_animation(self, frame):
         """Update function for animation"""
-        if frame < len(self.path_x):
+        if frame < self.path_len:
             # Update robot position
-            x = self.path_x[frame]
-            y = self.path_y[frame]
+            _, x, y, angle, piston, conveyor = self.path[frame]
             
             # Update robot patch
             self.robot_patch.set_xy((x - self.robot_width/2, y - self.robot_length/2))
-            self.robot_patch.angle = -self.robot_angle
+            self.robot_patch.angle = -angle
             
             # Update direction indicator
             self.direction_indicator.center = (x, y)  # Keep inside robot
             
-            # Update path
-            self.path_line.set_data(self.path_x[:frame+1], self.path_y[:frame+1])
+            # Update path with views of the decimated points reached so far
+            drawn = np.searchsorted(self.draw_index, frame, side='right')
+            self.path_line.set_data(self.draw_x[:drawn], self.draw_y[:drawn])
             
             # Update status text
-            event = self.events[frame]
-            status = f"Piston: {event['piston']}\nConveyor: {'ON' if event['conveyor'] else 'OFF'}"
+            status = f"Piston: {'open' if piston else 'closed'}\nConveyor: {'ON' if conveyor else 'OFF'}"
             self.status_text.set_text(status)
             
         return self.robot_patch, self.direction_indicator, self.path_line, self.status_text
         
     def run_auton(self, routine_func):
         """Run an autonomous routine and animate it"""
+        self.load_routine(routine_func)
+        self.animate()
+
+    def load_routine(self, routine_func):
+        """Build the path for an autonomous routine without animating it"""
         # Reset paths
-        self.path_x = [self.robot_x]
-        self.path_y = [self.robot_y]
-        self.events = []
+        self.set_start_position(self.robot_x, self.robot_y, self.robot_angle)
         
         # Run the autonomous routine
         routine_func(self)
-        
-        # Create animation
+        self.decimate_path()
+
+    def replay_log(self, log, wheel_diameter=4.0, track_width=12.0):
+        """
+        Animate what the robot really did from a telemetry log (a file path or
+        records from telemetry_log.load), starting from the current start
+        position.
+        """
+        self.replay_source = log
+        if self.load_log(log, wheel_diameter, track_width):
+            self.animate()
+
+    def load_log(self, log, wheel_diameter=4.0, track_width=12.0):
+        """Build the path from a telemetry log without animating it. Returns False if the log is empty."""
+        if isinstance(log, str):
+            log = telemetry_log.load(log)
+        if len(log) == 0:
+            print("Telemetry log is empty.")
+            return False
+
+        x, y, heading = dead_reckon(log['left_position'], log['right_position'], wheel_diameter,
+                                    track_width, (self.robot_x, self.robot_y, self.robot_angle))
+
+        self.path = np.column_stack((log['time_ms'].astype(float), x, y, heading,
+                                     log['piston'] != 0, np.abs(log['conveyor']) > 1))
+        self.path_len = len(self.path)
+        self.decimate_path()
+        return True
+
+    def hide_controls(self):
+        """Hide the buttons and textboxes, e.g. for exported frames"""
+        for ax in (self.reset_ax, self.start_ax, self.stop_ax,
+                   self.x_textbox_ax, self.y_textbox_ax, self.angle_textbox_ax):
+            ax.set_visible(False)
+
+    def animate(self):
+        """Animate the current path"""
         self.anim = FuncAnimation(
             self.fig, self.update_animation,
-            frames=len(self.path_x),
-            interval=5,  # Reduced interval for smoother animation
-            blit=True
+            frames=self.frames,
+            interval=self.FRAME_INTERVAL_MS,
+            blit=True,
+            cache_frame_data=False
         )
         
         plt.show()
 
-def match_auton(robot):
-    """Recreation of your autonomous routine"""
-    robot.piston_open()
-    robot.move_robot(32)
-    robot.piston_close()
-    robot.move_robot(-6)
-    robot.conveyor_start()
-    robot.move_robot(-5)
-    robot.rotate_robot(90)
-    robot.conveyor_stop()
+class TextRoutine:
+    """
+    A scripted routine from routine text (see routines.py), so the
+    visualizer plays the same steps the robot runs. A class rather than a
+    closure so export_auton can hand it to worker processes.
+    """
+
+    def __init__(self, text):
+        self.steps = routine.parse(text)
+
+    def __call__(self, robot):
+        def set_piston(open_piston):
+            if open_piston:
+                robot.piston_open()
+            else:
+                robot.piston_close()
+
+        def conveyor(percent, for_ms):
+            if percent != 0:
+                robot.conveyor_start(for_ms)
+            else:
+                robot.conveyor_stop()
+
+        routine.run(self.steps, {
+            routine.DRIVE: robot.move_robot,
+            routine.TURN: robot.rotate_robot,
+            routine.PISTON: set_piston,
+            routine.CONVEYOR: conveyor,
+            routine.WAIT: robot.wait,
+            routine.GOTO: robot.follow_path,
+            routine.NAVIGATE: robot.navigate,
+        })
+
+
+def named_routine(name):
+    """A routine from routines.ROUTINES, or a scripted routine function in this module"""
+    if name in routines.ROUTINES:
+        return TextRoutine(routines.ROUTINES[name])
+    return globals()[name]
+
+
+# motion.py's autonomous
+match_auton = TextRoutine(routines.MOTION)
+
+def simulate_log(program, auton=None):
+    """Run a program's autonomous in the simulator and return its telemetry log path"""
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'simulation'))
+    import vex
+    import runner
+    import physics
+
+    sd_dir = tempfile.mkdtemp()
+    vex.set_sdcard(sd_dir)
+    namespace = runner.load_program(program, auton)
+    physics.attach(namespace)
+    runner.run_autonomous()
+    vex.set_sdcard()
+    return os.path.join(sd_dir, namespace['TELEMETRY_AUTON_FILE'])
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Animate an autonomous on the field")
+    parser.add_argument('--routine', default='match_auton', help="routine in routines.py, e.g. red_left")
+    parser.add_argument('--log', help="telemetry log from the SD card to replay")
+    parser.add_argument('--sim', metavar='PROGRAM', help="simulate a program's autonomous and replay its log")
+    parser.add_argument('--auton', help="touchscreen selection for --sim, e.g. red_left")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed, 1 is real time")
+    parser.add_argument('--frame-skip', type=int, help="fixed number of path points per frame instead of real time")
+    args = parser.parse_args()
+
     # Create visualizer
     viz = AutonVisualizer()
-    viz.run_auton(match_auton)
\ No newline at end of file
+    viz.speed = args.speed
+    viz.frame_skip = args.frame_skip
+    if args.sim:
+        viz.replay_log(simulate_log(args.sim, args.auton))
+    elif args.log:
+        viz.replay_log(args.log)
+    else:
+        viz.routine = named_routine(args.routine)
+        viz.run_auton(viz.routine)
\ No newline at end of file
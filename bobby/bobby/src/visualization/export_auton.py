@@ -0,0 +1,169 @@
+"""
+Renders an autonomous to a video, GIF or PNG strip without a display.
+
+    python export_auton.py match_auton.gif
+    python export_auton.py red_left.mp4 --sim ../main.py --auton red_left --workers 8
+    python export_auton.py renders/ --sim ../main.py --auton all
+    python export_auton.py auton.png --log auton.tlm --strip 10
+
+The output format follows the extension: .mp4 (needs ffmpeg on PATH), .gif,
+or .png for a strip of evenly spaced frames side by side. Frames are rendered
+in worker processes, each with its own Agg figure, written to a temporary
+directory and stitched together at the end.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+from PIL import Image
+
+import auton_visualizer
+from auton_visualizer import AutonVisualizer
+
+FRAME_NAME = 'frame_%05d.png'
+
+
+def build_visualizer(source, start):
+    """
+    A headless visualizer with its path built from `source`: a routine
+    function like match_auton, or a telemetry log path.
+    """
+    viz = AutonVisualizer()
+    viz.hide_controls()
+    viz.set_start_position(*start)
+    if callable(source):
+        viz.load_routine(source)
+    elif not viz.load_log(source):
+        raise ValueError(f"{source}: telemetry log is empty")
+    return viz
+
+
+def frame_indices(viz, fps):
+    """Path index shown in each frame when playing back in real time at fps"""
+    times = viz.path[:viz.path_len, 0]
+    frame_times = np.arange(times[0], times[-1] + 1000.0 / fps, 1000.0 / fps)
+    return np.minimum(np.searchsorted(times, frame_times, side='right') - 1, viz.path_len - 1)
+
+
+def render_chunk(source, start, dpi, frames, directory):
+    """
+    Worker: renders (frame number, path index) pairs to PNG files. The
+    field is drawn once and every frame only redraws the moving artists
+    over it.
+    """
+    viz = build_visualizer(source, start)
+    viz.fig.set_dpi(dpi)
+    canvas = viz.fig.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(viz.fig.bbox)
+    for number, index in frames:
+        canvas.restore_region(background)
+        for artist in viz.update_animation(index):
+            viz.ax.draw_artist(artist)
+        rgb = np.asarray(canvas.buffer_rgba())[..., :3]
+        Image.fromarray(rgb).save(os.path.join(directory, FRAME_NAME % number), compress_level=1)
+    return len(frames)
+
+
+def render_frames(source, start, indices, directory, dpi=100, workers=None):
+    """Renders every frame into directory, dealing the frames out across the workers"""
+    workers = workers or os.cpu_count() or 1
+    numbered = list(enumerate(int(i) for i in indices))
+    chunks = [numbered[i::workers] for i in range(workers)]
+    chunks = [chunk for chunk in chunks if chunk]
+    if len(chunks) == 1:
+        render_chunk(source, start, dpi, chunks[0], directory)
+        return
+    with ProcessPoolExecutor(len(chunks)) as pool:
+        jobs = [pool.submit(render_chunk, source, start, dpi, chunk, directory) for chunk in chunks]
+        for job in jobs:
+            job.result()
+
+
+def stitch(directory, count, output, fps, strip=8):
+    """Combines the rendered frames into output; the format follows its extension"""
+    paths = [os.path.join(directory, FRAME_NAME % i) for i in range(count)]
+    extension = os.path.splitext(output)[1].lower()
+    if extension == '.mp4':
+        subprocess.run([shutil.which('ffmpeg'), '-y', '-loglevel', 'error', '-framerate', str(fps),
+                        '-i', os.path.join(directory, FRAME_NAME),
+                        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264',
+                        '-pix_fmt', 'yuv420p', output], check=True)
+    elif extension == '.gif':
+        first = Image.open(paths[0])
+        rest = (Image.open(path) for path in paths[1:])
+        first.save(output, save_all=True, append_images=rest, duration=round(1000 / fps), loop=0)
+    elif extension == '.png':
+        picks = np.unique(np.linspace(0, count - 1, min(strip, count)).round().astype(int))
+        Image.fromarray(np.hstack([np.asarray(Image.open(paths[i]).convert('RGB')) for i in picks])).save(output)
+    else:
+        raise ValueError(f"{output}: unknown format, use .mp4, .gif or .png")
+
+
+def export(source, output, start=(72, 20, 0), fps=30, dpi=100, workers=None, strip=8):
+    """Renders source (a routine function or telemetry log path) to output. Returns the frame count."""
+    extension = os.path.splitext(output)[1].lower()
+    if extension not in ('.mp4', '.gif', '.png'):
+        raise ValueError(f"{output}: unknown format, use .mp4, .gif or .png")
+    if extension == '.mp4' and shutil.which('ffmpeg') is None:
+        raise RuntimeError("MP4 export needs ffmpeg on PATH; use .gif or .png instead")
+    viz = build_visualizer(source, start)
+    indices = frame_indices(viz, fps)
+    if extension == '.png':
+        # A strip only needs the frames it shows
+        indices = indices[np.unique(np.linspace(0, len(indices) - 1, min(strip, len(indices))).round().astype(int))]
+    with tempfile.TemporaryDirectory() as directory:
+        render_frames(source, start, indices, directory, dpi, workers)
+        stitch(directory, len(indices), output, fps, strip)
+    return len(indices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render an autonomous to MP4/GIF/PNG without a display")
+    parser.add_argument('output', help="output file (.mp4, .gif, .png), or a directory with --auton all")
+    parser.add_argument('--routine', default='match_auton', help="routine in routines.py, e.g. red_left")
+    parser.add_argument('--log', help="telemetry log to render instead of a scripted routine")
+    parser.add_argument('--sim', metavar='PROGRAM', help="simulate a program's autonomous and render its log")
+    parser.add_argument('--auton', help="touchscreen selection for --sim, or 'all' for every one")
+    parser.add_argument('--format', default='mp4', help="file format for --auton all")
+    parser.add_argument('--start', type=float, nargs=3, default=(72, 20, 0), metavar=('X', 'Y', 'ANGLE'))
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--dpi', type=float, default=100)
+    parser.add_argument('--workers', type=int, help="render processes, defaults to one per CPU")
+    parser.add_argument('--strip', type=int, default=8, help="frames in a .png strip")
+    args = parser.parse_args()
+
+    if args.sim and args.auton == 'all':
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'simulation'))
+        import runner
+        os.makedirs(args.output, exist_ok=True)
+        jobs = [(auton_visualizer.simulate_log(args.sim, auton), os.path.join(args.output, f"{auton}.{args.format}"))
+                for auton in sorted(runner.AUTON_TOUCH)]
+    elif args.sim:
+        jobs = [(auton_visualizer.simulate_log(args.sim, args.auton), args.output)]
+    elif args.log:
+        jobs = [(args.log, args.output)]
+    else:
+        jobs = [(auton_visualizer.named_routine(args.routine), args.output)]
+
+    for source, output in jobs:
+        try:
+            count = export(source, output, tuple(args.start), args.fps, args.dpi, args.workers, args.strip)
+        except ValueError as e:
+            # e.g. an auton selection the program has no routine for
+            print(f"{output}: skipped, {e}")
+            continue
+        print(f"{output}: {count} frames")
+
+
+if __name__ == "__main__":
+    main()
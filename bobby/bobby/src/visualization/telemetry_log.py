@@ -0,0 +1,90 @@
+"""
+Reads telemetry logs written by telemetry.py off the brain SD card.
+
+    python telemetry_log.py /media/sd/auton.tlm
+
+The file is memory-mapped, so even long driver-control logs open instantly
+and only the columns you touch are read from disk.
+"""
+
+import argparse
+import os
+import struct
+import sys
+
+import numpy as np
+
+# telemetry.py lives with the robot programs one directory up and is the
+# single source of truth for the record layout
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+import telemetry
+
+_NUMPY_CODES = {'I': '<u4', 'f': '<f4', 'B': 'u1'}
+
+RECORD_DTYPE = np.dtype({
+    'names': [name for name, _ in telemetry.FIELDS],
+    'formats': [_NUMPY_CODES[code] for _, code in telemetry.FIELDS],
+    'offsets': [struct.calcsize('<' + ''.join(code for _, code in telemetry.FIELDS[:i]))
+                for i in range(len(telemetry.FIELDS))],
+    'itemsize': telemetry.RECORD_SIZE,
+})
+
+SOURCE_NAMES = {
+    telemetry.SOURCE_PID_DRIVE: 'pid_drive',
+    telemetry.SOURCE_DRIVER: 'driver',
+    telemetry.SOURCE_PROFILE_DRIVE: 'profile_drive',
+    telemetry.SOURCE_PATH: 'path',
+    telemetry.SOURCE_TURN: 'turn',
+}
+
+
+def load(path):
+    """
+    Returns the records in a log as a read-only numpy structured array
+    backed by the file, e.g. log['time_ms'], log['left_position'].
+    """
+    with open(path, 'rb') as f:
+        header = f.read(telemetry.HEADER_SIZE)
+    if len(header) < telemetry.HEADER_SIZE:
+        raise ValueError(f"{path}: too short for a telemetry header")
+    magic, version, record_size = struct.unpack(telemetry.HEADER_FORMAT, header)
+    if magic != telemetry.MAGIC:
+        raise ValueError(f"{path}: not a telemetry log")
+    if version != telemetry.VERSION or record_size != telemetry.RECORD_SIZE:
+        raise ValueError(f"{path}: log version {version} with {record_size} byte records, "
+                         f"expected version {telemetry.VERSION} with {telemetry.RECORD_SIZE}")
+
+    count = (os.path.getsize(path) - telemetry.HEADER_SIZE) // telemetry.RECORD_SIZE
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=telemetry.HEADER_SIZE, shape=(count,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a telemetry log")
+    parser.add_argument('path', help="log file copied off the SD card")
+    args = parser.parse_args()
+
+    log = load(args.path)
+    print(f"{len(log)} records")
+    if len(log) == 0:
+        return
+    print(f"time {log['time_ms'][0]} - {log['time_ms'][-1]} ms")
+    for source, name in SOURCE_NAMES.items():
+        rows = log[log['source'] == source]
+        if len(rows) == 0:
+            continue
+        periods = np.diff(rows['time_ms'].astype(np.int64))
+        periods = periods[periods < 1000]  # ignore gaps between separate moves
+        mean_period = periods.mean() if len(periods) else float('nan')
+        print(f"  {name:>13}: {len(rows):6d} records, mean period {mean_period:.1f} ms, "
+              f"max |output| {np.abs(rows['left_output']).max():.0f}%")
+    changes = np.flatnonzero(np.diff(log['piston'].astype(np.int8)) != 0)
+    print(f"piston changes at {[int(log['time_ms'][i + 1]) for i in changes]} ms")
+
+
+if __name__ == "__main__":
+    main()